@@ -0,0 +1,547 @@
+import multiprocessing
+import pickle
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from ledger import TradeLedger
+from models import LiquidationReport, Order, Position
+from risk_metrics import RiskAccumulator
+from trading_engine import TradingEngine
+
+DEFAULT_ACCOUNT = "default"
+
+# (account_id, event_type, symbol, payload); account_id is None for market-wide events
+AccountListener = Callable[[Optional[str], str, Optional[str], Any], None]
+
+# Events that only need their latest value forwarded from a shard
+_CONFLATED_EVENTS = {"position", "portfolio"}
+
+
+class CommandClock:
+    """Engine clock that reads one fixed time for the whole of a command
+
+    ``start()`` stamps a new command with the current time; ``now`` can also
+    be set directly, e.g. to a journaled time when a command is replayed.
+    Every timestamp a command produces is then reproducible.
+    """
+
+    def __init__(self):
+        self.now: Optional[datetime] = None
+
+    def start(self) -> datetime:
+        self.now = datetime.now()
+        return self.now
+
+    def __call__(self) -> datetime:
+        return self.now if self.now is not None else datetime.now()
+
+
+@dataclass
+class AccountState:
+    """What changed in one account since the last collect
+
+    ``positions`` maps changed symbols to their new position (None when
+    closed); when ``full`` is set it is the complete set and replaces
+    whatever the reader had. ``orders`` is None when the pending orders are
+    unchanged. ``new_trades`` holds the ledger rows recorded since the last
+    collect and ``risk`` is a copy of the account's risk accumulator.
+    ``opened_at`` is when the current engine was opened, which tells one
+    trade history of the account from the next after a reset.
+    """
+
+    account_id: str
+    epoch: int
+    opened_at: datetime
+    full: bool
+    summary: Dict[str, Any]
+    positions: Dict[str, Optional[Position]]
+    orders: Optional[Tuple[Order, ...]]
+    orders_version: int
+    liquidations: Tuple[LiquidationReport, ...]
+    risk: RiskAccumulator
+    new_trades: TradeLedger = field(default_factory=TradeLedger)
+
+
+class EngineManager:
+    """One TradingEngine per account, all hosted in this process
+
+    Every engine shares the manager's market price table, and the manager
+    indexes which accounts have positions or pending orders in each symbol,
+    so a tick is only applied to the engines it can affect. ``collect``
+    reports what changed per account since the previous call, for a single
+    reader that mirrors account state. With a ``clock`` every engine reads
+    time from it instead of its own.
+    """
+
+    def __init__(self, engine_factory: Callable[[], TradingEngine], listener: Optional[AccountListener] = None,
+                 clock: Optional[CommandClock] = None):
+        self.engine_factory = engine_factory
+        self.listener = listener
+        self.clock = clock
+        self.market_prices: Dict[str, float] = {}
+        self._engines: Dict[str, TradingEngine] = {}
+        self._epochs: Dict[str, int] = {}
+        self._interest: Dict[str, Set[str]] = {}
+        self._account_symbols: Dict[str, Set[str]] = {}
+        self._changed_positions: Dict[str, Set[str]] = {}
+        self._touched: Set[str] = set()
+        self._collected: Dict[str, Tuple[int, int, int]] = {}
+        self._interest_added: Set[str] = set()
+        self._interest_removed: Set[str] = set()
+
+    def __contains__(self, account_id: str) -> bool:
+        return account_id in self._engines
+
+    def accounts(self) -> List[str]:
+        return list(self._engines)
+
+    def engine(self, account_id: str) -> TradingEngine:
+        """Get an account's engine, opening the account if needed"""
+        engine = self._engines.get(account_id)
+        if engine is None:
+            engine = self._install(account_id)
+        return engine
+
+    def _install(self, account_id: str, engine: Optional[TradingEngine] = None) -> TradingEngine:
+        opened = engine is None
+        engine = engine or self.engine_factory()
+        engine.market_prices = self.market_prices
+        if self.clock is not None:
+            engine.clock = self.clock
+            if opened:
+                engine.opened_at = self.clock()
+        engine.add_listener(lambda event_type, symbol, payload: self._on_event(account_id, event_type, symbol, payload))
+        self._engines[account_id] = engine
+        self._epochs[account_id] = self._epochs.get(account_id, 0) + 1
+        self._changed_positions[account_id] = set()
+        self._touched.add(account_id)
+        return engine
+
+    def _on_event(self, account_id: str, event_type: str, symbol: Optional[str], payload: Any):
+        if event_type == "position":
+            self._changed_positions[account_id].add(symbol)
+        elif event_type == "price":
+            # Prices are published once per tick by the manager, not per account
+            return
+        if self.listener is not None:
+            self.listener(account_id, event_type, symbol, payload)
+
+    def _reindex(self, account_id: str):
+        """Refresh the symbols an account needs ticks for"""
+        symbols = self._engines[account_id].active_symbols()
+        previous = self._account_symbols.get(account_id, set())
+        if symbols == previous:
+            return
+        for symbol in previous - symbols:
+            accounts = self._interest[symbol]
+            accounts.discard(account_id)
+            if not accounts:
+                del self._interest[symbol]
+                self._interest_removed.add(symbol)
+                self._interest_added.discard(symbol)
+        for symbol in symbols - previous:
+            accounts = self._interest.get(symbol)
+            if accounts is None:
+                accounts = self._interest[symbol] = set()
+                self._interest_added.add(symbol)
+                self._interest_removed.discard(symbol)
+            accounts.add(account_id)
+        self._account_symbols[account_id] = symbols
+
+    def execute(self, account_id: str, method: str, *args) -> Any:
+        """Call a TradingEngine method on an account's engine
+
+        Model results are copied so callers never hold live engine state.
+        """
+        engine = self.engine(account_id)
+        self._touched.add(account_id)
+        try:
+            result = getattr(engine, method)(*args)
+        finally:
+            self._reindex(account_id)
+        return result.model_copy() if isinstance(result, BaseModel) else result
+
+    def execute_many(self, calls: List[Tuple[str, str, tuple]],
+                     times: Optional[List[Optional[datetime]]] = None) -> List[Tuple[bool, Any]]:
+        """Run (account_id, method, args) calls in order; (ok, result or exception) for each
+
+        With ``times`` each call runs at its own clock time, as if executed
+        on its own.
+        """
+        outcomes = []
+        for i, (account_id, method, args) in enumerate(calls):
+            if times is not None and self.clock is not None:
+                self.clock.now = times[i]
+            try:
+                outcomes.append((True, self.execute(account_id, method, *args)))
+            except Exception as e:
+                outcomes.append((False, e))
+        return outcomes
+
+    def reset(self, account_id: str):
+        """Replace an account's engine with a fresh one"""
+        self._engines.pop(account_id, None)
+        self._install(account_id)
+        self._reindex(account_id)
+
+    def trim_trades(self, account_id: str, opened_at: datetime, before: int):
+        """Drop an account's stored trades before position ``before`` from its engine
+
+        Ignored if the account was reset since ``opened_at``. Trimming only
+        frees memory, so it is not journaled.
+        """
+        engine = self._engines.get(account_id)
+        if engine is not None and engine.opened_at == opened_at:
+            engine.trim_trades(before)
+
+    def set_prices(self, prices: Dict[str, float]):
+        """Record prices without running any engine logic"""
+        self.market_prices.update(prices)
+
+    def export_state(self) -> Dict[str, Any]:
+        """Market prices and every account's pickled engine, for a snapshot"""
+        engines = {}
+        for account_id, engine in self._engines.items():
+            # Listeners, the shared price table and the clock belong to the
+            # manager and are re-attached on import
+            detached = engine._listeners, engine.market_prices, engine.clock
+            engine._listeners, engine.market_prices, engine.clock = [], {}, datetime.now
+            try:
+                engines[account_id] = pickle.dumps(engine, protocol=pickle.HIGHEST_PROTOCOL)
+            finally:
+                engine._listeners, engine.market_prices, engine.clock = detached
+        return {"market_prices": dict(self.market_prices), "engines": engines}
+
+    def import_state(self, state: Dict[str, Any]):
+        """Install the accounts of an exported state, replacing any open ones"""
+        self.market_prices.update(state["market_prices"])
+        for account_id, data in state["engines"].items():
+            self._engines.pop(account_id, None)
+            self._install(account_id, pickle.loads(data))
+            self._reindex(account_id)
+
+    def update_market_price(self, symbol: str, price: float):
+        """Apply a tick to every account interested in the symbol"""
+        self.market_prices[symbol] = price
+        for account_id in list(self._interest.get(symbol, ())):
+            self._engines[account_id].update_market_price(symbol, price)
+            self._touched.add(account_id)
+            self._reindex(account_id)
+        if self.listener is not None:
+            self.listener(None, "price", symbol, {"symbol": symbol, "price": price})
+
+    def update_market_prices(self, ticks: Iterable[Tuple[str, float, Any]]) -> int:
+        """Apply a batch of ticks, giving each account only the symbols it holds"""
+        ticks = sorted(ticks, key=itemgetter(2))
+        by_account: Dict[str, List[Tuple[str, float, Any]]] = {}
+        last_prices: Dict[str, float] = {}
+        for tick in ticks:
+            symbol = tick[0]
+            last_prices[symbol] = tick[1]
+            for account_id in self._interest.get(symbol, ()):
+                by_account.setdefault(account_id, []).append(tick)
+
+        for account_id, rows in by_account.items():
+            self._engines[account_id].update_market_prices(rows)
+            self._touched.add(account_id)
+            self._reindex(account_id)
+
+        self.market_prices.update(last_prices)
+        if self.listener is not None:
+            for symbol, price in last_prices.items():
+                self.listener(None, "price", symbol, {"symbol": symbol, "price": price})
+        return len(ticks)
+
+    def drain_interest(self) -> Tuple[Set[str], Set[str]]:
+        """Symbols that gained or lost all interested accounts since the last drain"""
+        added, removed = self._interest_added, self._interest_removed
+        self._interest_added, self._interest_removed = set(), set()
+        return added, removed
+
+    def collect(self) -> List[AccountState]:
+        """Return what changed in every account touched since the last collect"""
+        states = []
+        for account_id in self._touched:
+            engine = self._engines.get(account_id)
+            if engine is None:
+                continue
+            epoch = self._epochs[account_id]
+            seen_epoch, seen_trades, seen_orders = self._collected.get(account_id, (0, 0, -1))
+            full = seen_epoch != epoch
+            if full:
+                seen_trades, seen_orders = 0, -1
+                positions = {p.symbol: p.model_copy() for p in engine.get_positions()}
+            else:
+                positions = {}
+                for symbol in self._changed_positions[account_id]:
+                    position = engine.get_position(symbol)
+                    positions[symbol] = position.model_copy() if position is not None else None
+            self._changed_positions[account_id] = set()
+
+            orders_version = engine.order_book.version
+            orders = None
+            if orders_version != seen_orders:
+                orders = tuple(o.model_copy() for o in engine.order_book)
+
+            # Trade counts are positions in the full history, which outlast
+            # trimming the engine's ledger
+            ledger = engine.ledger
+            self._collected[account_id] = (epoch, ledger.offset + len(ledger), orders_version)
+            states.append(AccountState(
+                account_id=account_id,
+                epoch=epoch,
+                opened_at=engine.opened_at,
+                full=full,
+                summary=engine.get_portfolio_summary(),
+                positions=positions,
+                orders=orders,
+                orders_version=orders_version,
+                liquidations=tuple(engine.liquidations),
+                risk=engine.risk.copy(),
+                new_trades=ledger.slice(max(seen_trades - ledger.offset, 0))
+            ))
+        self._touched = set()
+        return states
+
+
+def _shard_main(conn, engine_factory: Callable[[], TradingEngine], use_clock: bool):
+    """Worker loop: host an EngineManager and serve requests from the parent"""
+    events: List[Tuple[Optional[str], str, Optional[str], Any]] = []
+    latest: Dict[Tuple[Optional[str], str, Optional[str]], Any] = {}
+
+    def forward(account_id, event_type, symbol, payload):
+        # Position and portfolio events are conflated until the next reply
+        if event_type in _CONFLATED_EVENTS:
+            key = (account_id, event_type, symbol)
+            if event_type == "portfolio" and key in latest:
+                latest[key] = {**latest[key], **payload}
+            else:
+                latest[key] = payload
+        elif event_type != "price":
+            events.append((account_id, event_type, symbol, payload))
+
+    manager = EngineManager(engine_factory, listener=forward, clock=CommandClock() if use_clock else None)
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        prices, now, method, args = request
+        if prices:
+            manager.set_prices(prices)
+        if manager.clock is not None:
+            manager.clock.now = now
+        try:
+            reply = (True, getattr(manager, method)(*args))
+        except Exception as e:
+            reply = (False, e)
+        added, removed = manager.drain_interest()
+        events.extend(key + (payload,) for key, payload in latest.items())
+        conn.send(reply + (events, added, removed))
+        events = []
+        latest.clear()
+    conn.close()
+
+
+class ShardedEngineManager:
+    """Accounts spread over worker processes, each running an EngineManager
+
+    Accounts are pinned to a shard by a stable hash of their id. The parent
+    tracks which shards hold positions or orders in each symbol and fans
+    ticks out only to those, in parallel. Shards that skip a tick receive
+    the latest price with their next request, so their market orders never
+    fill at a stale price. Engine events are shipped back with every reply
+    and forwarded to the parent's listener. A ``clock``'s current time is
+    sent with every request and used by the shard's engines.
+
+    ``execute`` is one blocking round trip. ``execute_many`` sends each
+    shard its share of a batch of calls as one message and then gathers
+    the replies, so the shards work through a batch in parallel at one
+    round trip per shard.
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], TradingEngine],
+        num_shards: int,
+        listener: Optional[AccountListener] = None,
+        start_method: str = "spawn",
+        clock: Optional[CommandClock] = None,
+    ):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.listener = listener
+        self.clock = clock
+        self.market_prices: Dict[str, float] = {}
+        self._interest: Dict[str, Set[int]] = {}
+        self._stale: List[Set[str]] = [set() for _ in range(num_shards)]
+        self._dirty: Set[int] = set()
+        self._accounts: Set[str] = set()
+
+        context = multiprocessing.get_context(start_method)
+        self._conns = []
+        self._processes = []
+        for _ in range(num_shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_shard_main, args=(child_conn, engine_factory, clock is not None),
+                                      daemon=True)
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+
+    @property
+    def num_shards(self) -> int:
+        return len(self._conns)
+
+    def __contains__(self, account_id: str) -> bool:
+        return account_id in self._accounts
+
+    def accounts(self) -> List[str]:
+        return list(self._accounts)
+
+    def shard_of(self, account_id: str) -> int:
+        return zlib.crc32(account_id.encode()) % len(self._conns)
+
+    def _send(self, shard: int, method: str, *args):
+        stale = self._stale[shard]
+        prices = {symbol: self.market_prices[symbol] for symbol in stale}
+        stale.clear()
+        self._dirty.add(shard)
+        now = self.clock.now if self.clock is not None else None
+        self._conns[shard].send((prices, now, method, args))
+
+    def _receive(self, shard: int) -> Any:
+        ok, result, events, added, removed = self._conns[shard].recv()
+        for symbol in added:
+            self._interest.setdefault(symbol, set()).add(shard)
+        for symbol in removed:
+            shards = self._interest.get(symbol)
+            if shards is not None:
+                shards.discard(shard)
+                if not shards:
+                    del self._interest[symbol]
+        if self.listener is not None:
+            for event in events:
+                self.listener(*event)
+        if not ok:
+            raise result
+        return result
+
+    def _call(self, shard: int, method: str, *args) -> Any:
+        self._send(shard, method, *args)
+        return self._receive(shard)
+
+    def engine(self, account_id: str):
+        raise TypeError("Engines of a sharded manager live in worker processes; use execute()")
+
+    def execute(self, account_id: str, method: str, *args) -> Any:
+        """Call a TradingEngine method on an account's engine in its shard"""
+        self._accounts.add(account_id)
+        return self._call(self.shard_of(account_id), "execute", account_id, method, *args)
+
+    def execute_many(self, calls: List[Tuple[str, str, tuple]],
+                     times: Optional[List[Optional[datetime]]] = None) -> List[Tuple[bool, Any]]:
+        """Run (account_id, method, args) calls on their shards in parallel; (ok, result) for each"""
+        by_shard: Dict[int, List[int]] = {}
+        for i, (account_id, _, _) in enumerate(calls):
+            self._accounts.add(account_id)
+            by_shard.setdefault(self.shard_of(account_id), []).append(i)
+        for shard, indices in by_shard.items():
+            self._send(shard, "execute_many", [calls[i] for i in indices],
+                       [times[i] for i in indices] if times is not None else None)
+        outcomes: List[Tuple[bool, Any]] = [None] * len(calls)
+        for shard, indices in by_shard.items():
+            try:
+                shard_outcomes = self._receive(shard)
+            except Exception as e:
+                shard_outcomes = [(False, e)] * len(indices)
+            for i, outcome in zip(indices, shard_outcomes):
+                outcomes[i] = outcome
+        return outcomes
+
+    def reset(self, account_id: str):
+        self._accounts.add(account_id)
+        self._call(self.shard_of(account_id), "reset", account_id)
+
+    def update_market_price(self, symbol: str, price: float):
+        self.update_market_prices([(symbol, price, 0)])
+
+    def update_market_prices(self, ticks: Iterable[Tuple[str, float, Any]]) -> int:
+        """Fan ticks out to the shards that hold the symbols and wait for all of them"""
+        ticks = sorted(ticks, key=itemgetter(2))
+        by_shard: Dict[int, List[Tuple[str, float, Any]]] = {}
+        last_prices: Dict[str, float] = {}
+        for tick in ticks:
+            symbol = tick[0]
+            last_prices[symbol] = tick[1]
+            for shard in self._interest.get(symbol, ()):
+                by_shard.setdefault(shard, []).append(tick)
+        self.market_prices.update(last_prices)
+
+        for shard in range(len(self._conns)):
+            if shard not in by_shard:
+                self._stale[shard].update(last_prices)
+        for shard, rows in by_shard.items():
+            self._send(shard, "update_market_prices", rows)
+        errors = []
+        for shard in by_shard:
+            try:
+                self._receive(shard)
+            except Exception as e:
+                errors.append(e)
+        if self.listener is not None:
+            for symbol, price in last_prices.items():
+                self.listener(None, "price", symbol, {"symbol": symbol, "price": price})
+        if errors:
+            raise errors[0]
+        return len(ticks)
+
+    def export_state(self) -> Dict[str, Any]:
+        """Market prices and every account's pickled engine, gathered from all shards"""
+        for shard in range(len(self._conns)):
+            self._send(shard, "export_state")
+        engines = {}
+        for shard in range(len(self._conns)):
+            engines.update(self._receive(shard)["engines"])
+        return {"market_prices": dict(self.market_prices), "engines": engines}
+
+    def trim_trades(self, account_id: str, opened_at: datetime, before: int):
+        self._call(self.shard_of(account_id), "trim_trades", account_id, opened_at, before)
+
+    def import_state(self, state: Dict[str, Any]):
+        """Send each exported account to its shard, with the market prices"""
+        self.market_prices.update(state["market_prices"])
+        by_shard: Dict[int, Dict[str, bytes]] = {}
+        for account_id, data in state["engines"].items():
+            self._accounts.add(account_id)
+            by_shard.setdefault(self.shard_of(account_id), {})[account_id] = data
+        for shard in range(len(self._conns)):
+            engines = by_shard.get(shard, {})
+            self._call(shard, "import_state", {"market_prices": self.market_prices, "engines": engines})
+
+    def collect(self) -> List[AccountState]:
+        """Collect changed account state from every shard used since the last collect"""
+        shards = sorted(self._dirty)
+        for shard in shards:
+            self._send(shard, "collect")
+        states = []
+        for shard in shards:
+            states.extend(self._receive(shard))
+        self._dirty = set()
+        return states
+
+    def close(self):
+        """Stop the worker processes"""
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
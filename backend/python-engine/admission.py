@@ -0,0 +1,127 @@
+from typing import List
+
+from models import OrderRejection, RejectionReason
+from config import MAX_LEVERAGE, MAX_LOSS_PERCENT, MAX_SYMBOL_EXPOSURE
+from metrics import REGISTRY
+from src.engine.trading_engine.margin_calculator import MarginCalculator
+from src.engine.trading_engine.risk_manager import RiskManager
+
+_REJECTED = {
+    reason: REGISTRY.counter("engine_order_rejections_total", "Orders refused by admission checks", reason=reason.value)
+    for reason in RejectionReason
+}
+
+
+class OrderRejected(ValueError):
+    """An order refused by the admission checks, with every reason it failed"""
+
+    def __init__(self, rejections: List[OrderRejection]):
+        super().__init__(rejections)
+        self.rejections = rejections
+
+    def __str__(self) -> str:
+        return "Order rejected: " + "; ".join(r.message for r in self.rejections)
+
+
+class OrderAdmission:
+    """Pre-trade margin, leverage, exposure and loss checks of an order
+
+    The checks only look at the account's running figures (equity, used
+    margin, total and per-symbol notional, realized P&L peak), which the
+    engine keeps up to date as positions are re-priced, so admitting an
+    order costs O(1) however many positions and orders are open.
+
+    Only the exposure an order adds is checked: orders that reduce or close
+    a position are always admitted, and an order that flips a position is
+    checked for the part beyond flat.
+
+    Checks:
+        margin          margin for the added notional, plus commission, fits
+                        in the free margin (equity - used margin)
+        leverage        total notional over equity stays within ``max_leverage``
+        exposure        the symbol's notional stays within ``max_symbol_exposure``
+                        of the buying power (equity x leverage)
+        loss            the loss from the P&L peak stays within
+                        ``max_loss_percent`` of the account value at the peak
+    """
+
+    def __init__(
+        self,
+        max_leverage: float = MAX_LEVERAGE,
+        max_symbol_exposure: float = MAX_SYMBOL_EXPOSURE,
+        max_loss_percent: float = MAX_LOSS_PERCENT,
+    ):
+        self.max_leverage = max_leverage
+        self.max_symbol_exposure = max_symbol_exposure
+        self.margin_calculator = MarginCalculator()
+        self.risk_manager = RiskManager(max_loss_percent)
+
+    def check(
+        self,
+        net_quantity: float,
+        order_quantity: float,
+        price: float,
+        equity: float,
+        used_margin: float,
+        notional: float,
+        leverage: float,
+        loss: float,
+        commission_rate: float,
+    ) -> List[OrderRejection]:
+        """Reasons to refuse an order, empty if it is admitted
+
+        ``net_quantity`` is the symbol's signed position and
+        ``order_quantity`` the order's signed quantity; ``notional`` is the
+        account's total notional and ``loss`` its current loss from the P&L
+        peak.
+        """
+        after = abs(net_quantity + order_quantity)
+        added = (after - abs(net_quantity)) * price
+        if added <= 0:
+            return []
+
+        rejections = []
+        required = (self.margin_calculator.calculate_margin_requirement(added, leverage)
+                    + abs(order_quantity) * price * commission_rate)
+        if not self.margin_calculator.check_margin(equity, used_margin, required):
+            rejections.append(OrderRejection(
+                reason=RejectionReason.INSUFFICIENT_MARGIN,
+                message=f"requires {required:.2f} margin, {equity - used_margin:.2f} available",
+                value=required,
+                limit=equity - used_margin
+            ))
+
+        effective = (notional + added) / equity if equity > 0 else float("inf")
+        if self.max_leverage > 0 and effective > self.max_leverage:
+            rejections.append(OrderRejection(
+                reason=RejectionReason.MAX_LEVERAGE,
+                message=f"leverage would be {effective:.2f}x, above the maximum {self.max_leverage:g}x",
+                value=effective,
+                limit=self.max_leverage
+            ))
+
+        exposure = after * price
+        exposure_limit = self.max_symbol_exposure * max(equity, 0.0) * leverage
+        if self.max_symbol_exposure > 0 and exposure > exposure_limit:
+            rejections.append(OrderRejection(
+                reason=RejectionReason.SYMBOL_EXPOSURE,
+                message=f"symbol exposure would be {exposure:.2f}, above the limit {exposure_limit:.2f}",
+                value=exposure,
+                limit=exposure_limit
+            ))
+
+        max_loss = self.risk_manager.max_loss_percent
+        if max_loss > 0 and loss > 0:
+            peak_value = equity + loss
+            if peak_value <= 0 or not self.risk_manager.check_risk(peak_value, loss):
+                loss_percent = loss / peak_value if peak_value > 0 else float("inf")
+                rejections.append(OrderRejection(
+                    reason=RejectionReason.LOSS_LIMIT,
+                    message=f"loss of {loss_percent:.2%} from the peak is above the limit {max_loss:.2%}",
+                    value=loss_percent,
+                    limit=max_loss
+                ))
+
+        for rejection in rejections:
+            _REJECTED[rejection.reason].inc()
+        return rejections
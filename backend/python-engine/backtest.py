@@ -0,0 +1,238 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from ledger import TradeLedger
+from models import OrderRequest, RiskMetrics, Trade
+from trading_engine import TradingEngine
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class SimulatedClock:
+    """Clock for replaying history, advanced tick by tick by the backtest
+
+    Time is kept as integer microseconds since the epoch (naive, like the
+    recorded ticks), and a ``datetime`` is only built when the engine asks
+    for one, i.e. when an order, position or trade is stamped.
+    """
+
+    def __init__(self, start: Optional[datetime] = None):
+        self.now_us = 0 if start is None else (start - _EPOCH) // timedelta(microseconds=1)
+
+    def __call__(self) -> datetime:
+        return _EPOCH + timedelta(microseconds=self.now_us)
+
+    def advance_to(self, timestamp: datetime):
+        self.now_us = (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+
+@dataclass
+class TickSeries:
+    """Ticks for one or more symbols as parallel arrays, in timestamp order
+
+    ``codes`` index into ``symbols``; ``timestamps`` are datetime64[us].
+    """
+
+    symbols: List[str]
+    codes: np.ndarray
+    prices: np.ndarray
+    timestamps: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @classmethod
+    def from_arrays(cls, symbol: str, prices: Sequence[float], timestamps: Sequence[Any]) -> "TickSeries":
+        """Ticks for a single symbol"""
+        prices = np.asarray(prices, dtype=np.float64)
+        return cls(
+            symbols=[symbol],
+            codes=np.zeros(len(prices), dtype=np.int32),
+            prices=prices,
+            timestamps=np.asarray(timestamps, dtype="datetime64[us]")
+        )
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "TickSeries":
+        """Ticks from a DataFrame with ``timestamp``, ``symbol`` and ``price`` columns"""
+        frame = frame.sort_values("timestamp", kind="stable")
+        symbols = pd.Categorical(frame["symbol"])
+        return cls(
+            symbols=[str(s) for s in symbols.categories],
+            codes=symbols.codes.astype(np.int32),
+            prices=frame["price"].to_numpy(dtype=np.float64),
+            timestamps=pd.to_datetime(frame["timestamp"]).to_numpy(dtype="datetime64[us]")
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "TickSeries":
+        """Load ticks from a CSV or Parquet file with timestamp, symbol and price columns"""
+        if path.endswith(".parquet"):
+            frame = pd.read_parquet(path, columns=["timestamp", "symbol", "price"])
+        else:
+            frame = pd.read_csv(path, usecols=["timestamp", "symbol", "price"])
+        return cls.from_frame(frame)
+
+    @classmethod
+    def from_historical(cls, manager, symbols: Iterable[str],
+                        start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> "TickSeries":
+        """Ticks from a HistoricalManager's stored columns between two times"""
+        series = []
+        for symbol in symbols:
+            columns = manager.get_range(symbol, start_date, end_date)
+            if len(columns["price"]):
+                series.append(cls.from_arrays(symbol, columns["price"], columns["timestamp"]))
+        if not series:
+            return cls([], np.empty(0, np.int32), np.empty(0), np.empty(0, "datetime64[us]"))
+        return series[0] if len(series) == 1 else cls.merge(series)
+
+    @classmethod
+    def merge(cls, series: Iterable["TickSeries"]) -> "TickSeries":
+        """Interleave several series into one, in timestamp order"""
+        series = list(series)
+        index: Dict[str, int] = {}
+        codes = []
+        for s in series:
+            translate = np.array([index.setdefault(sym, len(index)) for sym in s.symbols], dtype=np.int32)
+            codes.append(translate[s.codes] if len(s.symbols) else s.codes)
+        timestamps = np.concatenate([s.timestamps for s in series])
+        order = np.argsort(timestamps, kind="stable")
+        return cls(
+            symbols=list(index),
+            codes=np.concatenate(codes)[order],
+            prices=np.concatenate([s.prices for s in series])[order],
+            timestamps=timestamps[order]
+        )
+
+
+class Strategy:
+    """Base class for backtest strategies; override the callbacks you need"""
+
+    def on_start(self, backtest: "Backtest"):
+        pass
+
+    def on_tick(self, backtest: "Backtest", symbol: str, price: float):
+        pass
+
+    def on_fill(self, backtest: "Backtest", trade: Trade):
+        pass
+
+    def on_finish(self, backtest: "Backtest"):
+        pass
+
+
+@dataclass
+class BacktestResult:
+    """Equity curve, trade ledger and final statistics of a backtest run"""
+
+    timestamps: np.ndarray
+    equity: np.ndarray
+    ledger: TradeLedger
+    metrics: RiskMetrics
+    summary: Dict[str, Any]
+    ticks: int
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def equity_curve(self) -> pd.Series:
+        return pd.Series(self.equity, index=pd.DatetimeIndex(self.timestamps), name="equity")
+
+    def trades(self) -> List[Trade]:
+        return self.ledger.to_trades()
+
+
+class Backtest:
+    """Replays ticks through a TradingEngine running on a simulated clock
+
+    Every tick advances the clock, is applied to the engine, and is then
+    handed to the strategy, whose orders fill at that tick's price. Equity
+    is sampled every ``sample_every`` ticks (and after the last one).
+    ``engine_options`` are passed through to the engine, e.g. ``debug``.
+    """
+
+    def __init__(
+        self,
+        strategy: Optional[Strategy] = None,
+        initial_balance: float = 10000.0,
+        leverage: float = 1.0,
+        sample_every: int = 1,
+        engine_factory: Optional[Callable[..., TradingEngine]] = None,
+        **engine_options,
+    ):
+        if sample_every < 1:
+            raise ValueError("sample_every must be at least 1")
+        self.strategy = strategy or Strategy()
+        self.sample_every = sample_every
+        self.clock = SimulatedClock()
+        factory = engine_factory or TradingEngine
+        self.engine = factory(initial_balance=initial_balance, leverage=leverage,
+                              clock=self.clock, **engine_options)
+        self.symbol = None
+        self.price = None
+
+    def place_order(self, **request) -> Any:
+        """Place an order on the engine at the current tick"""
+        return self.engine.place_order(OrderRequest(**request))
+
+    def _on_engine_event(self, event_type: str, symbol: Optional[str], payload: Any):
+        if event_type == "fill":
+            self.strategy.on_fill(self, payload)
+
+    def run(self, ticks: TickSeries) -> BacktestResult:
+        engine = self.engine
+        strategy = self.strategy
+        clock = self.clock
+
+        # Only pay for fill events when the strategy wants them
+        wants_fills = type(strategy).on_fill is not Strategy.on_fill
+        if wants_fills:
+            engine.add_listener(self._on_engine_event)
+        wants_ticks = type(strategy).on_tick is not Strategy.on_tick
+
+        n = len(ticks)
+        every = self.sample_every
+        equity: List[float] = []
+
+        # Plain Python scalars are much cheaper to work with per tick than
+        # NumPy scalars
+        symbols = ticks.symbols
+        codes = ticks.codes.tolist()
+        prices = ticks.prices.tolist()
+        times_us = ticks.timestamps.astype(np.int64).tolist()
+        update = engine.update_market_price
+        portfolio = engine.portfolio
+
+        strategy.on_start(self)
+        for i in range(n):
+            symbol = symbols[codes[i]]
+            price = prices[i]
+            clock.now_us = times_us[i]
+            update(symbol, price)
+            if wants_ticks:
+                self.symbol, self.price = symbol, price
+                strategy.on_tick(self, symbol, price)
+            if i % every == 0:
+                equity.append(portfolio.equity)
+        strategy.on_finish(self)
+
+        if wants_fills:
+            engine.remove_listener(self._on_engine_event)
+
+        # Samples were taken at ticks 0, every, 2*every...; always end with
+        # the final state
+        sampled = np.arange(0, n, every)
+        if n and sampled[-1] != n - 1:
+            sampled = np.append(sampled, n - 1)
+            equity.append(portfolio.equity)
+
+        return BacktestResult(
+            timestamps=ticks.timestamps[sampled],
+            equity=np.asarray(equity, dtype=np.float64),
+            ledger=engine.ledger,
+            metrics=engine.calculate_risk_metrics(),
+            summary=engine.get_portfolio_summary(),
+            ticks=n
+        )
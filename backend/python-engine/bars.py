@@ -0,0 +1,216 @@
+import logging
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pagination import local_time
+from config import BAR_CAPACITY, BAR_TIMEFRAMES
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+BAR_DTYPE = np.dtype([
+    ("timestamp", "i8"), ("open", "f8"), ("high", "f8"), ("low", "f8"), ("close", "f8"),
+    ("volume", "f8"), ("vwap", "f8"), ("ticks", "i8"),
+])
+
+# Index of each field in the open bar's list
+_START, _OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _NOTIONAL, _TICKS, _PRICE_SUM = range(9)
+
+
+def parse_timeframe(timeframe: str) -> int:
+    """Width in microseconds of a timeframe such as ``1s``, ``5m`` or ``1h``"""
+    try:
+        count, unit = int(timeframe[:-1]), _UNITS[timeframe[-1]]
+    except (ValueError, KeyError, IndexError):
+        raise ValueError(f"Invalid timeframe: {timeframe!r}")
+    if count <= 0:
+        raise ValueError(f"Invalid timeframe: {timeframe!r}")
+    return count * unit * 1_000_000
+
+
+def _vwap(bar: list) -> float:
+    """Volume-weighted price, or the mean tick price when no volume was reported"""
+    if bar[_VOLUME] > 0:
+        return bar[_NOTIONAL] / bar[_VOLUME]
+    return bar[_PRICE_SUM] / bar[_TICKS]
+
+
+def _row(bar: list) -> tuple:
+    return (bar[_START], bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE], bar[_VOLUME], _vwap(bar), bar[_TICKS])
+
+
+class _BarRing:
+    """The last ``capacity`` finished bars of one symbol and timeframe"""
+
+    __slots__ = ("bars", "next", "count")
+
+    def __init__(self, capacity: int):
+        self.bars = np.zeros(capacity, dtype=BAR_DTYPE)
+        self.next = 0
+        self.count = 0
+
+    def push(self, row: tuple):
+        self.bars[self.next] = row
+        self.next = (self.next + 1) % len(self.bars)
+        self.count = min(self.count + 1, len(self.bars))
+
+    def latest(self, limit: int) -> np.ndarray:
+        """Up to ``limit`` most recent bars, oldest first"""
+        limit = min(limit, self.count)
+        indices = (self.next - limit + np.arange(limit)) % len(self.bars)
+        return self.bars[indices]
+
+
+class _Frame:
+    __slots__ = ("timeframe", "width", "ring", "bar")
+
+    def __init__(self, timeframe: str, capacity: int):
+        self.timeframe = timeframe
+        self.width = parse_timeframe(timeframe)
+        self.ring = _BarRing(capacity)
+        self.bar: Optional[list] = None
+
+
+class BarAggregator:
+    """Streaming OHLCV and VWAP bars for every symbol over several timeframes
+
+    Each tick updates the open bar of every timeframe in place. A tick
+    stamped at or after the next bar boundary finishes the open bar, which
+    moves into a fixed-size ring of recent bars and, with a ``history``
+    (a ``HistoricalManager``), is queued for ``flush``. Flushing writes to
+    disk, so the API takes the queued bars on the event loop and writes
+    them from a worker thread every ``BAR_FLUSH_SECONDS`` rather than on the
+    tick path. Ticks older than the
+    open bar are folded into it. Timestamps are naive local times like the
+    engine's; bars are aligned to the epoch.
+    """
+
+    def __init__(self, timeframes: Sequence[str] = BAR_TIMEFRAMES, capacity: int = BAR_CAPACITY,
+                 history=None):
+        for timeframe in timeframes:
+            parse_timeframe(timeframe)
+        self.timeframes = list(timeframes)
+        self.capacity = capacity
+        self.history = history
+        self._frames: Dict[str, List[_Frame]] = {}
+        self._pending: Dict[Tuple[str, str], List[tuple]] = {}
+
+    def symbols(self) -> List[str]:
+        return list(self._frames)
+
+    def _symbol_frames(self, symbol: str) -> List[_Frame]:
+        frames = self._frames.get(symbol)
+        if frames is None:
+            frames = self._frames[symbol] = [_Frame(tf, self.capacity) for tf in self.timeframes]
+        return frames
+
+    def update_market_price(self, symbol: str, price: float, timestamp: Optional[datetime] = None,
+                            volume: float = 0.0):
+        timestamp = local_time(timestamp) if timestamp is not None else datetime.now()
+        now_us = (timestamp - _EPOCH) // timedelta(microseconds=1)
+        for frame in self._symbol_frames(symbol):
+            bar = frame.bar
+            start = now_us - now_us % frame.width
+            if bar is None or start > bar[_START]:
+                if bar is not None:
+                    self._finish(symbol, frame)
+                frame.bar = [start, price, price, price, price, volume, price * volume, 1, price]
+                continue
+            if price > bar[_HIGH]:
+                bar[_HIGH] = price
+            elif price < bar[_LOW]:
+                bar[_LOW] = price
+            bar[_CLOSE] = price
+            bar[_VOLUME] += volume
+            bar[_NOTIONAL] += price * volume
+            bar[_TICKS] += 1
+            bar[_PRICE_SUM] += price
+
+    def update_market_prices(self, ticks: Iterable[Tuple[Any, ...]]) -> int:
+        """Apply (symbol, price, timestamp[, volume]) ticks in timestamp order"""
+        ticks = sorted(ticks, key=itemgetter(2))
+        for tick in ticks:
+            self.update_market_price(*tick)
+        return len(ticks)
+
+    def _finish(self, symbol: str, frame: _Frame):
+        row = _row(frame.bar)
+        frame.ring.push(row)
+        if self.history is not None:
+            self._pending.setdefault((symbol, frame.timeframe), []).append(row)
+
+    def take_pending(self) -> Dict[Tuple[str, str], List[tuple]]:
+        """Hand over the bars finished since the last take, for ``write_pending``"""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def write_pending(self, pending: Dict[Tuple[str, str], List[tuple]]) -> Tuple[int, Dict[Tuple[str, str], List[tuple]]]:
+        """Append taken bars to the history store; returns the number written and the bars to retry
+
+        Bars not newer than the stored history (after a restart, or when tick
+        clocks disagree) can never be appended and are dropped with a
+        warning. Bars that failed for any other reason are returned so
+        ``restore_pending`` can queue them again.
+        """
+        written = 0
+        unwritten = {}
+        for (symbol, timeframe), rows in pending.items():
+            bars = np.array(rows, dtype=BAR_DTYPE)
+            try:
+                try:
+                    written += self.history.append_bars(symbol, timeframe, bars)
+                except ValueError:
+                    stored = self.history.get_bars(symbol, timeframe)["timestamp"]
+                    last = stored[-1].astype("i8") if len(stored) else np.iinfo(np.int64).min
+                    newer = bars[bars["timestamp"] > last]
+                    logger.warning("Dropping %d %s %s bar(s) older than the stored history",
+                                   len(bars) - len(newer), symbol, timeframe)
+                    written += self.history.append_bars(symbol, timeframe, newer)
+            except Exception:
+                logger.exception("Writing %d %s %s bar(s) to the history store failed", len(rows), symbol, timeframe)
+                unwritten[(symbol, timeframe)] = rows
+        return written, unwritten
+
+    def restore_pending(self, unwritten: Dict[Tuple[str, str], List[tuple]]):
+        """Queue bars that failed to write again, ahead of any finished since"""
+        for key, rows in unwritten.items():
+            self._pending[key] = rows + self._pending.get(key, [])
+
+    def flush(self) -> int:
+        """Append the bars finished since the last flush to the history store"""
+        written, unwritten = self.write_pending(self.take_pending())
+        self.restore_pending(unwritten)
+        return written
+
+    def columns(self, symbol: str, timeframe: str, limit: int = 100, partial: bool = True) -> np.ndarray:
+        """Most recent bars as a BAR_DTYPE array, oldest first, ending with the open bar if ``partial``"""
+        if timeframe not in self.timeframes:
+            raise ValueError(f"Timeframe {timeframe} is not aggregated; use one of {', '.join(self.timeframes)}")
+        frames = self._frames.get(symbol)
+        if frames is None or limit <= 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        frame = frames[self.timeframes.index(timeframe)]
+        open_bar = frame.bar if partial else None
+        finished = frame.ring.latest(limit - 1 if open_bar is not None else limit)
+        if open_bar is None:
+            return finished
+        return np.concatenate([finished, np.array([_row(open_bar)], dtype=BAR_DTYPE)])
+
+    def bars(self, symbol: str, timeframe: str, limit: int = 100, partial: bool = True) -> List[Dict[str, Any]]:
+        """Most recent bars as records, oldest first; ``closed`` is False for the open bar"""
+        bars = self.columns(symbol, timeframe, limit, partial)
+        records = [
+            {"timestamp": timestamp, "open": o, "high": h, "low": lo, "close": c,
+             "volume": v, "vwap": vwap, "ticks": ticks, "closed": True}
+            for timestamp, o, h, lo, c, v, vwap, ticks in zip(
+                bars["timestamp"].astype("datetime64[us]").tolist(), *(bars[name].tolist() for name in BAR_DTYPE.names[1:])
+            )
+        ]
+        if partial and records:
+            records[-1]["closed"] = False
+        return records
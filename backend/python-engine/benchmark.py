@@ -0,0 +1,412 @@
+"""Benchmarks of the engine's hot paths, with JSON results and regression checks
+
+Every benchmark drives a ``TradingEngine`` in-process (the API scenario
+drives the FastAPI app over an in-process ASGI transport), so results
+reflect engine cost rather than network or server setup.
+
+    python benchmark.py run --output results.json [--quick] [--only ticks,api]
+    python benchmark.py run --baseline baseline.json --threshold 0.2
+    python benchmark.py compare baseline.json results.json
+
+``compare`` (and ``run --baseline``) flags every metric that got worse by
+more than the threshold and exits with status 1 if there were any.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from models import OrderRequest, OrderSide, OrderType
+from risk_metrics import compute_risk_metrics
+from trading_engine import TradingEngine
+
+# Relative change beyond which a metric counts as a regression
+DEFAULT_THRESHOLD = 0.15
+
+Metrics = Dict[str, Dict[str, Any]]
+
+
+def _metric(value: float, unit: str, better: str) -> Dict[str, Any]:
+    return {"value": round(float(value), 3), "unit": unit, "better": better}
+
+
+def _rate(count: int, seconds: float, unit: str) -> Dict[str, Any]:
+    return _metric(count / seconds, unit, "higher")
+
+
+def _latencies(prefix: str, samples_ns: Sequence[int]) -> Metrics:
+    """p50, p90 and p99 of per-call latencies, in microseconds"""
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1000.0
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {
+        f"{prefix}.p50_us": _metric(p50, "us", "lower"),
+        f"{prefix}.p90_us": _metric(p90, "us", "lower"),
+        f"{prefix}.p99_us": _metric(p99, "us", "lower"),
+    }
+
+
+def _median_seconds(fn: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of ``repeat`` calls"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return float(np.median(times))
+
+
+def _engine(balance: float = 1e9, leverage: float = 10.0) -> TradingEngine:
+    return TradingEngine(initial_balance=balance, leverage=leverage)
+
+
+def _order(symbol: str, side: OrderSide, quantity: float = 1.0, price: Optional[float] = None,
+           **exits: float) -> OrderRequest:
+    order_type = OrderType.MARKET if price is None else OrderType.LIMIT
+    return OrderRequest(symbol=symbol, type=order_type, side=side, quantity=quantity, price=price, **exits)
+
+
+def _random_walk(rng: random.Random, count: int, start: float = 100.0, step: float = 1e-4) -> List[float]:
+    prices, price = [], start
+    for _ in range(count):
+        price *= 1 + rng.uniform(-step, step)
+        prices.append(price)
+    return prices
+
+
+def bench_ticks(quick: bool) -> Metrics:
+    """Ticks per second with open positions, exit triggers and resting limit orders"""
+    symbols = [f"SYM{i}" for i in range(20)]
+    count = 20_000 if quick else 200_000
+    rng = random.Random(1)
+
+    def setup() -> TradingEngine:
+        engine = _engine()
+        for symbol in symbols:
+            engine.update_market_price(symbol, 100.0)
+            engine.place_order(_order(symbol, OrderSide.BUY, stop_loss=50.0, take_profit=200.0))
+            for level in range(50):
+                engine.place_order(_order(symbol, OrderSide.BUY, price=60.0 + level * 0.1))
+        return engine
+
+    ticks = [(symbols[i % len(symbols)], price) for i, price in enumerate(_random_walk(rng, count))]
+    engine = setup()
+    started = time.perf_counter()
+    for symbol, price in ticks:
+        engine.update_market_price(symbol, price)
+    single = time.perf_counter() - started
+
+    engine = setup()
+    now = datetime(2024, 1, 1)
+    stamped = [(symbol, price, now + timedelta(microseconds=i)) for i, (symbol, price) in enumerate(ticks)]
+    started = time.perf_counter()
+    for i in range(0, count, 1000):
+        engine.update_market_prices(stamped[i:i + 1000])
+    batched = time.perf_counter() - started
+
+    return {
+        "ticks.single.rate": _rate(count, single, "ticks/s"),
+        "ticks.batched.rate": _rate(count, batched, "ticks/s"),
+    }
+
+
+def bench_place_order(quick: bool) -> Metrics:
+    """Latency percentiles of placing market and limit orders"""
+    count = 5_000 if quick else 50_000
+    engine = _engine()
+    engine.update_market_price("BTC", 100.0)
+    perf = time.perf_counter_ns
+
+    market = []
+    for i in range(count):
+        request = _order("BTC", OrderSide.BUY if i % 2 == 0 else OrderSide.SELL)
+        started = perf()
+        engine.place_order(request)
+        market.append(perf() - started)
+
+    limit = []
+    for i in range(count):
+        request = _order("BTC", OrderSide.BUY, price=50.0 + (i % 1000) * 0.01)
+        started = perf()
+        engine.place_order(request)
+        limit.append(perf() - started)
+
+    return {**_latencies("place_order.market", market), **_latencies("place_order.limit", limit)}
+
+
+def bench_limit_depth(quick: bool) -> Metrics:
+    """Per-tick cost with a deep book that does not cross, and cost per filled limit order"""
+    depths = (10, 100, 1_000) if quick else (10, 100, 1_000, 10_000)
+    ticks = 2_000 if quick else 20_000
+    results: Metrics = {}
+    for depth in depths:
+        engine = _engine()
+        engine.update_market_price("BTC", 100.0)
+        for i in range(depth):
+            engine.place_order(_order("BTC", OrderSide.BUY, price=50.0 + 40.0 * i / depth))
+        started = time.perf_counter()
+        for i in range(ticks):
+            engine.update_market_price("BTC", 100.0 + (i % 2) * 0.01)
+        idle = time.perf_counter() - started
+
+        started = time.perf_counter()
+        engine.update_market_price("BTC", 10.0)
+        crossed = time.perf_counter() - started
+        results[f"limit_depth.{depth}.tick_us"] = _metric(idle / ticks * 1e6, "us", "lower")
+        results[f"limit_depth.{depth}.fill_us"] = _metric(crossed / depth * 1e6, "us", "lower")
+    return results
+
+
+def bench_margin_call(quick: bool) -> Metrics:
+    """Cost of a tick batch that triggers a margin call, by number of open positions
+
+    The same batch with a drop too small to call margin is timed as well,
+    so the difference is the liquidation itself.
+    """
+    sizes = (10, 100) if quick else (10, 100, 1_000)
+    repeat = 3 if quick else 5
+    results: Metrics = {}
+    for size in sizes:
+        symbols = [f"SYM{i}" for i in range(size)]
+
+        def run(drop: float):
+            # Half the margin in use at 100x, so a 1.6% drop leaves ~40% margin level
+            engine = _engine(balance=10_000.0, leverage=100.0)
+            quantity = 10_000.0 * 100.0 * 0.5 / size / 100.0
+            for symbol in symbols:
+                engine.update_market_price(symbol, 100.0)
+                engine.place_order(_order(symbol, OrderSide.BUY, quantity))
+            now = datetime(2024, 1, 1)
+            ticks = [(symbol, 100.0 * (1 - drop), now) for symbol in symbols]
+            started = time.perf_counter()
+            engine.update_market_prices(ticks)
+            elapsed = time.perf_counter() - started
+            return elapsed, len(engine.liquidations)
+
+        # Keep the margin call warnings out of the output
+        engine_logger = logging.getLogger("trading_engine")
+        level = engine_logger.level
+        engine_logger.setLevel(logging.ERROR)
+        try:
+            called = [run(0.016) for _ in range(repeat)]
+            quiet = [run(0.005) for _ in range(repeat)]
+        finally:
+            engine_logger.setLevel(level)
+        if not all(liquidations for _, liquidations in called) or any(liquidations for _, liquidations in quiet):
+            raise RuntimeError("Margin call scenario did not liquidate as expected")
+        called_ms = float(np.median([t for t, _ in called])) * 1e3
+        quiet_ms = float(np.median([t for t, _ in quiet])) * 1e3
+        results[f"margin_call.{size}.batch_ms"] = _metric(called_ms, "ms", "lower")
+        results[f"margin_call.{size}.liquidation_ms"] = _metric(max(called_ms - quiet_ms, 0.0), "ms", "lower")
+    return results
+
+
+def bench_risk_metrics(quick: bool) -> Metrics:
+    """Cost of risk metrics from the running accumulator and from a full recompute, by trade count"""
+    sizes = (1_000, 10_000) if quick else (1_000, 10_000, 100_000)
+    rng = random.Random(2)
+    results: Metrics = {}
+    for size in sizes:
+        engine = _engine()
+        for i, price in enumerate(_random_walk(rng, size, step=1e-3)):
+            engine.update_market_price("BTC", price)
+            engine.place_order(_order("BTC", OrderSide.BUY if i % 2 == 0 else OrderSide.SELL))
+        incremental = _median_seconds(engine.calculate_risk_metrics, 200)
+        full = _median_seconds(lambda: compute_risk_metrics(engine.ledger), 3 if size >= 100_000 else 10)
+        results[f"risk_metrics.{size}.incremental_us"] = _metric(incremental * 1e6, "us", "lower")
+        results[f"risk_metrics.{size}.full_ms"] = _metric(full * 1e3, "ms", "lower")
+    return results
+
+
+@contextlib.asynccontextmanager
+async def _in_memory_api():
+    """The FastAPI app backed by a fresh in-memory manager, without journal, database or history files"""
+    import main as api
+    from accounts import DEFAULT_ACCOUNT
+    from bars import BarAggregator
+    from command_queue import EngineCommandQueue
+
+    saved = api.engine_queue, api.trade_store, api.bar_aggregator
+    manager = api._create_manager()
+    manager.reset(DEFAULT_ACCOUNT)
+    api.engine_queue = EngineCommandQueue(manager)
+    api.trade_store = None
+    api.bar_aggregator = BarAggregator()
+    await api.engine_queue.start()
+    try:
+        yield api.app
+    finally:
+        await api.engine_queue.stop()
+        if hasattr(manager, "close"):
+            manager.close()
+        api.engine_queue, api.trade_store, api.bar_aggregator = saved
+
+
+async def _api_load(requests: int, concurrency: int) -> Metrics:
+    import httpx
+
+    async with _in_memory_api() as app:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/market-price/BTC", params={"price": 100.0})
+            rng = random.Random(3)
+            # (name, method, path, params, body), weighted like a busy client
+            scenarios = [
+                ("tick", "POST", "/market-price/BTC", lambda: {"price": 100.0 + rng.uniform(-1, 1)}, None),
+                ("order", "POST", "/orders", None,
+                 lambda: {"symbol": "BTC", "type": "market", "side": rng.choice(["buy", "sell"]), "quantity": 0.1}),
+                ("portfolio", "GET", "/portfolio", None, None),
+                ("trades", "GET", "/trades", lambda: {"limit": 50}, None),
+            ]
+            weights = [5, 2, 2, 1]
+            plan = rng.choices(scenarios, weights, k=requests)
+            latencies: Dict[str, List[int]] = {name: [] for name, *_ in scenarios}
+            next_request = iter(plan)
+
+            async def worker():
+                for name, method, path, params, body in next_request:
+                    started = time.perf_counter_ns()
+                    response = await client.request(method, path, params=params() if params else None,
+                                                    json=body() if body else None)
+                    latencies[name].append(time.perf_counter_ns() - started)
+                    if response.status_code >= 500:
+                        raise RuntimeError(f"{method} {path} failed with {response.status_code}")
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+    results = {"api.rate": _rate(requests, elapsed, "requests/s")}
+    for name, samples in latencies.items():
+        if samples:
+            results.update(_latencies(f"api.{name}", samples))
+    return results
+
+
+def bench_api(quick: bool) -> Metrics:
+    """Requests per second and per-endpoint latency of a mixed load on the FastAPI app"""
+    return asyncio.run(_api_load(1_000 if quick else 10_000, concurrency=16))
+
+
+BENCHMARKS: Dict[str, Callable[[bool], Metrics]] = {
+    "ticks": bench_ticks,
+    "place_order": bench_place_order,
+    "limit_depth": bench_limit_depth,
+    "margin_call": bench_margin_call,
+    "risk_metrics": bench_risk_metrics,
+    "api": bench_api,
+}
+
+
+def run(names: Optional[Sequence[str]] = None, quick: bool = False,
+        log: Callable[[str], None] = lambda line: None) -> Dict[str, Any]:
+    """Run the named benchmarks (all by default) and return the results document"""
+    names = list(names or BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+    metrics: Metrics = {}
+    for name in names:
+        started = time.perf_counter()
+        metrics.update(BENCHMARKS[name](quick))
+        log(f"{name}: {time.perf_counter() - started:.1f}s")
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "quick": quick,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "metrics": metrics,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """Per-metric changes from a baseline; ``status`` is regression, improvement or ok
+
+    ``change`` is relative and positive when the metric got better.
+    Metrics missing from either document are skipped.
+    """
+    rows = []
+    for name, metric in current["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None or not base["value"]:
+            continue
+        change = (metric["value"] - base["value"]) / abs(base["value"])
+        if metric["better"] == "lower":
+            change = -change
+        status = "regression" if change < -threshold else "improvement" if change > threshold else "ok"
+        rows.append({"metric": name, "baseline": base["value"], "current": metric["value"],
+                     "unit": metric["unit"], "change": change, "status": status})
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    width = max([len(row["metric"]) for row in rows] + [6])
+    lines = [f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}  status"]
+    for row in rows:
+        lines.append(f"{row['metric']:<{width}}  {row['baseline']:>12.3f}  {row['current']:>12.3f}  "
+                     f"{row['change']:>+8.1%}  {row['status']}")
+    return "\n".join(lines)
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _report(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    if baseline.get("quick") != current.get("quick"):
+        print("warning: comparing quick and full runs", file=sys.stderr)
+    rows = compare(baseline, current, threshold)
+    print(format_comparison(rows))
+    regressions = [row["metric"] for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run benchmarks and write the results as JSON")
+    run_parser.add_argument("--output", "-o", help="results file (printed to stdout if omitted)")
+    run_parser.add_argument("--only", help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    run_parser.add_argument("--quick", action="store_true", help="smaller sizes, for a fast check")
+    run_parser.add_argument("--baseline", help="compare against this results file when done")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return _report(_load(args.baseline), _load(args.current), args.threshold)
+
+    names = args.only.split(",") if args.only else None
+    results = run(names, args.quick, log=lambda line: print(line, file=sys.stderr))
+    document = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+    else:
+        print(document)
+    if args.baseline:
+        return _report(_load(args.baseline), results, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
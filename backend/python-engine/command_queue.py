@@ -0,0 +1,327 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from models import LiquidationReport, Order, Position, Trade
+from accounts import AccountState
+from ledger import TradeLedger
+from risk_metrics import RiskAccumulator
+from config import COMMAND_BATCH_SIZE, ANALYTICS_WORKERS, TRADE_MEMORY_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EngineSnapshot:
+    """Read-only view of one account published after each command batch
+
+    Orders and positions are copies, so later engine mutations never show
+    through. The trade ledger is append-only, so the snapshot keeps a
+    reference to the account's ledger and the number of trades that existed
+    when it was taken; once older trades are trimmed from memory the ledger
+    starts at its ``offset``. ``risk`` holds the account's running risk
+    statistics and ``opened_at`` names the account's current trade history.
+    """
+
+    account_id: str
+    version: int
+    summary: Dict[str, Any]
+    orders: Tuple[Order, ...]
+    positions: Tuple[Position, ...]
+    liquidations: Tuple[LiquidationReport, ...]
+    risk: RiskAccumulator
+    trade_count: int
+    opened_at: datetime
+    _ledger: TradeLedger = field(repr=False)
+
+    @property
+    def ledger(self) -> TradeLedger:
+        """The account's trade columns as of this snapshot, without copying"""
+        return self._ledger.head(self.trade_count)
+
+    @property
+    def trades(self) -> List[Trade]:
+        return self.ledger.to_trades()
+
+
+class _AccountMirror:
+    """Reader-side copy of an account, updated from AccountState deltas"""
+
+    def __init__(self):
+        self.positions: Dict[str, Position] = {}
+        self.orders: Tuple[Order, ...] = ()
+        self.ledger = TradeLedger()
+
+    def apply(self, state: AccountState):
+        if state.full:
+            # The account was opened or reset - start from scratch. Earlier
+            # snapshots keep the old ledger. An engine restored from a
+            # journal snapshot may hold only the tail of its history.
+            self.positions = {}
+            self.ledger = TradeLedger()
+            self.ledger.offset = state.new_trades.offset
+        positions = dict(self.positions)
+        for symbol, position in state.positions.items():
+            if position is None:
+                positions.pop(symbol, None)
+            else:
+                positions[symbol] = position
+        self.positions = positions
+        if state.orders is not None:
+            self.orders = state.orders
+        self.ledger.extend(state.new_trades)
+
+    def trim(self, keep: int, persisted: int) -> bool:
+        """Drop persisted trades from memory, keeping at least the last ``keep``
+
+        Trades are only dropped a batch of at least ``keep`` at a time, so
+        the copy this takes is amortised over as many appends. Returns
+        whether any were dropped.
+        """
+        ledger = self.ledger
+        drop = min(len(ledger) - keep, persisted - ledger.offset)
+        if drop < keep:
+            return False
+        self.ledger = ledger.slice(drop)
+        return True
+
+
+class _Execute:
+    """Writer command running one engine method, which the writer may batch with its neighbours"""
+
+    __slots__ = ("account_id", "method", "args")
+
+    def __init__(self, account_id: str, method: str, args: tuple):
+        self.account_id = account_id
+        self.method = method
+        self.args = args
+
+    def __call__(self, manager) -> Any:
+        return manager.execute(self.account_id, self.method, *self.args)
+
+
+class EngineCommandQueue:
+    """Serializes every engine mutation through one writer task
+
+    Handlers submit commands (callables taking the account manager) and
+    await their result. The writer drains up to ``max_batch`` queued
+    commands at a time, runs them in arrival order, collects what changed in
+    each touched account, publishes fresh per-account snapshots and only
+    then resolves the callers' futures, so a caller always reads its own
+    writes. Consecutive ``execute`` commands in a batch go to the manager
+    together through ``execute_many``, which a sharded manager runs on its
+    shards in parallel. Reads are served from ``snapshot()`` without touching the live
+    engines, and heavy analytics run on ``executor`` against a snapshot.
+
+    With a ``store`` (a ``TradeStore``), every batch's changes are handed
+    to its background writer after the callers are answered; the writer
+    only holds the queue back once it is far behind. Accounts then keep at
+    most about ``trade_memory_limit`` persisted trades in memory, in the
+    engines as well as the snapshots (0 keeps all of them).
+    """
+
+    def __init__(
+        self,
+        manager,
+        max_batch: int = COMMAND_BATCH_SIZE,
+        executor: Optional[Executor] = None,
+        journal=None,
+        store=None,
+        trade_memory_limit: int = TRADE_MEMORY_LIMIT,
+    ):
+        self.manager = manager
+        self.journal = journal
+        self.store = store
+        self.trade_memory_limit = trade_memory_limit
+        self.max_batch = max_batch
+        self.executor = executor or ThreadPoolExecutor(max_workers=ANALYTICS_WORKERS)
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._mirrors: Dict[str, _AccountMirror] = {}
+        self._snapshots: Dict[str, EngineSnapshot] = {}
+        self._version = 0
+        # False while the journal cannot be synced: commands still apply and
+        # succeed, but would be lost in a crash until a later commit succeeds
+        self.durable = True
+
+    def snapshot(self, account_id: str) -> Optional[EngineSnapshot]:
+        """Latest published snapshot of an account, None if it was never opened"""
+        return self._snapshots.get(account_id)
+
+    def accounts(self) -> List[str]:
+        return list(self._snapshots)
+
+    @property
+    def depth(self) -> int:
+        """Commands queued and not yet run"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _publish(self) -> List[Tuple[EngineSnapshot, AccountState]]:
+        """Fold the manager's account changes into new snapshots and return them with the changes"""
+        self._version += 1
+        updates = []
+        for state in self.manager.collect():
+            mirror = self._mirrors.get(state.account_id)
+            if mirror is None:
+                mirror = self._mirrors[state.account_id] = _AccountMirror()
+            mirror.apply(state)
+            if self.store is not None and self.trade_memory_limit > 0:
+                persisted = self.store.persisted(state.account_id, state.opened_at)
+                if mirror.trim(self.trade_memory_limit, persisted):
+                    # The engine drops the same trades, so neither it nor
+                    # the journal snapshots keep the full history
+                    self.manager.trim_trades(state.account_id, state.opened_at, mirror.ledger.offset)
+            snapshot = self._snapshots[state.account_id] = EngineSnapshot(
+                account_id=state.account_id,
+                version=self._version,
+                summary=state.summary,
+                orders=mirror.orders,
+                positions=tuple(mirror.positions.values()),
+                liquidations=state.liquidations,
+                risk=state.risk,
+                trade_count=len(mirror.ledger),
+                opened_at=state.opened_at,
+                _ledger=mirror.ledger
+            )
+            updates.append((snapshot, state))
+        return updates
+
+    async def _persist(self, updates: List[Tuple[EngineSnapshot, AccountState]]):
+        """Hand a batch's changes to the store, waiting off the loop only if its queue is full"""
+        if self.store is not None and updates and not self.store.offer(updates):
+            await asyncio.to_thread(self.store.put, updates)
+
+    async def start(self):
+        """Start the writer task on the running event loop"""
+        if self._writer is None:
+            await self._persist(self._publish())
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer after the queued commands have run"""
+        if self._writer is not None:
+            await self._queue.join()
+            self._writer.cancel()
+            self._writer = None
+        self.executor.shutdown(wait=False)
+
+    def post(self, command: Callable[[Any], Any]) -> asyncio.Future:
+        """Queue a command without waiting, returning a future for its result"""
+        if self._writer is None:
+            raise RuntimeError("Command queue is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((command, future))
+        return future
+
+    async def submit(self, command: Callable[[Any], Any]) -> Any:
+        """Queue a command for the writer and wait for its result"""
+        return await self.post(command)
+
+    async def execute(self, account_id: str, method: str, *args) -> Any:
+        """Run a TradingEngine method on an account through the writer"""
+        return await self.submit(_Execute(account_id, method, args))
+
+    async def analyze(self, account_id: str, fn: Callable[[EngineSnapshot], Any]) -> Any:
+        """Run an analytics function against an account snapshot off the event loop"""
+        snapshot = self._snapshots[account_id]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, snapshot)
+
+    async def _commit(self, results: List[Tuple[asyncio.Future, Any, Optional[Exception]]]):
+        """Make the batch's journal records durable before anyone sees its results
+
+        The fsync runs off the event loop; commands queued meanwhile form
+        the next batch and share its sync. If the sync fails the results
+        are still returned, with ``durable`` cleared until one succeeds.
+        """
+        try:
+            await asyncio.to_thread(self.journal.commit)
+        except OSError:
+            # The commands already changed the engines, so they did succeed;
+            # their records stay buffered and the next batch retries the sync
+            if self.durable:
+                logger.exception("Journal commit failed; running without durability until it recovers")
+            self.durable = False
+            return results
+        if not self.durable:
+            logger.warning("Journal commit recovered")
+            self.durable = True
+        if self.journal.snapshot_due():
+            try:
+                # Exporting and pickling the engines is slow, so it runs off
+                # the loop; the writer waits for it, so no command runs
+                # against the engines meanwhile
+                await asyncio.to_thread(self._write_snapshot)
+            except Exception:
+                # The journal still holds everything; the next batch retries
+                logger.exception("Journal snapshot failed")
+        return results
+
+    def _write_snapshot(self):
+        self.journal.write_snapshot(self.manager.export_state())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._run_batch(batch)
+            except Exception as e:
+                # Keep the writer alive; whoever is still waiting gets the error
+                logger.exception("Engine command batch failed")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _execute_run(self, run: List[Tuple[_Execute, asyncio.Future]], results: list):
+        """Apply consecutive execute commands, as one execute_many call if there are several"""
+        if len(run) == 1:
+            self._apply(run[0], results)
+            return
+        outcomes = self.manager.execute_many([(c.account_id, c.method, c.args) for c, _ in run])
+        for (_, future), (ok, value) in zip(run, outcomes):
+            results.append((future, value, None) if ok else (future, None, value))
+
+    def _apply(self, item: Tuple[Callable[[Any], Any], asyncio.Future], results: list):
+        command, future = item
+        try:
+            results.append((future, command(self.manager), None))
+        except Exception as e:
+            results.append((future, None, e))
+
+    async def _run_batch(self, batch: List[Tuple[Callable[[Any], Any], asyncio.Future]]):
+        results = []
+        run = []
+        for item in batch:
+            if isinstance(item[0], _Execute):
+                run.append(item)
+                continue
+            if run:
+                self._execute_run(run, results)
+                run = []
+            self._apply(item, results)
+        if run:
+            self._execute_run(run, results)
+
+        if self.journal is not None:
+            results = await self._commit(results)
+
+        updates = self._publish()
+
+        for future, result, error in results:
+            if future.cancelled():
+                pass
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        await self._persist(updates)
@@ -12,13 +12,74 @@ COMMISSION_RATE = float(os.getenv("COMMISSION_RATE", "0.001"))  # 0.1%
 # Risk Management
 MARGIN_CALL_LEVEL = float(os.getenv("MARGIN_CALL_LEVEL", "50.0"))  # 50%
 MAX_LEVERAGE = float(os.getenv("MAX_LEVERAGE", "100.0"))
+LIQUIDATION_POLICY = os.getenv("LIQUIDATION_POLICY", "worst_pnl")  # worst_pnl, largest_margin, partial
+
+# Order admission: largest share of buying power (equity x leverage) one
+# symbol may take, and largest loss from the P&L peak, as a fraction of the
+# account value at the peak, before orders adding exposure are refused
+# (0 turns either check off)
+MAX_SYMBOL_EXPOSURE = float(os.getenv("MAX_SYMBOL_EXPOSURE", "1.0"))
+MAX_LOSS_PERCENT = float(os.getenv("MAX_LOSS_PERCENT", "0.1"))  # 10%
+
+# Cross-check incremental equity/margin aggregates against a full recompute
+DEBUG_CHECKS = os.getenv("ENGINE_DEBUG_CHECKS", "false").lower() in ("1", "true", "yes")
 
 # API Configuration
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 
-# Database Configuration (if needed in future)
+# Command queue: commands applied per writer batch and analytics worker threads
+COMMAND_BATCH_SIZE = int(os.getenv("COMMAND_BATCH_SIZE", "256"))
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "2"))
+
+# Accounts: number of worker processes to shard account engines across
+# (0 keeps every account in the API process)
+ENGINE_SHARDS = int(os.getenv("ENGINE_SHARDS", "0"))
+
+# Streaming: maximum undelivered discrete events held per WebSocket client
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "1000"))
+
+# Market risk: seconds per sampled return interval and intervals kept in the
+# rolling VaR window
+RISK_SAMPLE_SECONDS = float(os.getenv("RISK_SAMPLE_SECONDS", "60"))
+RISK_WINDOW = int(os.getenv("RISK_WINDOW", "500"))
+
+# Bars: timeframes aggregated from ticks and finished bars kept per timeframe
+BAR_TIMEFRAMES = [tf.strip() for tf in os.getenv("BAR_TIMEFRAMES", "1s,1m,5m,1h").split(",") if tf.strip()]
+BAR_CAPACITY = int(os.getenv("BAR_CAPACITY", "1000"))
+# Seconds between writes of finished bars to the history store
+BAR_FLUSH_SECONDS = float(os.getenv("BAR_FLUSH_SECONDS", "1"))
+
+# Directory of the memory-mapped tick and bar history (empty to keep none)
+HISTORY_PATH = os.getenv("HISTORY_PATH", "historical_data")
+
+# Journal: directory of the command journal and snapshots (empty to run
+# without one), and how often a snapshot bounds the journal tail
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+JOURNAL_SNAPSHOT_SECONDS = float(os.getenv("JOURNAL_SNAPSHOT_SECONDS", "300"))
+JOURNAL_SNAPSHOT_RECORDS = int(os.getenv("JOURNAL_SNAPSHOT_RECORDS", "100000"))
+
+# Persistence: SQLite database of trades, orders and account snapshots
+# (empty to keep none), engine batches the background writer may fall
+# behind by, batches written per transaction and seconds between account
+# and position snapshots
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./trading_engine.db")
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "1024"))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "64"))
+PERSIST_POSITION_SECONDS = float(os.getenv("PERSIST_POSITION_SECONDS", "5"))
+
+# Trades kept in memory per account, by its engine and its snapshots, once
+# older ones are persisted (0 keeps the whole history); /trades reads older
+# pages from the database
+TRADE_MEMORY_LIMIT = int(os.getenv("TRADE_MEMORY_LIMIT", "0"))
+# Latest trades kept on Portfolio.trades; the rest are in the ledger and database
+PORTFOLIO_RECENT_TRADES = int(os.getenv("PORTFOLIO_RECENT_TRADES", "100"))
+
+# Metrics: time one in every METRICS_SAMPLE_EVERY calls of each engine
+# stage (1 times every call, 0 only counts them); ENGINE_PROFILING allows
+# per-request cProfile/tracemalloc reports on demand
+METRICS_SAMPLE_EVERY = int(os.getenv("METRICS_SAMPLE_EVERY", "16"))
+PROFILING_ENABLED = os.getenv("ENGINE_PROFILING", "false").lower() in ("1", "true", "yes")
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
@@ -0,0 +1,310 @@
+import os
+import pickle
+import struct
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from accounts import CommandClock
+from config import JOURNAL_SNAPSHOT_RECORDS, JOURNAL_SNAPSHOT_SECONDS
+
+# Record kinds. Fills are kept for audit; replaying the commands re-creates them.
+EXECUTE = "execute"
+RESET = "reset"
+PRICE = "price"
+PRICES = "prices"
+FILL = "fill"
+
+# Every record and snapshot is framed as (payload length, CRC-32 of payload)
+_HEADER = struct.Struct("<II")
+
+# Engine methods that only read state and are not journaled
+_READ_ONLY_PREFIXES = ("get_", "calculate_")
+
+Record = Tuple[int, str, Any, Any]
+
+
+def _frame(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_frames(path: str) -> Iterator[Tuple[int, bytes]]:
+    """(end offset, payload) of each intact frame, stopping at a torn or corrupt one"""
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            offset += _HEADER.size + length
+            yield offset, payload
+
+
+def _fsync_directory(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Append-only binary journal of engine commands, with periodic snapshots
+
+    Records are length-prefixed, CRC-checked pickles of
+    ``(seq, kind, timestamp, data)`` in segment files named after their
+    first sequence number. ``append`` only buffers; ``commit`` writes
+    everything buffered with one write and one fsync, so a whole batch of
+    commands costs a single sync (group commit).
+
+    A snapshot holds the complete engine state as of a sequence number.
+    Writing one starts a new segment and deletes the segments and
+    snapshots no longer needed, keeping the last ``keep_snapshots``. On
+    open, a torn record at the end of the last segment is cut off.
+    """
+
+    def __init__(self, directory: str, snapshot_records: int = JOURNAL_SNAPSHOT_RECORDS,
+                 snapshot_seconds: float = JOURNAL_SNAPSHOT_SECONDS, keep_snapshots: int = 2):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_records = snapshot_records
+        self.snapshot_seconds = snapshot_seconds
+        self.keep_snapshots = keep_snapshots
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._snapshot_time = time.monotonic()
+        self._buffer: List[bytes] = []
+        self._file = None
+
+        snapshots = self._snapshots()
+        if snapshots:
+            self.snapshot_seq = self.seq = snapshots[-1][0]
+        segments = self._segments()
+        if segments:
+            path = segments[-1][1]
+            end = 0
+            for end, payload in _read_frames(path):
+                self.seq = max(self.seq, pickle.loads(payload)[0])
+            if end < os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+            self._file = open(path, "ab")
+        else:
+            self._start_segment()
+
+    def _path(self, prefix: str, seq: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"{prefix}-{seq:020d}.{suffix}")
+
+    def _list(self, prefix: str, suffix: str) -> List[Tuple[int, str]]:
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix + "-") and name.endswith("." + suffix):
+                found.append((int(name[len(prefix) + 1:-len(suffix) - 1]), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        return self._list("journal", "log")
+
+    def _snapshots(self) -> List[Tuple[int, str]]:
+        return self._list("snapshot", "bin")
+
+    def _start_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self._path("journal", self.seq + 1, "log"), "ab")
+        _fsync_directory(self.directory)
+
+    def append(self, kind: str, timestamp: Any, data: Any) -> int:
+        """Buffer a record until the next commit; returns its sequence number"""
+        self.seq += 1
+        self._buffer.append(_frame(pickle.dumps((self.seq, kind, timestamp, data), pickle.HIGHEST_PROTOCOL)))
+        return self.seq
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def commit(self) -> int:
+        """Write and fsync every buffered record; returns how many were written
+
+        On failure the records stay buffered for the next commit to retry.
+        """
+        count = len(self._buffer)
+        if count:
+            start = self._file.tell()
+            try:
+                self._file.write(b"".join(self._buffer))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError:
+                # Drop whatever part made it to the file so a retry of the
+                # still-buffered records does not follow a torn frame
+                try:
+                    self._file.truncate(start)
+                except OSError:
+                    pass
+                raise
+            self._buffer = []
+        return count
+
+    def snapshot_due(self) -> bool:
+        unsnapshotted = self.seq - self.snapshot_seq
+        if unsnapshotted <= 0:
+            return False
+        return (unsnapshotted >= self.snapshot_records
+                or time.monotonic() - self._snapshot_time >= self.snapshot_seconds)
+
+    def write_snapshot(self, state: Dict[str, Any]):
+        """Persist the engine state as of the last appended record and rotate"""
+        self.commit()
+        payload = zlib.compress(pickle.dumps((self.seq, state), pickle.HIGHEST_PROTOCOL))
+        path = self._path("snapshot", self.seq, "bin")
+        with open(path + ".tmp", "wb") as f:
+            f.write(_frame(payload))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.snapshot_seq = self.seq
+        self._snapshot_time = time.monotonic()
+        self._start_segment()
+        self._prune()
+
+    def _prune(self):
+        snapshots = self._snapshots()
+        for _, path in snapshots[:-self.keep_snapshots]:
+            os.remove(path)
+        oldest = snapshots[-self.keep_snapshots:][0][0]
+        segments = self._segments()
+        # A segment ends where the next one starts; keep it if it holds
+        # anything after the oldest kept snapshot
+        for (first, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first - 1 <= oldest:
+                os.remove(path)
+
+    def _load_snapshot(self) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """The newest readable snapshot, falling back to older ones"""
+        for seq, path in reversed(self._snapshots()):
+            for _, payload in _read_frames(path):
+                return pickle.loads(zlib.decompress(payload))
+        return 0, None
+
+    def replay(self) -> Tuple[Optional[Dict[str, Any]], Iterator[Record]]:
+        """The latest snapshot's state and the records appended after it"""
+        snapshot_seq, state = self._load_snapshot()
+
+        def records():
+            for _, path in self._segments():
+                for _, payload in _read_frames(path):
+                    record = pickle.loads(payload)
+                    if record[0] > snapshot_seq:
+                        yield record
+
+        return state, records()
+
+    def close(self):
+        if self._file is not None:
+            self.commit()
+            self._file.close()
+            self._file = None
+
+
+class JournaledManager:
+    """Engine manager that journals every state-changing call before applying it
+
+    Commands are stamped by a shared ``CommandClock``, which the manager's
+    engines read their time from, so replaying a command with its journaled
+    time reproduces the same orders, fills and timestamps. Fill events are
+    journaled too, for audit. Everything else is delegated to the wrapped
+    manager.
+    """
+
+    def __init__(self, manager, journal: Journal, clock: CommandClock):
+        self.manager = manager
+        self.journal = journal
+        self.clock = clock
+        self.replaying = False
+        self.listener = manager.listener
+        manager.listener = self._on_event
+
+    def __getattr__(self, name: str):
+        return getattr(self.manager, name)
+
+    def __contains__(self, account_id: str) -> bool:
+        return account_id in self.manager
+
+    def _on_event(self, account_id: Optional[str], event_type: str, symbol: Optional[str], payload: Any):
+        if event_type == "fill" and not self.replaying:
+            self.journal.append(FILL, self.clock.now, (account_id, payload))
+        if self.listener is not None:
+            self.listener(account_id, event_type, symbol, payload)
+
+    def _run(self, kind: str, data: Any) -> Any:
+        self.journal.append(kind, self.clock.start(), data)
+        return self._apply(kind, data)
+
+    def _apply(self, kind: str, data: Any) -> Any:
+        if kind == EXECUTE:
+            account_id, method, args = data
+            return self.manager.execute(account_id, method, *args)
+        if kind == RESET:
+            return self.manager.reset(data)
+        if kind == PRICE:
+            return self.manager.update_market_price(*data)
+        if kind == PRICES:
+            return self.manager.update_market_prices(data)
+        raise ValueError(f"Unknown journal record kind: {kind}")
+
+    def execute(self, account_id: str, method: str, *args) -> Any:
+        if method.startswith(_READ_ONLY_PREFIXES):
+            return self.manager.execute(account_id, method, *args)
+        return self._run(EXECUTE, (account_id, method, args))
+
+    def execute_many(self, calls: List[Tuple[str, str, tuple]]) -> List[Tuple[bool, Any]]:
+        """Journal a batch of execute calls, each with its own time, and run them together"""
+        times = []
+        for account_id, method, args in calls:
+            if not method.startswith(_READ_ONLY_PREFIXES):
+                self.journal.append(EXECUTE, self.clock.start(), (account_id, method, args))
+            times.append(self.clock.now)
+        return self.manager.execute_many(calls, times)
+
+    def reset(self, account_id: str):
+        self._run(RESET, account_id)
+
+    def update_market_price(self, symbol: str, price: float):
+        self._run(PRICE, (symbol, price))
+
+    def update_market_prices(self, ticks) -> int:
+        return self._run(PRICES, list(ticks))
+
+    def snapshot(self):
+        self.journal.write_snapshot(self.manager.export_state())
+
+    def recover(self) -> int:
+        """Load the latest snapshot and replay the journal after it
+
+        Commands that failed when first applied fail the same way again and
+        are skipped. Returns the number of commands replayed.
+        """
+        state, records = self.journal.replay()
+        if state is not None:
+            self.manager.import_state(state)
+        replayed = 0
+        self.replaying = True
+        try:
+            for _, kind, timestamp, data in records:
+                if kind == FILL:
+                    continue
+                self.clock.now = timestamp
+                try:
+                    self._apply(kind, data)
+                except Exception:
+                    pass
+                replayed += 1
+        finally:
+            self.replaying = False
+        return replayed
@@ -0,0 +1,213 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from models import OrderSide, Trade
+
+_SIDES = (OrderSide.BUY, OrderSide.SELL)
+_SIDE_CODES = {side: code for code, side in enumerate(_SIDES)}
+
+# Side names by the code stored in the "side" column
+SIDE_NAMES = tuple(side.value for side in _SIDES)
+
+TRADE_FIELDS = tuple(Trade.model_fields)
+
+_DTYPES = {
+    "timestamp": "datetime64[us]",
+    "symbol": np.int32,
+    "side": np.int8,
+    "quantity": np.float64,
+    "price": np.float64,
+    "commission": np.float64,
+    "realized_pnl": np.float64,
+}
+
+
+def trade_id(seq: int, timestamp: datetime) -> str:
+    """Id of the trade at position ``seq`` of an account's history"""
+    return f"trade_{seq + 1}_{timestamp.timestamp()}"
+
+
+class TradeLedger:
+    """Append-only trade history stored column by column in NumPy arrays
+
+    Each column lives in a preallocated array that doubles when full, and
+    symbols are stored as codes into ``symbols``. ``Trade`` models are only
+    built when asked for (``trade``, ``to_trades``), so recording a fill
+    allocates nothing and analytics read the columns directly. Rows are
+    never modified once written, so a ``head`` view stays valid while the
+    ledger keeps growing.
+
+    ``offset`` is the position of the first held row in the account's full
+    trade history. It is non-zero for a ``slice``, e.g. once older rows
+    have been dropped from memory; trade ids and cursors count from the
+    start of the full history.
+    """
+
+    COLUMNS = tuple(_DTYPES)
+
+    def __init__(self, capacity: int = 1024):
+        self.symbols: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._size = 0
+        self.offset = 0
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.empty(capacity, dtype=dtype) for name, dtype in _DTYPES.items()
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Trade]:
+        return iter(self.to_trades())
+
+    @property
+    def capacity(self) -> int:
+        return len(self._columns["timestamp"])
+
+    def _grow(self, required: int):
+        capacity = max(self.capacity * 2, required, 16)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _code(self, symbol: str) -> int:
+        code = self._codes.get(symbol)
+        if code is None:
+            code = self._codes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return code
+
+    def append(self, symbol: str, side: OrderSide, quantity: float, price: float,
+               timestamp: datetime, commission: float, realized_pnl: float) -> int:
+        """Record a trade and return its row index"""
+        i = self._size
+        if i == self.capacity:
+            self._grow(i + 1)
+        columns = self._columns
+        columns["timestamp"][i] = np.datetime64(timestamp, "us")
+        columns["symbol"][i] = self._code(symbol)
+        columns["side"][i] = _SIDE_CODES[side]
+        columns["quantity"][i] = quantity
+        columns["price"][i] = price
+        columns["commission"][i] = commission
+        columns["realized_pnl"][i] = realized_pnl
+        self._size = i + 1
+        return i
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only view of a column's recorded rows, without copying"""
+        view = self._columns[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def head(self, n: int) -> "TradeLedger":
+        """A ledger over the first n rows sharing this ledger's arrays"""
+        view = TradeLedger.__new__(TradeLedger)
+        view.symbols = self.symbols
+        view._codes = self._codes
+        view._size = min(n, self._size)
+        view.offset = self.offset
+        view._columns = {name: self.column(name)[:view._size] for name in self.COLUMNS}
+        return view
+
+    def slice(self, start: int) -> "TradeLedger":
+        """A compact copy of the rows from start onwards, e.g. to ship elsewhere"""
+        chunk = TradeLedger.__new__(TradeLedger)
+        chunk.symbols = list(self.symbols)
+        chunk._codes = dict(self._codes)
+        chunk._size = max(self._size - start, 0)
+        chunk.offset = self.offset + min(start, self._size)
+        chunk._columns = {
+            name: column[start:self._size].copy() for name, column in self._columns.items()
+        }
+        return chunk
+
+    def extend(self, other: "TradeLedger"):
+        """Append every row of another ledger, translating its symbol codes"""
+        n = len(other)
+        if n == 0:
+            return
+        if self._size + n > self.capacity:
+            self._grow(self._size + n)
+        start, stop = self._size, self._size + n
+        translate = np.array([self._code(symbol) for symbol in other.symbols], dtype=np.int32)
+        for name in self.COLUMNS:
+            source = other._columns[name][:n]
+            if name == "symbol":
+                source = translate[source]
+            self._columns[name][start:stop] = source
+        self._size = stop
+
+    def trade(self, i: int) -> Trade:
+        """Materialize one row as a Trade model"""
+        columns = self._columns
+        timestamp = columns["timestamp"][i].item()
+        return Trade(
+            id=trade_id(self.offset + i, timestamp),
+            symbol=self.symbols[columns["symbol"][i]],
+            side=_SIDES[columns["side"][i]],
+            quantity=float(columns["quantity"][i]),
+            price=float(columns["price"][i]),
+            timestamp=timestamp,
+            commission=float(columns["commission"][i]),
+            realized_pnl=float(columns["realized_pnl"][i])
+        )
+
+    def to_trades(self, start: int = 0, stop: Optional[int] = None) -> List[Trade]:
+        """Materialize a range of rows as Trade models"""
+        stop = self._size if stop is None else min(stop, self._size)
+        return [self.trade(i) for i in range(start, stop)]
+
+    def select(self, symbols: Optional[Iterable[str]] = None, start: Optional[datetime] = None,
+               end: Optional[datetime] = None, cursor: int = 0) -> np.ndarray:
+        """Indices of the rows from ``cursor`` on that match the symbol and time filters
+
+        ``cursor`` counts from the start of the full history; the indices
+        returned are into this ledger. Bounds are naive local times like the
+        recorded timestamps; ``end`` is exclusive.
+        """
+        cursor = min(max(cursor - self.offset, 0), self._size)
+        rows = np.arange(cursor, self._size)
+        mask = None
+        if symbols is not None:
+            codes = [self._codes[symbol] for symbol in symbols if symbol in self._codes]
+            mask = np.isin(self._columns["symbol"][cursor:self._size], codes)
+        if start is not None or end is not None:
+            timestamps = self._columns["timestamp"][cursor:self._size]
+            in_range = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                in_range &= timestamps >= np.datetime64(start, "us")
+            if end is not None:
+                in_range &= timestamps < np.datetime64(end, "us")
+            mask = in_range if mask is None else mask & in_range
+        return rows if mask is None else rows[mask]
+
+    def records(self, rows: np.ndarray, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Build plain dicts for the given rows straight from the columns
+
+        ``fields`` projects the output onto a subset of the Trade fields.
+        Values are converted a column at a time and no model is validated.
+        """
+        fields = TRADE_FIELDS if fields is None else [f for f in TRADE_FIELDS if f in fields]
+        columns = self._columns
+        values: List[List[Any]] = []
+        timestamps = None
+        if "timestamp" in fields or "id" in fields:
+            timestamps = columns["timestamp"][rows].tolist()
+        for name in fields:
+            if name == "id":
+                offset = self.offset
+                values.append([trade_id(offset + i, t) for i, t in zip(rows.tolist(), timestamps)])
+            elif name == "timestamp":
+                values.append(timestamps)
+            elif name == "symbol":
+                symbols = self.symbols
+                values.append([symbols[code] for code in columns["symbol"][rows].tolist()])
+            elif name == "side":
+                values.append([SIDE_NAMES[code] for code in columns["side"][rows].tolist()])
+            else:
+                values.append(columns[name][rows].tolist())
+        return [dict(zip(fields, row)) for row in zip(*values)]
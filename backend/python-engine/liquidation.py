@@ -0,0 +1,105 @@
+import heapq
+from typing import Iterable, List, Tuple
+
+from models import LiquidationAction, LiquidationPolicy, Position
+from config import MARGIN_CALL_LEVEL
+
+# Partial reductions are rounded up by this much so the margin level ends
+# strictly above the target rather than on it
+_PARTIAL_EPSILON = 1e-9
+
+
+def margin_level(equity: float, notional: float, leverage: float) -> float:
+    """Margin level in percent, 100 when no margin is in use"""
+    used_margin = notional / leverage
+    if used_margin > 0:
+        return (equity / used_margin) * 100
+    return 100.0
+
+
+class LiquidationPlanner:
+    """Plan the closes needed to lift the margin level back above the call level
+
+    Closing a position at the current price realizes its unrealized P&L, so
+    equity only drops by the commission while used margin drops by the
+    position's margin. That lets the planner walk candidates in policy order
+    once, tracking equity and notional, and stop at the first point where the
+    margin level is restored.
+
+    Policies:
+        worst_pnl       close the most unprofitable positions first
+        largest_margin  close the positions tying up the most margin first
+        partial         walk in worst_pnl order but only reduce the last
+                        position as far as needed
+    """
+
+    def __init__(
+        self,
+        policy: LiquidationPolicy = LiquidationPolicy.WORST_PNL,
+        target_level: float = MARGIN_CALL_LEVEL,
+    ):
+        self.policy = LiquidationPolicy(policy)
+        self.target_level = target_level
+
+    def _candidates(self, positions: Iterable[Position]) -> List[Tuple[float, int, Position]]:
+        if self.policy == LiquidationPolicy.LARGEST_MARGIN:
+            heap = [(-abs(p.quantity * p.current_price), i, p) for i, p in enumerate(positions)]
+        else:
+            heap = [(p.unrealized_pnl, i, p) for i, p in enumerate(positions)]
+        heapq.heapify(heap)
+        return heap
+
+    def _reason(self, position: Position, margin: float, closed: bool) -> str:
+        if self.policy == LiquidationPolicy.LARGEST_MARGIN:
+            return f"largest margin in use ({margin:.2f})"
+        if not closed:
+            return f"partial reduction to restore margin level above {self.target_level:.2f}%"
+        return f"worst unrealized P&L ({position.unrealized_pnl:.2f})"
+
+    def plan(
+        self,
+        positions: Iterable[Position],
+        equity: float,
+        notional: float,
+        leverage: float,
+        commission_rate: float,
+    ) -> List[LiquidationAction]:
+        """Return the closes that restore the margin level, in execution order
+
+        Candidates are heapified and popped lazily, so the cost is
+        O(n + k log n) for k closes out of n positions.
+        """
+        actions = []
+        heap = self._candidates(positions)
+
+        while heap and margin_level(equity, notional, leverage) <= self.target_level:
+            _, _, position = heapq.heappop(heap)
+            position_notional = abs(position.quantity * position.current_price)
+            commission = position_notional * commission_rate
+            fraction = 1.0
+
+            if self.policy == LiquidationPolicy.PARTIAL:
+                # Solve (E - c*f) / ((N - n*f) / lev) * 100 > L for the smallest f
+                shortfall = self.target_level * notional - 100 * leverage * equity
+                relief = self.target_level * position_notional - 100 * leverage * commission
+                if relief > 0:
+                    fraction = min(1.0, (shortfall / relief) * (1 + _PARTIAL_EPSILON) + _PARTIAL_EPSILON)
+
+            closed = fraction >= 1.0
+            quantity = position.quantity if closed else position.quantity * fraction
+            margin_released = position_notional * fraction / leverage
+            actions.append(LiquidationAction(
+                symbol=position.symbol,
+                side=position.side,
+                quantity=quantity,
+                price=position.current_price,
+                realized_pnl=position.unrealized_pnl * (quantity / position.quantity),
+                margin_released=margin_released,
+                closed=closed,
+                reason=self._reason(position, position_notional / leverage, closed)
+            ))
+
+            equity -= commission * fraction
+            notional -= position_notional * fraction
+
+        return actions
@@ -1,19 +1,117 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import asyncio
+import functools
 import uvicorn
-from typing import List
+from contextlib import asynccontextmanager
+from typing import List, Optional, Sequence
 from datetime import datetime
 
 from models import (
-    OrderRequest, Portfolio, RiskMetrics, Order, Position, Trade
+    OrderRequest, OrderSide, Portfolio, RiskMetrics, Order, Position, Trade, LiquidationReport,
+    MarketPriceBatch, PriceTick, VaRMethod, VaRReport, Bar, Indicator, IndicatorSeries
 )
-from trading_engine import TradingEngine
-from config import INITIAL_BALANCE, DEFAULT_LEVERAGE, API_HOST, API_PORT
+from trading_engine import TradingEngine, verify_risk_metrics
+from admission import OrderRejected
+from risk_metrics import compute_risk_metrics, compute_trading_stats
+from accounts import DEFAULT_ACCOUNT, CommandClock, EngineManager, ShardedEngineManager
+from journal import Journal, JournaledManager
+from persistence import TradeStore, open_trade_store
+from command_queue import EngineCommandQueue, EngineSnapshot
+from streaming import EventHub, ClientStream
+from ledger import TRADE_FIELDS, TradeLedger
+from pagination import Page, TradeArchive, export_trades, page_models, page_trades
+from serialization import FastJSONResponse, ndjson, parse_fields
+from market_risk import MarketRisk
+from bars import BarAggregator
+from metrics import REGISTRY, MetricsMiddleware
+from profiling import ProfilingMiddleware, RequestProfiler
+from src.engine.market_data.historical_manager import HistoricalManager
+from src.engine.utils import indicators
+from config import (
+    INITIAL_BALANCE, DEFAULT_LEVERAGE, API_HOST, API_PORT, ENGINE_SHARDS, HISTORY_PATH, JOURNAL_DIR, DATABASE_URL,
+    BAR_FLUSH_SECONDS
+)
+
+# Fans engine events out to WebSocket subscribers
+event_hub = EventHub()
+
+# Market-wide interval returns for VaR, fed by the writer with every tick
+market_risk = MarketRisk()
+
+# OHLCV bars per symbol and timeframe, finished bars flushed to the history store
+bar_aggregator = BarAggregator(history=HistoricalManager(HISTORY_PATH) if HISTORY_PATH else None)
+
+def _create_manager(clock: Optional[CommandClock] = None):
+    """One engine per account, in this process or spread over ENGINE_SHARDS workers"""
+    factory = functools.partial(TradingEngine, initial_balance=INITIAL_BALANCE, leverage=DEFAULT_LEVERAGE)
+    if ENGINE_SHARDS > 0:
+        return ShardedEngineManager(factory, ENGINE_SHARDS, listener=event_hub.publish, clock=clock)
+    return EngineManager(factory, listener=event_hub.publish, clock=clock)
+
+# Every engine mutation goes through the single-writer command queue; reads
+# are served from the per-account snapshots it publishes after each batch
+engine_queue: EngineCommandQueue = None
+
+# Trades, orders and account snapshots persisted in the background; serves
+# the trade history no longer kept in memory
+trade_store: Optional[TradeStore] = None
+
+async def _flush_bars(stop: asyncio.Event):
+    """Write finished bars to the history store every BAR_FLUSH_SECONDS, off the tick path
+
+    The bars are taken on the event loop, between writer commands, and
+    written from a worker thread. Once ``stop`` is set, a last flush runs
+    and the task ends.
+    """
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), BAR_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _, unwritten = await asyncio.to_thread(bar_aggregator.write_pending, bar_aggregator.take_pending())
+        bar_aggregator.restore_pending(unwritten)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global engine_queue, trade_store
+    journal = None
+    trade_store = open_trade_store(DATABASE_URL)
+    if JOURNAL_DIR:
+        # Restore the accounts from the latest snapshot plus the journal tail
+        clock = CommandClock()
+        journal = Journal(JOURNAL_DIR)
+        manager = JournaledManager(_create_manager(clock), journal, clock)
+        if manager.recover():
+            manager.snapshot()
+    else:
+        manager = _create_manager()
+    if DEFAULT_ACCOUNT not in manager:
+        manager.reset(DEFAULT_ACCOUNT)
+    engine_queue = EngineCommandQueue(manager, journal=journal, store=trade_store)
+    await engine_queue.start()
+    stop_flushing = asyncio.Event()
+    bar_flusher = asyncio.create_task(_flush_bars(stop_flushing)) if bar_aggregator.history is not None else None
+    yield
+    await engine_queue.stop()
+    if bar_flusher is not None:
+        stop_flushing.set()
+        await bar_flusher
+    if trade_store is not None:
+        trade_store.close()
+    if journal is not None:
+        journal.close()
+    if bar_aggregator.history is not None:
+        bar_aggregator.history.flush()
+    if hasattr(manager, "close"):
+        manager.close()
 
 app = FastAPI(
     title="Trading Engine API",
     description="Advanced trading engine with order execution, P&L calculations, and risk management",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -25,101 +123,418 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global trading engine instance
-trading_engine = TradingEngine(initial_balance=INITIAL_BALANCE, leverage=DEFAULT_LEVERAGE)
+# Per-request cProfile/tracemalloc reports, only with ENGINE_PROFILING set
+request_profiler = RequestProfiler()
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+# Request counts and latency per route; added last so it times everything
+app.add_middleware(MetricsMiddleware)
+
+REGISTRY.gauge("engine_command_queue_depth", "Commands waiting for the engine writer",
+               lambda: engine_queue.depth if engine_queue is not None else 0)
+REGISTRY.gauge("trade_store_queue_depth", "Engine batches waiting to be persisted",
+               lambda: trade_store.depth if trade_store is not None else 0)
+REGISTRY.gauge("engine_accounts", "Open accounts",
+               lambda: len(engine_queue.accounts()) if engine_queue is not None else 0)
+REGISTRY.gauge("engine_journal_durable", "1 while journal commits succeed, 0 while they fail",
+               lambda: 1 if engine_queue is None or engine_queue.durable else 0)
+
+# Account-scoped endpoints, served for the default account at the top level
+# and for any account under /accounts/{account_id}
+account_router = APIRouter()
+
+def _snapshot(account_id: str) -> EngineSnapshot:
+    snapshot = engine_queue.snapshot(account_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Account {account_id} not found")
+    return snapshot
 
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {"message": "Trading Engine API", "status": "running"}
 
-@app.post("/orders", response_model=Order)
-async def place_order(order_request: OrderRequest):
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Engine stage and HTTP metrics in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int):
+    """Report of a request profiled with an X-Profile header"""
+    report = request_profiler.report(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return PlainTextResponse(report)
+
+@app.get("/accounts", response_model=List[str])
+async def get_accounts():
+    """List open accounts"""
+    return engine_queue.accounts()
+
+@account_router.post("/orders", response_model=Order)
+async def place_order(order_request: OrderRequest, account_id: str = DEFAULT_ACCOUNT):
     """Place a new order"""
     try:
-        order = trading_engine.place_order(order_request)
-        return order
+        return await engine_queue.execute(account_id, "place_order", order_request)
+    except OrderRejected as e:
+        raise HTTPException(status_code=400, detail={
+            "message": str(e),
+            "rejections": [r.model_dump(mode="json") for r in e.rejections]
+        })
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/orders", response_model=List[Order])
-async def get_orders():
-    """Get all orders"""
-    return trading_engine.portfolio.orders
+class ListQuery:
+    """Pagination, filter and projection parameters shared by the list endpoints"""
+
+    def __init__(
+        self,
+        cursor: int = Query(0, ge=0, description="Resume from the X-Next-Cursor of the previous page"),
+        limit: Optional[int] = Query(None, ge=1, description="Page size; all matching records if omitted"),
+        symbols: Optional[str] = Query(None, description="Comma-separated symbols to include"),
+        start: Optional[datetime] = Query(None, description="Only records at or after this time"),
+        end: Optional[datetime] = Query(None, description="Only records before this time"),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.symbols = set(symbols.split(",")) if symbols else None
+        self.start = start
+        self.end = end
+        self.fields = fields
+
+    def projection(self, allowed: Sequence[str]) -> Optional[List[str]]:
+        try:
+            return parse_fields(self.fields, allowed)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def filters(self, allowed: Sequence[str]) -> dict:
+        return {"symbols": self.symbols, "start": self.start, "end": self.end, "fields": self.projection(allowed)}
+
+def _page_response(page: Page) -> FastJSONResponse:
+    """Encode a page as a JSON list, with the next cursor in a header if there is more"""
+    headers = {"X-Next-Cursor": str(page.next_cursor)} if page.next_cursor is not None else None
+    return FastJSONResponse(page.items, headers=headers)
+
+@account_router.get("/orders", response_model=List[Order])
+async def get_orders(account_id: str = DEFAULT_ACCOUNT, query: ListQuery = Depends()):
+    """Get pending orders"""
+    orders = _snapshot(account_id).orders
+    return _page_response(page_models(orders, query.cursor, query.limit, **query.filters(list(Order.model_fields))))
+
+@account_router.delete("/orders/{order_id}", response_model=Order)
+async def cancel_order(order_id: str, account_id: str = DEFAULT_ACCOUNT):
+    """Cancel a pending order"""
+    _snapshot(account_id)
+    order = await engine_queue.execute(account_id, "cancel_order", order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail=f"Order {order_id} not found")
+    return order
+
+@account_router.get("/positions", response_model=List[Position])
+async def get_positions(account_id: str = DEFAULT_ACCOUNT, query: ListQuery = Depends()):
+    """Get open positions"""
+    positions = _snapshot(account_id).positions
+    return _page_response(page_models(positions, query.cursor, query.limit, **query.filters(list(Position.model_fields))))
 
-@app.get("/positions", response_model=List[Position])
-async def get_positions():
-    """Get all open positions"""
-    return trading_engine.portfolio.positions
+def _trade_archive(snapshot: EngineSnapshot) -> Optional[TradeArchive]:
+    """Database pages of the trades trimmed from a snapshot's ledger, if any were"""
+    if trade_store is None or snapshot.ledger.offset == 0:
+        return None
+    return functools.partial(trade_store.page_trades, snapshot.account_id, snapshot.opened_at)
 
-@app.get("/trades", response_model=List[Trade])
-async def get_trades():
-    """Get trade history"""
-    return trading_engine.portfolio.trades
+@account_router.get("/trades", response_model=List[Trade])
+async def get_trades(account_id: str = DEFAULT_ACCOUNT, query: ListQuery = Depends()):
+    """Get trade history, encoded straight from the trade ledger
 
-@app.get("/portfolio")
-async def get_portfolio():
+    Pages older than the trades kept in memory are read from the database,
+    off the event loop.
+    """
+    snapshot = _snapshot(account_id)
+    archive = _trade_archive(snapshot)
+    page = functools.partial(page_trades, snapshot.ledger, query.cursor, query.limit,
+                             archive=archive, **query.filters(TRADE_FIELDS))
+    if archive is not None and query.cursor < snapshot.ledger.offset:
+        return _page_response(await asyncio.get_running_loop().run_in_executor(engine_queue.executor, page))
+    return _page_response(page())
+
+@account_router.get("/trades/export")
+async def export_trade_history(account_id: str = DEFAULT_ACCOUNT, query: ListQuery = Depends()):
+    """Stream the trade history as newline-delimited JSON"""
+    snapshot = _snapshot(account_id)
+    records = export_trades(snapshot.ledger, archive=_trade_archive(snapshot), **query.filters(TRADE_FIELDS))
+    return StreamingResponse(ndjson(records), media_type="application/x-ndjson")
+
+@account_router.get("/portfolio")
+async def get_portfolio(account_id: str = DEFAULT_ACCOUNT):
     """Get portfolio summary"""
-    summary = trading_engine.get_portfolio_summary()
-    return summary
+    return _snapshot(account_id).summary
 
-@app.put("/portfolio")
-async def update_portfolio(balance: float = None, leverage: float = None):
+@account_router.put("/portfolio")
+async def update_portfolio(balance: float = None, leverage: float = None, account_id: str = DEFAULT_ACCOUNT):
     """Update portfolio settings"""
-    if balance is not None:
-        trading_engine.portfolio.balance = balance
-    if leverage is not None:
-        trading_engine.portfolio.leverage = leverage
-    trading_engine._update_portfolio_equity()
+    _snapshot(account_id)
+    await engine_queue.execute(account_id, "update_portfolio", balance, leverage)
     return {"message": "Portfolio updated successfully"}
 
+def _apply_price(manager, symbol: str, price: float, timestamp: Optional[datetime] = None, volume: float = 0.0):
+    """Writer command for one tick: the accounts first, then the market-wide aggregates"""
+    timestamp = timestamp or datetime.now()
+    manager.update_market_price(symbol, price)
+    market_risk.update_market_price(symbol, price, timestamp)
+    bar_aggregator.update_market_price(symbol, price, timestamp, volume)
+
+def _apply_prices(manager, ticks: List[PriceTick]) -> int:
+    rows = [(tick.symbol, tick.price, tick.timestamp) for tick in ticks]
+    applied = manager.update_market_prices(rows)
+    market_risk.update_market_prices(rows)
+    bar_aggregator.update_market_prices([(tick.symbol, tick.price, tick.timestamp, tick.volume) for tick in ticks])
+    return applied
+
 @app.post("/market-price/{symbol}")
-async def update_market_price(symbol: str, price: float):
+async def update_market_price(symbol: str, price: float, volume: float = 0.0):
     """Update market price for a symbol"""
     try:
-        trading_engine.update_market_price(symbol, price)
+        await engine_queue.submit(lambda manager: _apply_price(manager, symbol, price, volume=volume))
         return {"message": f"Market price updated for {symbol}: ${price}"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/risk-metrics", response_model=RiskMetrics)
-async def get_risk_metrics():
-    """Get portfolio risk metrics"""
-    return trading_engine.calculate_risk_metrics()
+@app.get("/bars/{symbol}", response_model=List[Bar])
+async def get_bars(symbol: str, timeframe: str = "1m", limit: int = Query(100, ge=1, le=10000), partial: bool = True):
+    """Recent OHLCV bars for a symbol, oldest first
 
-@app.post("/reset")
-async def reset_portfolio():
-    """Reset portfolio to initial state"""
-    global trading_engine
-    trading_engine = TradingEngine(initial_balance=10000.0, leverage=10.0)
-    return {"message": "Portfolio reset successfully"}
+    ``partial`` appends the bar still being built. Bars are kept for the
+    ``BAR_TIMEFRAMES`` timeframes, up to ``BAR_CAPACITY`` finished bars each.
+    """
+    try:
+        return bar_aggregator.bars(symbol, timeframe, limit, partial)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/performance")
-async def get_performance():
-    """Get detailed performance metrics"""
-    risk_metrics = trading_engine.calculate_risk_metrics()
-    portfolio_summary = trading_engine.get_portfolio_summary()
+def _indicator_values(indicator: Indicator, bars, window: int) -> dict:
+    close = bars["close"]
+    if indicator == Indicator.BOLLINGER:
+        middle, upper, lower = indicators.bollinger(close, window)
+        return {"middle": middle, "upper": upper, "lower": lower}
+    if indicator == Indicator.ATR:
+        return {"atr": indicators.atr(bars["high"], bars["low"], close, window)}
+    batch = {
+        Indicator.SMA: indicators.sma,
+        Indicator.EMA: lambda values, span: indicators.ema(values, span=span),
+        Indicator.STD: indicators.rolling_std,
+        Indicator.MIN: indicators.rolling_min,
+        Indicator.MAX: indicators.rolling_max,
+        Indicator.RSI: indicators.rsi,
+    }[indicator]
+    return {indicator.value: batch(close, window)}
 
-    # Calculate additional metrics
-    total_trades = len(trading_engine.portfolio.trades)
-    winning_trades = len([t for t in trading_engine.portfolio.trades if t.realized_pnl > 0])
-    losing_trades = total_trades - winning_trades
+@app.get("/indicators/{symbol}", response_model=IndicatorSeries)
+async def get_indicator(
+    symbol: str,
+    indicator: Indicator,
+    timeframe: str = "1m",
+    window: int = Query(14, ge=2),
+    limit: int = Query(200, ge=1, le=10000),
+    partial: bool = True
+):
+    """An indicator over a symbol's recent bar closes; warm-up values are null"""
+    try:
+        bars = bar_aggregator.columns(symbol, timeframe, limit, partial)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    values = _indicator_values(indicator, bars, window)
+    return IndicatorSeries(
+        symbol=symbol,
+        timeframe=timeframe,
+        indicator=indicator,
+        window=window,
+        timestamps=bars["timestamp"].astype("datetime64[us]").tolist(),
+        values={name: [None if v != v else v for v in series.tolist()] for name, series in values.items()}
+    )
+
+@app.post("/market-prices")
+async def update_market_prices(batch: MarketPriceBatch):
+    """Apply a batch of market price ticks in timestamp order"""
+    try:
+        applied = await engine_queue.submit(lambda manager: _apply_prices(manager, batch.ticks))
+        return {"message": f"Applied {applied} market price updates", "applied": applied}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _full_ledger(snapshot: EngineSnapshot) -> TradeLedger:
+    """A snapshot's whole trade history: the stored trades trimmed from memory, then the in-memory ones"""
+    ledger = snapshot.ledger
+    if ledger.offset == 0:
+        return ledger
+    if trade_store is None:
+        raise RuntimeError(f"{ledger.offset} trades are no longer in memory and there is no trade store")
+    full = trade_store.load_ledger(snapshot.account_id, snapshot.opened_at, ledger.offset)
+    if len(full) != ledger.offset:
+        raise RuntimeError(f"Only {len(full)} of the {ledger.offset} trades trimmed from memory are stored")
+    full.extend(ledger)
+    return full
+
+def _verified_metrics(snapshot: EngineSnapshot, ledger: Optional[TradeLedger] = None) -> RiskMetrics:
+    """Recompute risk metrics from the full trade history and check the running ones"""
+    metrics = compute_risk_metrics(_full_ledger(snapshot) if ledger is None else ledger)
+    verify_risk_metrics(snapshot.risk.metrics(), metrics)
+    return metrics
+
+@account_router.get("/risk-metrics", response_model=RiskMetrics)
+async def get_risk_metrics(account_id: str = DEFAULT_ACCOUNT, verify: bool = False):
+    """Get portfolio risk metrics
+
+    ``verify`` recomputes them from the full trade history with pandas and
+    fails if the running metrics disagree.
+    """
+    snapshot = _snapshot(account_id)
+    if not verify:
+        return snapshot.risk.metrics()
+    try:
+        return await engine_queue.analyze(account_id, _verified_metrics)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _position_exposures(snapshot: EngineSnapshot) -> dict:
+    """Signed market value per symbol: positive long, negative short"""
+    exposures = {}
+    for position in snapshot.positions:
+        sign = 1 if position.side == OrderSide.BUY else -1
+        exposures[position.symbol] = exposures.get(position.symbol, 0.0) + sign * position.quantity * position.current_price
+    return exposures
+
+@account_router.get("/risk/var", response_model=VaRReport)
+async def get_value_at_risk(
+    account_id: str = DEFAULT_ACCOUNT,
+    method: VaRMethod = VaRMethod.HISTORICAL,
+    confidence: float = Query(0.95, gt=0, lt=1),
+    horizon: int = Query(1, ge=1),
+    simulations: int = Query(10000, ge=100, le=1_000_000),
+    seed: Optional[int] = None
+):
+    """Value at risk and expected shortfall of the account's open positions
+
+    Computed over the rolling window of market-wide interval returns;
+    ``horizon`` is in sampling intervals and losses are positive amounts.
+    """
+    exposures = _position_exposures(_snapshot(account_id))
+    window = market_risk.window()
+
+    def compute():
+        return window.var(exposures, confidence, method.value, horizon, simulations, seed)
+
+    var, expected_shortfall = await asyncio.get_running_loop().run_in_executor(engine_queue.executor, compute)
+    return VaRReport(
+        method=method,
+        confidence=confidence,
+        horizon=horizon,
+        var=var,
+        expected_shortfall=expected_shortfall,
+        gross_exposure=sum(abs(value) for value in exposures.values()),
+        observations=window.count,
+        interval_seconds=market_risk.interval,
+        exposures=exposures
+    )
 
-    total_commission = sum(t.commission for t in trading_engine.portfolio.trades)
-    total_realized_pnl = sum(t.realized_pnl for t in trading_engine.portfolio.trades)
+@account_router.get("/liquidations", response_model=List[LiquidationReport])
+async def get_liquidations(account_id: str = DEFAULT_ACCOUNT):
+    """Get recent margin call liquidations"""
+    return _snapshot(account_id).liquidations
 
+@account_router.post("/reset")
+async def reset_portfolio(account_id: str = DEFAULT_ACCOUNT):
+    """Reset portfolio to initial state, opening the account if it does not exist"""
+    await engine_queue.submit(lambda manager: manager.reset(account_id))
+    return {"message": "Portfolio reset successfully"}
+
+def _full_performance(snapshot: EngineSnapshot) -> dict:
+    """Performance report recomputed from the full trade history"""
+    ledger = _full_ledger(snapshot)
     return {
-        "portfolio": portfolio_summary,
-        "risk_metrics": risk_metrics,
-        "trading_stats": {
-            "total_trades": total_trades,
-            "winning_trades": winning_trades,
-            "losing_trades": losing_trades,
-            "total_commission": total_commission,
-            "total_realized_pnl": total_realized_pnl,
-            "net_pnl": total_realized_pnl - total_commission
-        }
+        "portfolio": snapshot.summary,
+        "risk_metrics": _verified_metrics(snapshot, ledger),
+        "trading_stats": compute_trading_stats(ledger)
     }
 
+@account_router.get("/performance")
+async def get_performance(account_id: str = DEFAULT_ACCOUNT, verify: bool = False):
+    """Get detailed performance metrics"""
+    snapshot = _snapshot(account_id)
+    if not verify:
+        return {
+            "portfolio": snapshot.summary,
+            "risk_metrics": snapshot.risk.metrics(),
+            "trading_stats": snapshot.risk.trading_stats()
+        }
+    try:
+        return await engine_queue.analyze(account_id, _full_performance)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+app.include_router(account_router)
+app.include_router(account_router, prefix="/accounts/{account_id}")
+
+async def _pump_events(websocket: WebSocket, client: ClientStream):
+    """Forward queued engine events to a WebSocket client"""
+    while True:
+        for message in await client.drain():
+            await websocket.send_text(message)
+
+def _report_stream_error(client: ClientStream, future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        client.push("error", {"detail": str(future.exception())})
+
+def _handle_stream_message(client: ClientStream, message: dict):
+    """Apply one inbound stream message: subscriptions or price ticks
+
+    Ticks are queued without waiting for the writer, so a client can keep
+    streaming; failures come back as ``error`` events.
+    """
+    action = message.get("action")
+    if action == "subscribe":
+        client.subscribe(message.get("symbols"))
+        client.push("subscribed", {"symbols": sorted(client.symbols) if client.symbols else None})
+    elif action == "tick":
+        tick = PriceTick(**{k: v for k, v in message.items() if k != "action"})
+        future = engine_queue.post(lambda manager: _apply_price(manager, tick.symbol, tick.price, tick.timestamp, tick.volume))
+        future.add_done_callback(lambda f: _report_stream_error(client, f))
+    elif action == "ticks":
+        batch = MarketPriceBatch(ticks=message.get("ticks", []))
+        future = engine_queue.post(lambda manager: _apply_prices(manager, batch.ticks))
+        future.add_done_callback(lambda f: _report_stream_error(client, f))
+    else:
+        raise ValueError(f"Unknown action: {action}")
+
+@app.websocket("/ws")
+async def stream(websocket: WebSocket):
+    """Stream price ticks in and fills, positions, margin calls and portfolio deltas out
+
+    Inbound messages are JSON objects with an ``action`` of ``subscribe``
+    (``symbols``), ``tick`` (``symbol``, ``price``) or ``ticks`` (a list of
+    ticks). Outbound messages are ``{"type": ..., "data": ...}``. The
+    ``account`` query parameter selects whose fills and positions are
+    streamed; prices are market-wide.
+    """
+    await websocket.accept()
+    account_id = websocket.query_params.get("account", DEFAULT_ACCOUNT)
+    symbols = websocket.query_params.get("symbols")
+    client = event_hub.connect(account_id, symbols.split(",") if symbols else None)
+    sender = asyncio.create_task(_pump_events(websocket, client))
+    try:
+        while True:
+            message = await websocket.receive_json()
+            try:
+                _handle_stream_message(client, message)
+            except Exception as e:
+                client.push("error", {"detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        event_hub.disconnect(client)
+
 if __name__ == "__main__":
     uvicorn.run(app, host=API_HOST, port=API_PORT)
\ No newline at end of file
@@ -0,0 +1,56 @@
+import math
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from config import RISK_SAMPLE_SECONDS, RISK_WINDOW
+from src.engine.trading_engine.risk_manager import RollingRisk
+
+
+class MarketRisk:
+    """Samples market-wide prices into interval log returns for VaR
+
+    Ticks are bucketed into ``interval`` second intervals by timestamp. When
+    a tick opens a new interval, each symbol's last price of the finished
+    one is compared with its previous close and the returns are added to a
+    ``RollingRisk`` window of ``window`` intervals; symbols that did not
+    trade contribute a zero return. Empty intervals are skipped rather than
+    filled in.
+    """
+
+    def __init__(self, interval: float = RISK_SAMPLE_SECONDS, window: int = RISK_WINDOW,
+                 clock: Callable[[], datetime] = datetime.now):
+        self.interval = interval
+        self.clock = clock
+        self.rolling = RollingRisk(window)
+        self._closes: Dict[str, float] = {}
+        self._last: Dict[str, float] = {}
+        self._bucket: Optional[int] = None
+
+    def update_market_price(self, symbol: str, price: float, timestamp: Optional[datetime] = None):
+        self.update_market_prices([(symbol, price, timestamp or self.clock())])
+
+    def update_market_prices(self, ticks: Iterable[Tuple[str, float, Any]]):
+        for symbol, price, timestamp in sorted(ticks, key=itemgetter(2)):
+            bucket = int(timestamp.timestamp() // self.interval)
+            if self._bucket is None:
+                self._bucket = bucket
+            elif bucket > self._bucket:
+                self._close_interval()
+                self._bucket = bucket
+            self._last[symbol] = price
+
+    def _close_interval(self):
+        returns = {
+            symbol: math.log(price / self._closes[symbol])
+            for symbol, price in self._last.items()
+            if self._closes.get(symbol, 0) > 0 and price > 0
+        }
+        if returns:
+            self.rolling.update(returns)
+        self._closes.update(self._last)
+        self._last = {}
+
+    def window(self) -> RollingRisk:
+        """Copy of the rolling window, safe to compute on off the writer"""
+        return self.rolling.copy()
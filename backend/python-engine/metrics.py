@@ -0,0 +1,231 @@
+import math
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+
+from starlette.routing import Mount
+
+from config import METRICS_SAMPLE_EVERY
+
+# Histogram bucket upper bounds: 1us doubling up to ~8.4s, in nanoseconds
+BUCKETS_NS = [1000 << i for i in range(24)]
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _le(bound: str) -> str:
+    return f'le="{bound}"'
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Timer:
+    """Exact call count and sampled latency histogram of one code path
+
+    ``start()`` counts a call and, for one call in every ``every``, returns
+    the current ``perf_counter_ns``; otherwise it returns 0 and
+    ``stop(0)`` does nothing. An unsampled call therefore costs a
+    decrement and a comparison. ``every=0`` only counts calls.
+    """
+
+    __slots__ = ("labels", "every", "calls", "counts", "total_ns", "_countdown")
+
+    def __init__(self, labels: Labels, every: int):
+        self.labels = labels
+        self.every = every
+        self.calls = 0
+        self.counts = [0] * (len(BUCKETS_NS) + 1)
+        self.total_ns = 0
+        self._countdown = 1 if every > 0 else math.inf
+
+    def start(self) -> int:
+        self.calls += 1
+        self._countdown -= 1
+        if self._countdown > 0:
+            return 0
+        self._countdown = self.every
+        return time.perf_counter_ns()
+
+    def sample(self, calls: int) -> bool:
+        """Count a group of calls made together; True if the group is to be timed"""
+        self.calls += calls
+        self._countdown -= 1
+        if self._countdown > 0:
+            return False
+        self._countdown = self.every
+        return True
+
+    def stop(self, started: int):
+        if started:
+            self.observe(time.perf_counter_ns() - started)
+
+    def record(self, elapsed_ns: int):
+        """Count a call timed by the caller, keeping it if it is sampled"""
+        if self.start():
+            self.observe(elapsed_ns)
+
+    def observe(self, elapsed_ns: int):
+        self.counts[bisect_left(BUCKETS_NS, elapsed_ns)] += 1
+        self.total_ns += elapsed_ns
+
+
+class Counter:
+    __slots__ = ("labels", "value")
+
+    def __init__(self, labels: Labels):
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Registry:
+    """Timers, counters and gauges, rendered in the Prometheus text format
+
+    A timer family ``name`` renders as a ``{name}_calls_total`` counter and
+    a ``{name}_seconds`` histogram over the sampled calls. Gauges are
+    callbacks read at render time.
+    """
+
+    def __init__(self, sample_every: int = METRICS_SAMPLE_EVERY):
+        self.sample_every = sample_every
+        self._help: Dict[str, str] = {}
+        self._timers: Dict[str, Dict[Labels, Timer]] = {}
+        self._counters: Dict[str, Dict[Labels, Counter]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def timer(self, name: str, help: str = "", every: int = None, **labels: str) -> Timer:
+        """The timer of a family for these labels, created on first use"""
+        family = self._timers.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        timer = family.get(key)
+        if timer is None:
+            self._help.setdefault(name, help)
+            timer = family[key] = Timer(key, self.sample_every if every is None else every)
+        return timer
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        family = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        counter = family.get(key)
+        if counter is None:
+            self._help.setdefault(name, help)
+            counter = family[key] = Counter(key)
+        return counter
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]):
+        self._help[name] = help
+        self._gauges[name] = read
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, family in self._timers.items():
+            help = self._help.get(name, "")
+            lines += [f"# HELP {name}_calls_total Calls of {help or name}", f"# TYPE {name}_calls_total counter"]
+            for timer in family.values():
+                lines.append(f"{name}_calls_total{_format_labels(timer.labels)} {timer.calls}")
+            lines += [f"# HELP {name}_seconds Sampled latency of {help or name}", f"# TYPE {name}_seconds histogram"]
+            for timer in family.values():
+                labels = timer.labels
+                cumulative = 0
+                for bound, count in zip(BUCKETS_NS, timer.counts):
+                    cumulative += count
+                    lines.append(f"{name}_seconds_bucket{_format_labels(labels, _le(f'{bound / 1e9:g}'))} {cumulative}")
+                cumulative += timer.counts[-1]
+                lines.append(f"{name}_seconds_bucket{_format_labels(labels, _le('+Inf'))} {cumulative}")
+                lines.append(f"{name}_seconds_sum{_format_labels(labels)} {timer.total_ns / 1e9:.9f}")
+                lines.append(f"{name}_seconds_count{_format_labels(labels)} {cumulative}")
+        for name, family in self._counters.items():
+            lines += [f"# HELP {name} {self._help.get(name, name)}", f"# TYPE {name} counter"]
+            for counter in family.values():
+                lines.append(f"{name}{_format_labels(counter.labels)} {counter.value:g}")
+        for name, read in self._gauges.items():
+            lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} gauge", f"{name} {read():g}"]
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served on /metrics
+REGISTRY = Registry()
+
+
+def stage(name: str) -> Timer:
+    """Timer of one engine stage, in the ``engine_stage`` family"""
+    return REGISTRY.timer("engine_stage", "engine stages", stage=name)
+
+
+def timed(timer: Timer):
+    """Decorator timing every call of a function with ``timer``"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = timer.start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timer.stop(started)
+        return wrapper
+    return decorate
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing HTTP requests per method, route and status
+
+    Routes are reported as their templates (``/orders/{order_id}``), so
+    path parameters do not multiply the series; unmatched paths are
+    reported as ``unmatched``.
+    """
+
+    def __init__(self, app, registry: Registry = REGISTRY, every: int = 1):
+        self.app = app
+        self.registry = registry
+        self.every = every
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            method, route = scope["method"], _route(scope)
+            self.registry.timer("http_request", "HTTP requests", every=self.every,
+                                method=method, route=route).record(elapsed)
+            self.registry.counter("http_responses_total", "HTTP responses by status",
+                                  method=method, route=route, status=str(status)).inc()
+
+
+def _route(scope) -> str:
+    """Route template of a handled request: the matched route's path behind the prefix of any mounts
+
+    Mount prefixes come from the request's root path, so only mounts whose
+    paths have no parameters are reported as templates.
+    """
+    route = scope.get("route")
+    # FastAPI releases that include routers lazily leave the unprefixed
+    # route in the scope and keep the prefixed template on the route context
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    template = getattr(context, "path_format", None) or getattr(route, "path_format", None)
+    if "endpoint" not in scope or template is None:
+        return "unmatched"
+    # Mounts extend the root path and record the one they started from
+    prefix = scope["root_path"][len(scope["app_root_path"]):] if "app_root_path" in scope else ""
+    if isinstance(route, Mount):
+        # A mounted app with no routes of its own, or none that matched
+        return prefix + "/{path}"
+    return prefix + template
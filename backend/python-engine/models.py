@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -18,6 +18,7 @@ class OrderStatus(str, Enum):
     FILLED = "filled"
     CANCELLED = "cancelled"
     EXPIRED = "expired"
+    REJECTED = "rejected"
 
 class Position(BaseModel):
     symbol: str
@@ -29,6 +30,7 @@ class Position(BaseModel):
     timestamp: datetime
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
+    trailing_stop: Optional[float] = None
 
 class Order(BaseModel):
     id: str
@@ -42,6 +44,9 @@ class Order(BaseModel):
     timestamp: datetime
     filled_quantity: float = 0.0
     filled_price: Optional[float] = None
+    stop_loss: Optional[float] = None
+    take_profit: Optional[float] = None
+    trailing_stop: Optional[float] = None
 
 class Trade(BaseModel):
     id: str
@@ -71,6 +76,87 @@ class RiskMetrics(BaseModel):
     win_rate: float
     profit_factor: float
 
+class Bar(BaseModel):
+    timestamp: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    vwap: float
+    ticks: int
+    closed: bool
+
+class Indicator(str, Enum):
+    SMA = "sma"
+    EMA = "ema"
+    STD = "std"
+    MIN = "min"
+    MAX = "max"
+    RSI = "rsi"
+    ATR = "atr"
+    BOLLINGER = "bollinger"
+
+class IndicatorSeries(BaseModel):
+    symbol: str
+    timeframe: str
+    indicator: Indicator
+    window: int
+    timestamps: List[datetime]
+    values: Dict[str, List[Optional[float]]]
+
+class VaRMethod(str, Enum):
+    HISTORICAL = "historical"
+    PARAMETRIC = "parametric"
+    MONTE_CARLO = "monte_carlo"
+
+class VaRReport(BaseModel):
+    method: VaRMethod
+    confidence: float
+    horizon: int
+    var: float
+    expected_shortfall: float
+    gross_exposure: float
+    observations: int
+    interval_seconds: float
+    exposures: Dict[str, float]
+
+class LiquidationPolicy(str, Enum):
+    WORST_PNL = "worst_pnl"
+    LARGEST_MARGIN = "largest_margin"
+    PARTIAL = "partial"
+
+class LiquidationAction(BaseModel):
+    symbol: str
+    side: OrderSide
+    quantity: float
+    price: float
+    realized_pnl: float
+    margin_released: float
+    closed: bool
+    reason: str
+
+class LiquidationReport(BaseModel):
+    timestamp: datetime
+    policy: LiquidationPolicy
+    margin_level_before: float
+    margin_level_after: float
+    target_level: float
+    restored: bool
+    actions: List[LiquidationAction] = []
+
+class RejectionReason(str, Enum):
+    INSUFFICIENT_MARGIN = "insufficient_margin"
+    MAX_LEVERAGE = "max_leverage"
+    SYMBOL_EXPOSURE = "symbol_exposure"
+    LOSS_LIMIT = "loss_limit"
+
+class OrderRejection(BaseModel):
+    reason: RejectionReason
+    message: str
+    value: float
+    limit: float
+
 class OrderRequest(BaseModel):
     symbol: str
     type: OrderType
@@ -80,6 +166,16 @@ class OrderRequest(BaseModel):
     stop_price: Optional[float] = None
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
+    trailing_stop: Optional[float] = None
+
+class PriceTick(BaseModel):
+    symbol: str
+    price: float
+    timestamp: datetime = Field(default_factory=datetime.now)
+    volume: float = 0.0
+
+class MarketPriceBatch(BaseModel):
+    ticks: List[PriceTick]
 
 class PortfolioUpdate(BaseModel):
     balance: Optional[float] = None
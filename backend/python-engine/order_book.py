@@ -0,0 +1,173 @@
+import heapq
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from models import Order, OrderSide, OrderStatus, OrderType
+
+
+class SymbolOrderBook:
+    """Resting limit orders for a single symbol, each side kept in price order
+
+    Cancelled orders stay in the heaps until popped; once they make up
+    more than half of the entries the heaps are rebuilt from the live ones,
+    so cancel/replace churn can't grow them without bound.
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        # Bids are stored with negated prices so both sides are min-heaps
+        self._bids: List[Tuple[float, int, str]] = []
+        self._asks: List[Tuple[float, int, str]] = []
+        self._dead = 0
+
+    def __len__(self) -> int:
+        """Heap entries, cancelled ones included"""
+        return len(self._bids) + len(self._asks)
+
+    def push(self, order: Order, seq: int):
+        """Insert a limit order on its side of the book"""
+        if order.side == OrderSide.BUY:
+            heapq.heappush(self._bids, (-order.price, seq, order.id))
+        else:
+            heapq.heappush(self._asks, (order.price, seq, order.id))
+
+    def pop_crossed(self, price: float, live: Dict[str, Order]) -> List[Order]:
+        """Pop every live order the given price crosses, best price first"""
+        crossed = []
+
+        # Buy limits execute when the market trades at or below the limit
+        while self._bids and -self._bids[0][0] >= price:
+            _, _, order_id = heapq.heappop(self._bids)
+            order = live.pop(order_id, None)
+            if order is not None:
+                crossed.append(order)
+            else:
+                self._dead -= 1
+
+        # Sell limits execute when the market trades at or above the limit
+        while self._asks and self._asks[0][0] <= price:
+            _, _, order_id = heapq.heappop(self._asks)
+            order = live.pop(order_id, None)
+            if order is not None:
+                crossed.append(order)
+            else:
+                self._dead -= 1
+
+        return crossed
+
+    def discard(self, live: Dict[str, Order]):
+        """Note that one of the book's orders left ``live``, compacting if dead entries dominate"""
+        self._dead += 1
+        if self._dead * 2 > len(self):
+            self._bids = [entry for entry in self._bids if entry[2] in live]
+            self._asks = [entry for entry in self._asks if entry[2] in live]
+            heapq.heapify(self._bids)
+            heapq.heapify(self._asks)
+            self._dead = 0
+
+    def best_bid(self, live: Dict[str, Order]) -> Optional[float]:
+        """Highest resting buy limit, skipping cancelled entries"""
+        while self._bids and self._bids[0][2] not in live:
+            heapq.heappop(self._bids)
+            self._dead -= 1
+        return -self._bids[0][0] if self._bids else None
+
+    def best_ask(self, live: Dict[str, Order]) -> Optional[float]:
+        """Lowest resting sell limit, skipping cancelled entries"""
+        while self._asks and self._asks[0][2] not in live:
+            heapq.heappop(self._asks)
+            self._dead -= 1
+        return self._asks[0][0] if self._asks else None
+
+
+class OrderBook:
+    """Pending orders indexed per symbol and by price
+
+    Orders are kept in arrival order for reporting, while limit orders are also
+    pushed onto a per-symbol heap so a price update only touches the orders it
+    actually crosses. Cancelled orders are dropped from the live index and
+    lazily discarded from the heaps, which are compacted once mostly dead.
+    ``version`` increases whenever the set of pending orders changes.
+    """
+
+    def __init__(self):
+        self._books: Dict[str, SymbolOrderBook] = {}
+        self._orders: Dict[str, Order] = {}
+        # Arrival sequence of limit orders, a plain int so the book pickles
+        self._seq = 0
+        self._symbol_counts: Dict[str, int] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __iter__(self) -> Iterator[Order]:
+        return iter(self._orders.values())
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    def add(self, order: Order):
+        """Add a pending order to the book"""
+        if order.type == OrderType.LIMIT and order.price is None:
+            raise ValueError(f"Limit order {order.id} requires a price")
+        if order.id in self._orders:
+            raise ValueError(f"Order {order.id} is already pending")
+
+        self._orders[order.id] = order
+        self._symbol_counts[order.symbol] = self._symbol_counts.get(order.symbol, 0) + 1
+        self.version += 1
+        if order.type == OrderType.LIMIT:
+            book = self._books.get(order.symbol)
+            if book is None:
+                book = self._books[order.symbol] = SymbolOrderBook(order.symbol)
+            self._seq += 1
+            book.push(order, self._seq)
+
+    def get(self, order_id: str) -> Optional[Order]:
+        """Look up a pending order by id"""
+        return self._orders.get(order_id)
+
+    def cancel(self, order_id: str) -> Optional[Order]:
+        """Remove a pending order, returning it if it was still resting"""
+        order = self._orders.pop(order_id, None)
+        if order is not None:
+            order.status = OrderStatus.CANCELLED
+            self._discount(order.symbol, 1)
+            if order.type == OrderType.LIMIT:
+                self._books[order.symbol].discard(self._orders)
+            self.version += 1
+        return order
+
+    def pop_crossed(self, symbol: str, price: float) -> List[Order]:
+        """Remove and return the limit orders on a symbol crossed by price"""
+        book = self._books.get(symbol)
+        if book is None:
+            return []
+        crossed = book.pop_crossed(price, self._orders)
+        if crossed:
+            self._discount(symbol, len(crossed))
+            self.version += 1
+        return crossed
+
+    def _discount(self, symbol: str, n: int):
+        remaining = self._symbol_counts[symbol] - n
+        if remaining:
+            self._symbol_counts[symbol] = remaining
+        else:
+            del self._symbol_counts[symbol]
+
+    def symbols(self) -> Set[str]:
+        """Symbols with at least one pending order"""
+        return set(self._symbol_counts)
+
+    def best_bid(self, symbol: str) -> Optional[float]:
+        book = self._books.get(symbol)
+        return book.best_bid(self._orders) if book else None
+
+    def best_ask(self, symbol: str) -> Optional[float]:
+        book = self._books.get(symbol)
+        return book.best_ask(self._orders) if book else None
+
+    def orders(self) -> List[Order]:
+        """Pending orders in arrival order"""
+        return list(self._orders.values())
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set
+
+from pydantic import BaseModel
+
+from ledger import TradeLedger
+
+# Rows encoded per chunk when streaming an export
+EXPORT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class Page:
+    """One page of records and the cursor to pass to get the next one"""
+
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[int] = None
+
+
+# Pages trades dropped from memory: (cursor, stop, limit, symbols, start,
+# end, fields) -> Page over the history rows in [cursor, stop)
+TradeArchive = Callable[..., Page]
+
+
+def local_time(timestamp: Optional[datetime]) -> Optional[datetime]:
+    """Engine timestamps are naive local time; convert aware bounds to match"""
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+def page_trades(
+    ledger: TradeLedger,
+    cursor: int = 0,
+    limit: Optional[int] = None,
+    symbols: Optional[Set[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[Sequence[str]] = None,
+    archive: Optional[TradeArchive] = None,
+) -> Page:
+    """Page through a trade ledger; the cursor is a position in the full history
+
+    Rows before the ledger's ``offset`` are no longer in memory and are
+    read from ``archive`` when one is given.
+    """
+    start, end = local_time(start), local_time(end)
+    items: List[Dict[str, Any]] = []
+    if archive is not None and cursor < ledger.offset:
+        page = archive(cursor, ledger.offset, limit, symbols, start, end, fields)
+        if page.next_cursor is not None:
+            return page
+        items = page.items
+        if limit is not None:
+            limit -= len(items)
+    rows = ledger.select(symbols, start, end, cursor)
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        # Resume after the last row returned, or at the first in-memory row
+        # when the archive filled the page
+        next_cursor = ledger.offset + int(rows[-1]) + 1 if len(rows) else ledger.offset
+    return Page(items + ledger.records(rows, fields), next_cursor)
+
+
+def export_trades(
+    ledger: TradeLedger,
+    symbols: Optional[Set[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[Sequence[str]] = None,
+    archive: Optional[TradeArchive] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield every matching trade, materializing EXPORT_CHUNK_SIZE rows at a time"""
+    start, end = local_time(start), local_time(end)
+    cursor: Optional[int] = 0
+    while archive is not None and cursor is not None and cursor < ledger.offset:
+        page = archive(cursor, ledger.offset, EXPORT_CHUNK_SIZE, symbols, start, end, fields)
+        yield from page.items
+        cursor = page.next_cursor
+    rows = ledger.select(symbols, start, end)
+    for i in range(0, len(rows), EXPORT_CHUNK_SIZE):
+        yield from ledger.records(rows[i:i + EXPORT_CHUNK_SIZE], fields)
+
+
+def page_models(
+    models: Sequence[BaseModel],
+    cursor: int = 0,
+    limit: Optional[int] = None,
+    symbols: Optional[Set[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[Sequence[str]] = None,
+) -> Page:
+    """Page through snapshot orders or positions; the cursor is a list offset"""
+    start, end = local_time(start), local_time(end)
+    include = set(fields) if fields else None
+    items = []
+    next_cursor = None
+    for i in range(max(cursor, 0), len(models)):
+        model = models[i]
+        if symbols is not None and model.symbol not in symbols:
+            continue
+        if start is not None and model.timestamp < start:
+            continue
+        if end is not None and model.timestamp >= end:
+            continue
+        if limit is not None and len(items) == limit:
+            next_cursor = i
+            break
+        items.append(model.model_dump(include=include))
+    return Page(items, next_cursor)
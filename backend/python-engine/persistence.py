@@ -0,0 +1,418 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from ledger import SIDE_NAMES, TRADE_FIELDS, TradeLedger, trade_id
+from models import Order, OrderSide, Position
+from pagination import Page
+from config import DATABASE_URL, PERSIST_BATCH_SIZE, PERSIST_POSITION_SECONDS, PERSIST_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Each account's trade history is keyed by (account_id, opened_at), so the
+# histories before and after a reset never mix
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    account_id TEXT NOT NULL,
+    opened_at INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    price REAL NOT NULL,
+    commission REAL NOT NULL,
+    realized_pnl REAL NOT NULL,
+    PRIMARY KEY (account_id, opened_at, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trades_by_symbol ON trades (account_id, opened_at, symbol, timestamp);
+CREATE INDEX IF NOT EXISTS trades_by_time ON trades (account_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS orders (
+    account_id TEXT NOT NULL,
+    opened_at INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    type TEXT NOT NULL,
+    side TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    price REAL,
+    stop_price REAL,
+    stop_loss REAL,
+    take_profit REAL,
+    trailing_stop REAL,
+    timestamp INTEGER NOT NULL,
+    active INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (account_id, opened_at, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS orders_by_activity ON orders (account_id, active, timestamp);
+
+CREATE TABLE IF NOT EXISTS account_snapshots (
+    account_id TEXT NOT NULL,
+    opened_at INTEGER NOT NULL,
+    snapshot_at INTEGER NOT NULL,
+    balance REAL NOT NULL,
+    equity REAL NOT NULL,
+    used_margin REAL NOT NULL,
+    margin_level REAL NOT NULL,
+    positions INTEGER NOT NULL,
+    PRIMARY KEY (account_id, snapshot_at, opened_at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS position_snapshots (
+    account_id TEXT NOT NULL,
+    opened_at INTEGER NOT NULL,
+    snapshot_at INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    entry_price REAL NOT NULL,
+    current_price REAL NOT NULL,
+    unrealized_pnl REAL NOT NULL,
+    stop_loss REAL,
+    take_profit REAL,
+    trailing_stop REAL,
+    PRIMARY KEY (account_id, snapshot_at, opened_at, symbol)
+) WITHOUT ROWID;
+"""
+
+# Fixed statements, so sqlite3 prepares each once and reuses it from its cache
+_INSERT_TRADE = "INSERT OR IGNORE INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_UPSERT_ORDER = "INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)"
+_CLOSE_ORDER = "UPDATE orders SET active = 0, updated_at = ? WHERE account_id = ? AND opened_at = ? AND id = ?"
+_CLOSE_EARLIER_ORDERS = ("UPDATE orders SET active = 0, updated_at = ? "
+                         "WHERE account_id = ? AND active = 1 AND opened_at <> ?")
+_ACTIVE_ORDER_IDS = "SELECT id FROM orders WHERE account_id = ? AND opened_at = ? AND active = 1"
+_INSERT_ACCOUNT = "INSERT OR REPLACE INTO account_snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_POSITION = "INSERT OR REPLACE INTO position_snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_STORED_HISTORIES = "SELECT account_id, opened_at, COUNT(*), MAX(seq) + 1 FROM trades GROUP BY account_id, opened_at"
+
+_STOP = object()
+
+# (account_id, opened_at in microseconds)
+LedgerKey = Tuple[str, int]
+
+
+def to_us(timestamp: datetime) -> int:
+    """Microseconds since the epoch of a naive engine timestamp"""
+    return (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_us(us: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=us)
+
+
+def sqlite_path(url: str) -> str:
+    """File path of a ``sqlite:///path`` database URL"""
+    prefix = "sqlite:///"
+    if not url.startswith(prefix) or len(url) == len(prefix):
+        raise ValueError(f"Unsupported DATABASE_URL {url!r}; expected sqlite:///path/to/file.db")
+    return url[len(prefix):]
+
+
+class TradeStore:
+    """Durable trade, order and account history in SQLite, written off the event loop
+
+    ``offer`` queues what a command batch changed and returns at once; a
+    writer thread drains the queue and writes everything it finds in one
+    transaction, with ``executemany`` over fixed, prepared statements.
+    Trades are inserted idempotently by their position in the account's
+    history, so a journal replay re-sending them is harmless. Orders are
+    upserted, and marked inactive once they leave the book. Account and
+    position snapshots are coalesced to one per account every
+    ``position_interval`` seconds.
+
+    The queue is bounded: when the writer falls ``max_pending`` batches
+    behind, ``offer`` refuses and the caller waits with ``put`` instead.
+    ``persisted`` tells how much of each trade history is on disk, so the
+    in-memory copy can be trimmed safely, and ``page_trades`` serves the
+    trimmed part back through indexed queries.
+    """
+
+    def __init__(self, url: str = DATABASE_URL, max_pending: int = PERSIST_QUEUE_SIZE,
+                 max_batch: int = PERSIST_BATCH_SIZE, position_interval: float = PERSIST_POSITION_SECONDS):
+        self.path = sqlite_path(url)
+        self.max_batch = max_batch
+        self.position_interval = position_interval
+        self._queue: queue.Queue = queue.Queue(max_pending)
+        self._persisted: Dict[LedgerKey, int] = {}
+        self._active_orders: Dict[LedgerKey, Set[str]] = {}
+        self._latest: Dict[str, Tuple[int, Any]] = {}
+        self._written_at: Dict[str, float] = {}
+        self._read_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        # Histories written by an earlier run count as persisted as far as
+        # they have no gaps; a restored engine may already have trimmed them
+        for account_id, opened_at, count, stop in conn.execute(_STORED_HISTORIES):
+            if count == stop:
+                self._persisted[(account_id, opened_at)] = count
+        conn.close()
+        self._reader = self._connect(check_same_thread=False)
+        self._writer = threading.Thread(target=self._run, name="trade-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, cached_statements=64, **kwargs)
+        # WAL lets readers query while the writer commits; NORMAL syncs at
+        # checkpoints rather than on every commit
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def offer(self, updates: List[Tuple[Any, Any]]) -> bool:
+        """Queue (EngineSnapshot, AccountState) pairs without blocking; False if the queue is full"""
+        try:
+            self._queue.put_nowait((to_us(datetime.now()), updates))
+        except queue.Full:
+            return False
+        return True
+
+    def put(self, updates: List[Tuple[Any, Any]]):
+        """Queue updates, waiting for room"""
+        self._queue.put((to_us(datetime.now()), updates))
+
+    @property
+    def depth(self) -> int:
+        """Batches queued and not yet written"""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Wait until everything queued so far is written"""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued, including the latest snapshots, and stop the writer"""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._reader.close()
+
+    def persisted(self, account_id: str, opened_at: datetime) -> int:
+        """Number of leading trades of a history that are known to be on disk"""
+        return self._persisted.get((account_id, to_us(opened_at)), 0)
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            try:
+                items = [self._queue.get(timeout=self.position_interval or None)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < self.max_batch:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(item is _STOP for item in items)
+            try:
+                self._write(conn, [item for item in items if item is not _STOP], stopping)
+            except sqlite3.Error:
+                # Histories that lost rows stop advancing in ``persisted``,
+                # so nothing unwritten is ever trimmed from memory
+                logger.exception("Persisting %d engine batches failed", len(items))
+            for _ in items:
+                self._queue.task_done()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, items: List[Tuple[int, List[Tuple[Any, Any]]]], final: bool):
+        trades: List[tuple] = []
+        extents: List[Tuple[LedgerKey, int, int]] = []
+        with conn:
+            for now, updates in items:
+                for snapshot, state in updates:
+                    key = (snapshot.account_id, to_us(snapshot.opened_at))
+                    chunk = state.new_trades
+                    if len(chunk):
+                        trades.extend(_trade_rows(key, chunk))
+                        extents.append((key, chunk.offset, chunk.offset + len(chunk)))
+                    if state.full:
+                        conn.execute(_CLOSE_EARLIER_ORDERS, (now, key[0], key[1]))
+                    if state.orders is not None:
+                        self._write_orders(conn, key, now, snapshot.orders)
+                    if state.full or state.positions or len(chunk):
+                        self._latest[snapshot.account_id] = (now, snapshot)
+            conn.executemany(_INSERT_TRADE, trades)
+            self._write_snapshots(conn, final)
+        for key, start, stop in extents:
+            # Only a contiguous prefix of the history counts as persisted
+            if start <= self._persisted.get(key, 0) < stop:
+                self._persisted[key] = stop
+
+    def _write_orders(self, conn: sqlite3.Connection, key: LedgerKey, now: int, orders: Sequence[Order]):
+        previous = self._active_orders.get(key)
+        if previous is None:
+            previous = {row[0] for row in conn.execute(_ACTIVE_ORDER_IDS, key)}
+        current = {order.id for order in orders}
+        conn.executemany(_UPSERT_ORDER, [key + (
+            o.id, o.symbol, o.type.value, o.side.value, o.quantity, o.price, o.stop_price,
+            o.stop_loss, o.take_profit, o.trailing_stop, to_us(o.timestamp), now
+        ) for o in orders])
+        conn.executemany(_CLOSE_ORDER, [(now,) + key + (order_id,) for order_id in previous - current])
+        self._active_orders[key] = current
+
+    def _write_snapshots(self, conn: sqlite3.Connection, final: bool):
+        clock = time.monotonic()
+        accounts, positions = [], []
+        for account_id, (now, snapshot) in list(self._latest.items()):
+            if not final and clock - self._written_at.get(account_id, float("-inf")) < self.position_interval:
+                continue
+            del self._latest[account_id]
+            self._written_at[account_id] = clock
+            key = (account_id, to_us(snapshot.opened_at), now)
+            summary = snapshot.summary
+            accounts.append(key + (summary["balance"], summary["equity"], summary["used_margin"],
+                                   summary["margin_level"], len(snapshot.positions)))
+            positions.extend(key + _position_row(p) for p in snapshot.positions)
+        conn.executemany(_INSERT_ACCOUNT, accounts)
+        conn.executemany(_INSERT_POSITION, positions)
+
+    def _query(self, sql: str, params: Sequence[Any]) -> List[tuple]:
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def page_trades(
+        self,
+        account_id: str,
+        opened_at: datetime,
+        cursor: int = 0,
+        stop: Optional[int] = None,
+        limit: Optional[int] = None,
+        symbols: Optional[Set[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Page:
+        """Stored trades of one history from position ``cursor`` up to ``stop``
+
+        Filters and fields mean the same as for ``pagination.page_trades``;
+        the cursor is the position in the history, so pages continue
+        seamlessly into the in-memory ledger.
+        """
+        sql = ["SELECT seq, timestamp, symbol, side, quantity, price, commission, realized_pnl "
+               "FROM trades WHERE account_id = ? AND opened_at = ? AND seq >= ?"]
+        params: List[Any] = [account_id, to_us(opened_at), cursor]
+        if stop is not None:
+            sql.append("AND seq < ?")
+            params.append(stop)
+        if symbols is not None:
+            sql.append(f"AND symbol IN ({', '.join('?' * len(symbols))})")
+            params.extend(symbols)
+        if start is not None:
+            sql.append("AND timestamp >= ?")
+            params.append(to_us(start))
+        if end is not None:
+            sql.append("AND timestamp < ?")
+            params.append(to_us(end))
+        sql.append("ORDER BY seq")
+        if limit is not None:
+            sql.append("LIMIT ?")
+            params.append(limit + 1)
+        rows = self._query(" ".join(sql), params)
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][0] + 1
+        fields = TRADE_FIELDS if fields is None else [f for f in TRADE_FIELDS if f in fields]
+        items = []
+        for seq, timestamp, symbol, side, quantity, price, commission, realized_pnl in rows:
+            timestamp = from_us(timestamp)
+            record = {
+                "id": trade_id(seq, timestamp), "symbol": symbol, "side": side, "quantity": quantity,
+                "price": price, "timestamp": timestamp, "commission": commission, "realized_pnl": realized_pnl,
+            }
+            items.append({name: record[name] for name in fields})
+        return Page(items, next_cursor)
+
+    def load_ledger(self, account_id: str, opened_at: datetime, stop: int) -> TradeLedger:
+        """The first ``stop`` stored trades of one history as a ledger, e.g. to recompute analytics"""
+        rows = self._query(
+            "SELECT timestamp, symbol, side, quantity, price, commission, realized_pnl FROM trades "
+            "WHERE account_id = ? AND opened_at = ? AND seq < ? ORDER BY seq",
+            (account_id, to_us(opened_at), stop)
+        )
+        ledger = TradeLedger(max(len(rows), 16))
+        for timestamp, symbol, side, quantity, price, commission, realized_pnl in rows:
+            ledger.append(symbol, OrderSide(side), quantity, price, from_us(timestamp), commission, realized_pnl)
+        return ledger
+
+    def orders(self, account_id: str, active: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Every stored order of an account, oldest first, optionally only (in)active ones"""
+        sql = "SELECT * FROM orders WHERE account_id = ?"
+        params: List[Any] = [account_id]
+        if active is not None:
+            sql += " AND active = ?"
+            params.append(int(active))
+        return self._records(sql + " ORDER BY timestamp", params, ("timestamp", "updated_at", "opened_at"))
+
+    def position_history(self, account_id: str, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Position snapshots of an account between two times, oldest first"""
+        sql = "SELECT * FROM position_snapshots WHERE account_id = ?"
+        params: List[Any] = [account_id]
+        if start is not None:
+            sql += " AND snapshot_at >= ?"
+            params.append(to_us(start))
+        if end is not None:
+            sql += " AND snapshot_at < ?"
+            params.append(to_us(end))
+        return self._records(sql + " ORDER BY snapshot_at, symbol", params, ("snapshot_at", "opened_at"))
+
+    def _records(self, sql: str, params: Sequence[Any], times: Sequence[str]) -> List[Dict[str, Any]]:
+        with self._read_lock:
+            cursor = self._reader.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        records = [dict(zip(names, row)) for row in rows]
+        for record in records:
+            for name in times:
+                record[name] = from_us(record[name])
+        return records
+
+
+def _trade_rows(key: LedgerKey, chunk: TradeLedger) -> List[tuple]:
+    n = len(chunk)
+    symbols = chunk.symbols
+    return list(zip(
+        [key[0]] * n, [key[1]] * n, range(chunk.offset, chunk.offset + n),
+        chunk.column("timestamp").astype(np.int64).tolist(),
+        [symbols[code] for code in chunk.column("symbol").tolist()],
+        [SIDE_NAMES[code] for code in chunk.column("side").tolist()],
+        chunk.column("quantity").tolist(), chunk.column("price").tolist(),
+        chunk.column("commission").tolist(), chunk.column("realized_pnl").tolist(),
+    ))
+
+
+def _position_row(position: Position) -> tuple:
+    return (position.symbol, position.side.value, position.quantity, position.entry_price,
+            position.current_price, position.unrealized_pnl, position.stop_loss,
+            position.take_profit, position.trailing_stop)
+
+
+def open_trade_store(url: str = DATABASE_URL, **options) -> Optional[TradeStore]:
+    """A TradeStore for ``url``, or None to run without persistence
+
+    Only SQLite URLs are supported; any other database (docker-compose.yml
+    points DATABASE_URL at PostgreSQL) is logged and skipped rather than
+    failing startup.
+    """
+    if not url:
+        return None
+    try:
+        sqlite_path(url)
+    except ValueError as e:
+        logger.warning("%s; running without trade persistence", e)
+        return None
+    return TradeStore(url, **options)
@@ -0,0 +1,111 @@
+import cProfile
+import io
+import itertools
+import pstats
+import tracemalloc
+from collections import OrderedDict
+from typing import Optional
+
+from config import PROFILING_ENABLED
+
+# Request header asking for a report: "cpu" (cProfile) or "memory" (tracemalloc)
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+MODES = ("cpu", "memory")
+
+
+class RequestProfiler:
+    """On-demand cProfile or tracemalloc reports of single HTTP requests
+
+    Only active when ``enabled``. A request carrying ``X-Profile: cpu`` or
+    ``X-Profile: memory`` runs under the profiler, gets an ``X-Profile-Id``
+    response header and leaves a text report readable with ``report(id)``;
+    the last ``keep`` reports are kept. Both profilers see the whole event
+    loop thread, so the report also covers the engine writer and any other
+    requests that ran meanwhile. One request is profiled at a time; others
+    asking while one runs get ``X-Profile: busy``.
+    """
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, keep: int = 20, top: int = 40):
+        self.enabled = enabled
+        self.keep = keep
+        self.top = top
+        self.busy = False
+        self._ids = itertools.count(1)
+        self._reports: "OrderedDict[int, str]" = OrderedDict()
+
+    def report(self, profile_id: int) -> Optional[str]:
+        return self._reports.get(profile_id)
+
+    def _store(self, profile_id: int, text: str):
+        self._reports[profile_id] = text
+        while len(self._reports) > self.keep:
+            self._reports.popitem(last=False)
+
+    async def __call__(self, app, scope, receive, send):
+        """Run a request through an ASGI app, profiling it if it asks to be"""
+        mode = None
+        if self.enabled and scope["type"] == "http":
+            mode = dict(scope["headers"]).get(PROFILE_HEADER, b"").decode().lower() or None
+        if mode not in MODES:
+            return await app(scope, receive, send)
+        if self.busy:
+            return await app(scope, receive, _with_header(send, PROFILE_HEADER, b"busy"))
+
+        profile_id = next(self._ids)
+        send = _with_header(send, PROFILE_ID_HEADER, str(profile_id).encode())
+        self.busy = True
+        try:
+            if mode == "cpu":
+                text = await self._cpu(app, scope, receive, send)
+            else:
+                text = await self._memory(app, scope, receive, send)
+        finally:
+            self.busy = False
+        self._store(profile_id, f"{scope['method']} {scope['path']} ({mode})\n\n{text}")
+
+    async def _cpu(self, app, scope, receive, send) -> str:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await app(scope, receive, send)
+        finally:
+            profile.disable()
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+        return out.getvalue()
+
+    async def _memory(self, app, scope, receive, send) -> str:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        try:
+            await app(scope, receive, send)
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if started:
+                tracemalloc.stop()
+        lines = [f"peak traced memory: {peak / 1024:.1f} KiB", ""]
+        lines += [str(stat) for stat in after.compare_to(before, "lineno")[:self.top]]
+        return "\n".join(lines) + "\n"
+
+
+class ProfilingMiddleware:
+    """ASGI middleware handing every request to a ``RequestProfiler``"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        await self.profiler(self.app, scope, receive, send)
+
+
+def _with_header(send, name: bytes, value: bytes):
+    async def send_with_header(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": list(message.get("headers", [])) + [(name, value)]}
+        await send(message)
+    return send_with_header
@@ -0,0 +1,215 @@
+import math
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from ledger import TradeLedger
+from metrics import stage, timed
+from models import RiskMetrics, Trade
+
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.02
+
+
+class RiskAccumulator:
+    """Running risk statistics over a trade history, updated one trade at a time
+
+    Keeps the cumulative P&L with its peak and maximum drawdown, a Welford
+    mean and variance of trade-to-trade P&L changes, and win/loss and gross
+    profit/loss totals, so metrics cost O(1) however long the history is.
+    Trades must be added in timestamp order; the results match
+    ``compute_risk_metrics`` over the same trades.
+    """
+
+    __slots__ = (
+        "count", "wins", "cumulative_pnl", "peak_pnl", "max_drawdown",
+        "gross_profit", "gross_loss", "total_commission", "_last_pnl",
+        "_mean", "_m2"
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.cumulative_pnl = 0.0
+        self.peak_pnl = 0.0
+        self.max_drawdown = 0.0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.total_commission = 0.0
+        self._last_pnl = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def copy(self) -> "RiskAccumulator":
+        clone = RiskAccumulator.__new__(RiskAccumulator)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def add(self, trade: Trade):
+        self.add_pnl(trade.realized_pnl, trade.commission)
+
+    def add_pnl(self, pnl: float, commission: float = 0.0):
+        """Fold one trade's realized P&L and commission into the statistics"""
+        self.count += 1
+        self.total_commission += commission
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+        elif pnl < 0:
+            self.gross_loss -= pnl
+
+        self.cumulative_pnl += pnl
+        if self.count == 1 or self.cumulative_pnl > self.peak_pnl:
+            self.peak_pnl = self.cumulative_pnl
+        self.max_drawdown = max(self.max_drawdown, self.peak_pnl - self.cumulative_pnl)
+
+        # Change relative to the previous trade's P&L, as pandas pct_change
+        # does; the first trade and 0 -> 0 count as no change
+        if self.count == 1:
+            change = 0.0
+        elif self._last_pnl != 0:
+            change = pnl / self._last_pnl - 1
+        elif pnl == 0:
+            change = 0.0
+        else:
+            change = math.copysign(math.inf, pnl)
+        self._last_pnl = pnl
+
+        # Welford update of the running mean and sum of squared deviations
+        delta = change - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (change - self._mean)
+
+    @timed(stage("risk_metrics"))
+    def metrics(self) -> RiskMetrics:
+        if self.count == 0:
+            return RiskMetrics(
+                max_drawdown=0.0,
+                sharpe_ratio=0.0,
+                total_return=0.0,
+                volatility=0.0,
+                win_rate=0.0,
+                profit_factor=0.0
+            )
+
+        volatility = 0.0
+        if self.count > 1:
+            volatility = math.sqrt(self._m2 / (self.count - 1)) * math.sqrt(TRADING_DAYS)
+        sharpe_ratio = 0.0
+        if volatility > 0:
+            sharpe_ratio = (self._mean - RISK_FREE_RATE / TRADING_DAYS) / volatility
+
+        return RiskMetrics(
+            max_drawdown=self.max_drawdown,
+            sharpe_ratio=sharpe_ratio,
+            total_return=self.cumulative_pnl,
+            volatility=volatility,
+            win_rate=self.wins / self.count,
+            profit_factor=self.gross_profit / self.gross_loss if self.gross_loss > 0 else float('inf')
+        )
+
+    def trading_stats(self) -> Dict[str, float]:
+        total_realized_pnl = self.cumulative_pnl
+        return {
+            "total_trades": self.count,
+            "winning_trades": self.wins,
+            "losing_trades": self.count - self.wins,
+            "total_commission": self.total_commission,
+            "total_realized_pnl": total_realized_pnl,
+            "net_pnl": total_realized_pnl - self.total_commission
+        }
+
+
+@timed(stage("risk_metrics_full"))
+def compute_risk_metrics(ledger: TradeLedger) -> RiskMetrics:
+    """Calculate risk metrics for a trade ledger using pandas
+
+    Full recompute over the whole history; kept to verify RiskAccumulator.
+    """
+    if not len(ledger):
+        return RiskMetrics(
+            max_drawdown=0.0,
+            sharpe_ratio=0.0,
+            total_return=0.0,
+            volatility=0.0,
+            win_rate=0.0,
+            profit_factor=0.0
+        )
+
+    # Wrap the ledger columns in a DataFrame
+    trades_df = pd.DataFrame({
+        'timestamp': ledger.column('timestamp'),
+        'pnl': ledger.column('realized_pnl'),
+        'commission': ledger.column('commission')
+    }, copy=False)
+
+    # Stable, so trades sharing a timestamp (one command or tick) keep their
+    # recorded order, which the path-dependent metrics depend on
+    trades_df = trades_df.sort_values('timestamp', kind='stable')
+    trades_df['cumulative_pnl'] = trades_df['pnl'].cumsum()
+    trades_df['cumulative_return'] = trades_df['cumulative_pnl'] / abs(trades_df['cumulative_pnl'].iloc[0]) if len(trades_df) > 0 else 0
+
+    # Max drawdown
+    rolling_max = trades_df['cumulative_pnl'].expanding().max()
+    drawdowns = trades_df['cumulative_pnl'] - rolling_max
+    max_drawdown = abs(drawdowns.min()) if len(drawdowns) > 0 else 0.0
+
+    # Total return
+    total_return = trades_df['cumulative_pnl'].iloc[-1] if len(trades_df) > 0 else 0.0
+
+    # Volatility (daily returns)
+    if len(trades_df) > 1:
+        trades_df['daily_return'] = trades_df['pnl'].pct_change().fillna(0)
+        volatility = trades_df['daily_return'].std() * np.sqrt(TRADING_DAYS)  # Annualized
+    else:
+        volatility = 0.0
+
+    # Sharpe ratio (assuming 2% risk-free rate)
+    if volatility > 0:
+        sharpe_ratio = (trades_df['daily_return'].mean() - RISK_FREE_RATE/TRADING_DAYS) / volatility
+    else:
+        sharpe_ratio = 0.0
+
+    # Win rate
+    winning_trades = len(trades_df[trades_df['pnl'] > 0])
+    win_rate = winning_trades / len(trades_df) if len(trades_df) > 0 else 0.0
+
+    # Profit factor
+    gross_profit = trades_df[trades_df['pnl'] > 0]['pnl'].sum()
+    gross_loss = abs(trades_df[trades_df['pnl'] < 0]['pnl'].sum())
+    profit_factor = gross_profit / gross_loss if gross_loss > 0 else float('inf')
+
+    return RiskMetrics(
+        max_drawdown=max_drawdown,
+        sharpe_ratio=sharpe_ratio,
+        total_return=total_return,
+        volatility=volatility,
+        win_rate=win_rate,
+        profit_factor=profit_factor
+    )
+
+
+def compute_trading_stats(ledger: TradeLedger) -> Dict[str, float]:
+    """Trade counts and P&L totals by a full pass over the ledger columns"""
+    pnl = ledger.column('realized_pnl')
+    total_trades = len(ledger)
+    winning_trades = int(np.count_nonzero(pnl > 0))
+    total_commission = float(ledger.column('commission').sum())
+    total_realized_pnl = float(pnl.sum())
+    return {
+        "total_trades": total_trades,
+        "winning_trades": winning_trades,
+        "losing_trades": total_trades - winning_trades,
+        "total_commission": total_commission,
+        "total_realized_pnl": total_realized_pnl,
+        "net_pnl": total_realized_pnl - total_commission
+    }
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode plain Python data (dicts, lists, datetimes, enums) as JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+def ndjson(records: Iterable[Any]) -> Iterator[bytes]:
+    """Encode records as newline-delimited JSON, one line per record"""
+    for record in records:
+        yield dumps(record) + b"\n"
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """Parse a comma-separated field projection, None meaning every field"""
+    if not fields:
+        return None
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
+class FastJSONResponse(Response):
+    """JSON response for data the engine built itself
+
+    Content is encoded as-is, without a response model re-validating it,
+    using orjson when it is installed.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from config import STREAM_MAX_PENDING
+
+# State events where only the latest value per symbol matters. Anything
+# else (fills, margin calls) is delivered individually.
+CONFLATED_EVENTS = {"price", "position", "portfolio"}
+
+# Conflated events whose payloads are partial updates and must be merged
+MERGED_EVENTS = {"portfolio"}
+
+
+def _encode(event_type: str, data: Any) -> str:
+    return json.dumps({"type": event_type, "data": data}, default=str)
+
+
+class ClientStream:
+    """Outbound queue for one subscriber
+
+    A client follows one account plus market-wide events. State events are
+    conflated per (event type, symbol), so a client that falls behind only
+    receives the latest price, position and portfolio values. Discrete
+    events go through a bounded queue; when it is full the oldest event is
+    dropped and counted rather than blocking the publisher.
+    """
+
+    def __init__(self, account_id: str, max_pending: int = STREAM_MAX_PENDING, symbols: Optional[Iterable[str]] = None):
+        self.account_id = account_id
+        self.symbols: Optional[Set[str]] = set(symbols) if symbols else None
+        self.dropped = 0
+        self._events: deque = deque(maxlen=max_pending)
+        self._state: "OrderedDict[Tuple[str, Optional[str]], Dict]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def wants(self, account_id: Optional[str], symbol: Optional[str]) -> bool:
+        if account_id is not None and account_id != self.account_id:
+            return False
+        return symbol is None or self.symbols is None or symbol in self.symbols
+
+    def subscribe(self, symbols: Optional[Iterable[str]]):
+        """Restrict the stream to the given symbols, or all symbols if None"""
+        self.symbols = set(symbols) if symbols else None
+
+    def offer_event(self, message: str):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(message)
+        self._ready.set()
+
+    def offer_state(self, event_type: str, symbol: Optional[str], data: Dict):
+        key = (event_type, symbol)
+        pending = self._state.get(key)
+        if pending is not None and event_type in MERGED_EVENTS:
+            pending.update(data)
+        else:
+            self._state[key] = dict(data) if event_type in MERGED_EVENTS else data
+        self._ready.set()
+
+    def push(self, event_type: str, data: Any):
+        """Queue a message generated for this client only"""
+        self.offer_event(_encode(event_type, data))
+
+    async def drain(self) -> List[str]:
+        """Wait for pending messages and return them, discrete events first"""
+        await self._ready.wait()
+        self._ready.clear()
+
+        messages = list(self._events)
+        self._events.clear()
+        if self.dropped:
+            messages.append(_encode("overflow", {"dropped": self.dropped}))
+            self.dropped = 0
+
+        state, self._state = self._state, OrderedDict()
+        messages.extend(_encode(event_type, data) for (event_type, _), data in state.items())
+        return messages
+
+
+class EventHub:
+    """Fans engine events out to connected stream clients
+
+    The hub is registered as the account manager's listener. Publishing
+    never awaits, so the engine is never held up by a slow client; each
+    client's queue absorbs the difference.
+    """
+
+    def __init__(self, max_pending: int = STREAM_MAX_PENDING):
+        self.max_pending = max_pending
+        self._clients: Set[ClientStream] = set()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def connect(self, account_id: str, symbols: Optional[Iterable[str]] = None) -> ClientStream:
+        client = ClientStream(account_id, self.max_pending, symbols)
+        self._clients.add(client)
+        return client
+
+    def disconnect(self, client: ClientStream):
+        self._clients.discard(client)
+
+    def publish(self, account_id: Optional[str], event_type: str, symbol: Optional[str], payload: Any):
+        """Deliver an account (or market-wide, account_id None) event to interested clients"""
+        if not self._clients:
+            return
+
+        clients = [c for c in self._clients if c.wants(account_id, symbol)]
+        if not clients:
+            return
+        data = payload.model_dump(mode="json") if isinstance(payload, BaseModel) else payload
+        if event_type in CONFLATED_EVENTS:
+            for client in clients:
+                client.offer_state(event_type, symbol, data)
+        else:
+            message = _encode(event_type, data)
+            for client in clients:
+                client.offer_event(message)
@@ -0,0 +1,225 @@
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from backtest import Backtest, Strategy, TickSeries
+from models import OrderSide, OrderType, RiskMetrics
+
+# Parameters consumed by the engine; everything else goes to the strategy
+ENGINE_PARAMS = {"initial_balance", "leverage", "commission_rate", "liquidation_policy"}
+
+_METRIC_COLUMNS = list(RiskMetrics.model_fields)
+_RESULT_COLUMNS = ["run_id", "symbol", "params"] + _METRIC_COLUMNS + [
+    "final_equity", "final_balance", "trades", "ticks", "seconds"
+]
+
+
+class BracketStrategy(Strategy):
+    """Reference strategy for sweeps: a limit entry with a stop and target
+
+    Whenever a symbol is flat with no working entry, every ``entry_every``
+    ticks it rests a limit order ``limit_offset`` (a fraction of price) away
+    from the market, with a stop loss and take profit ``stop_distance`` and
+    ``take_profit_distance`` away from the entry.
+    """
+
+    def __init__(self, side: str = "buy", quantity: float = 1.0, entry_every: int = 100,
+                 limit_offset: float = 0.001, stop_distance: float = 0.01,
+                 take_profit_distance: float = 0.02):
+        self.side = OrderSide(side)
+        self.quantity = quantity
+        self.entry_every = entry_every
+        self.limit_offset = limit_offset
+        self.stop_distance = stop_distance
+        self.take_profit_distance = take_profit_distance
+        self._ticks: Dict[str, int] = {}
+
+    def on_tick(self, backtest: Backtest, symbol: str, price: float):
+        seen = self._ticks.get(symbol, 0)
+        self._ticks[symbol] = seen + 1
+        if seen % self.entry_every:
+            return
+        engine = backtest.engine
+        if engine.get_position(symbol) is not None or symbol in engine.order_book.symbols():
+            return
+
+        direction = 1 if self.side == OrderSide.BUY else -1
+        entry = price * (1 - direction * self.limit_offset)
+        backtest.place_order(
+            symbol=symbol,
+            type=OrderType.LIMIT,
+            side=self.side,
+            quantity=self.quantity,
+            price=entry,
+            stop_loss=entry * (1 - direction * self.stop_distance),
+            take_profit=entry * (1 + direction * self.take_profit_distance)
+        )
+
+
+def expand_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the grid's parameter values"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def run_id(params: Dict[str, Any], symbol: Optional[str]) -> str:
+    """Stable identifier of a run, used to skip finished runs on resume"""
+    key = json.dumps({"params": params, "symbol": symbol}, sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+# Tick arrays of the sweep, memory-mapped once per worker process
+_worker_ticks: Optional[TickSeries] = None
+
+
+def _load_ticks(directory: str) -> TickSeries:
+    with open(os.path.join(directory, "symbols.json")) as f:
+        symbols = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in ("codes", "prices", "timestamps")
+    }
+    return TickSeries(symbols=symbols, **arrays)
+
+
+def _init_worker(directory: str):
+    global _worker_ticks
+    _worker_ticks = _load_ticks(directory)
+
+
+def _run_one(params: Dict[str, Any], symbol: Optional[str],
+             strategy_factory: Callable[..., Strategy], sample_every: int) -> Dict[str, Any]:
+    """Run one backtest in a worker against the shared ticks"""
+    started = time.perf_counter()
+    ticks = _worker_ticks
+    if symbol is not None:
+        mask = ticks.codes == ticks.symbols.index(symbol)
+        ticks = TickSeries([symbol], np.zeros(int(mask.sum()), np.int32), ticks.prices[mask], ticks.timestamps[mask])
+
+    engine_params = {k: v for k, v in params.items() if k in ENGINE_PARAMS}
+    strategy_params = {k: v for k, v in params.items() if k not in ENGINE_PARAMS}
+    commission_rate = engine_params.pop("commission_rate", None)
+
+    backtest = Backtest(strategy_factory(**strategy_params), sample_every=sample_every, **engine_params)
+    if commission_rate is not None:
+        backtest.engine.commission_rate = commission_rate
+    result = backtest.run(ticks)
+
+    row = {
+        "run_id": run_id(params, symbol),
+        "symbol": symbol or "",
+        "params": json.dumps(params, sort_keys=True, default=str),
+    }
+    row.update(backtest.engine.calculate_risk_metrics().model_dump())
+    row.update({
+        "final_equity": result.summary["equity"],
+        "final_balance": result.summary["balance"],
+        "trades": len(result.ledger),
+        "ticks": result.ticks,
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+    return row
+
+
+class ParameterSweep:
+    """Runs a grid of backtests over a process pool and tabulates the results
+
+    The tick arrays are written once to a temporary directory and
+    memory-mapped read-only by every worker, so the pages are shared
+    instead of pickled per run. Each finished run is appended to
+    ``results_path`` (CSV) immediately; rerunning a sweep with the same
+    file skips the runs already recorded there.
+    """
+
+    def __init__(
+        self,
+        ticks: TickSeries,
+        grid: Dict[str, Sequence[Any]],
+        results_path: str,
+        strategy_factory: Callable[..., Strategy] = BracketStrategy,
+        per_symbol: bool = False,
+        workers: Optional[int] = None,
+        sample_every: int = 1000,
+    ):
+        self.ticks = ticks
+        self.runs = expand_grid(grid)
+        self.results_path = results_path
+        self.strategy_factory = strategy_factory
+        self.symbols: List[Optional[str]] = list(ticks.symbols) if per_symbol else [None]
+        self.workers = workers or os.cpu_count() or 1
+        self.sample_every = sample_every
+
+    def completed(self) -> Set[str]:
+        """Run ids already recorded in the results file"""
+        if not os.path.exists(self.results_path):
+            return set()
+        with open(self.results_path, newline="") as f:
+            return {row["run_id"] for row in csv.DictReader(f)}
+
+    def pending(self) -> List[tuple]:
+        done = self.completed()
+        return [
+            (params, symbol)
+            for params in self.runs
+            for symbol in self.symbols
+            if run_id(params, symbol) not in done
+        ]
+
+    def _share_ticks(self, directory: str):
+        with open(os.path.join(directory, "symbols.json"), "w") as f:
+            json.dump(self.ticks.symbols, f)
+        np.save(os.path.join(directory, "codes.npy"), self.ticks.codes)
+        np.save(os.path.join(directory, "prices.npy"), self.ticks.prices)
+        np.save(os.path.join(directory, "timestamps.npy"), self.ticks.timestamps)
+
+    def run(self, on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> pd.DataFrame:
+        """Run every pending combination and return the full results table"""
+        pending = self.pending()
+        if pending:
+            for row in self._execute(pending):
+                if on_result is not None:
+                    on_result(row)
+        return pd.read_csv(self.results_path) if os.path.exists(self.results_path) else pd.DataFrame(columns=_RESULT_COLUMNS)
+
+    def _execute(self, pending: List[tuple]) -> Iterator[Dict[str, Any]]:
+        directory = tempfile.mkdtemp(prefix="sweep-")
+        try:
+            self._share_ticks(directory)
+            new_file = not os.path.exists(self.results_path)
+            with open(self.results_path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=_RESULT_COLUMNS)
+                if new_file:
+                    writer.writeheader()
+                for row in self._map(directory, pending):
+                    writer.writerow(row)
+                    f.flush()
+                    yield row
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _map(self, directory: str, pending: List[tuple]) -> Iterator[Dict[str, Any]]:
+        """Yield run results as they finish, keeping at most 2x workers in flight"""
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(directory,)) as pool:
+            queue = iter(pending)
+            running = set()
+            while True:
+                for params, symbol in itertools.islice(queue, 2 * self.workers - len(running)):
+                    running.add(pool.submit(_run_one, params, symbol, self.strategy_factory, self.sample_every))
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
@@ -0,0 +1,14 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The API with a fresh engine and no journal, database or bar history on disk"""
+    monkeypatch.setattr(main, "JOURNAL_DIR", "")
+    monkeypatch.setattr(main, "DATABASE_URL", "")
+    monkeypatch.setattr(main.bar_aggregator, "history", None)
+    with TestClient(main.app) as client:
+        yield client
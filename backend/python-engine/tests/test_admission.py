@@ -0,0 +1,97 @@
+import pytest
+
+from admission import OrderAdmission, OrderRejected
+from models import OrderRequest, OrderSide, OrderStatus, OrderType, RejectionReason
+from trading_engine import TradingEngine
+
+
+def _check(admission, net_quantity=0.0, order_quantity=1.0, price=100.0, equity=1000.0,
+           used_margin=0.0, notional=0.0, leverage=10.0, loss=0.0, commission_rate=0.0):
+    rejections = admission.check(net_quantity, order_quantity, price, equity, used_margin,
+                                 notional, leverage, loss, commission_rate)
+    return [r.reason for r in rejections]
+
+
+def test_an_order_that_fits_is_admitted():
+    assert _check(OrderAdmission(), order_quantity=50.0) == []
+
+
+def test_insufficient_margin_counts_the_commission():
+    admission = OrderAdmission(max_symbol_exposure=0)
+    # 10000 notional needs exactly the 1000 free margin
+    assert _check(admission, order_quantity=100.0) == []
+    assert _check(admission, order_quantity=100.0, commission_rate=0.001) == [RejectionReason.INSUFFICIENT_MARGIN]
+    assert _check(admission, order_quantity=10.0, used_margin=950.0) == [RejectionReason.INSUFFICIENT_MARGIN]
+
+
+def test_max_leverage():
+    admission = OrderAdmission(max_leverage=5, max_symbol_exposure=0)
+    assert _check(admission, order_quantity=50.0) == []
+    assert _check(admission, order_quantity=51.0) == [RejectionReason.MAX_LEVERAGE]
+
+
+def test_symbol_exposure_is_a_share_of_buying_power():
+    admission = OrderAdmission(max_symbol_exposure=0.5)
+    assert _check(admission, order_quantity=50.0) == []
+    assert _check(admission, order_quantity=51.0) == [RejectionReason.SYMBOL_EXPOSURE]
+    assert _check(OrderAdmission(max_symbol_exposure=0), order_quantity=100.0) == []
+
+
+def test_loss_limit_is_measured_from_the_peak():
+    admission = OrderAdmission(max_loss_percent=0.1)
+    # 100 lost from a peak value of 1000
+    assert _check(admission, equity=900.0, loss=100.0) == []
+    assert _check(admission, equity=890.0, loss=110.0) == [RejectionReason.LOSS_LIMIT]
+    assert _check(OrderAdmission(max_loss_percent=0), equity=500.0, loss=500.0) == []
+
+
+def test_every_failed_check_is_reported():
+    reasons = _check(OrderAdmission(max_leverage=5, max_symbol_exposure=0.5), order_quantity=200.0)
+    assert reasons == [RejectionReason.INSUFFICIENT_MARGIN, RejectionReason.MAX_LEVERAGE,
+                       RejectionReason.SYMBOL_EXPOSURE]
+
+
+@pytest.mark.parametrize("net_quantity, order_quantity, rejected", [
+    (100.0, -100.0, False),   # closes the position
+    (100.0, -50.0, False),    # reduces it
+    (100.0, -200.0, False),   # flips to a short as large as the long
+    (100.0, -250.0, True),    # flips to a larger short
+])
+def test_only_added_exposure_is_checked(net_quantity, order_quantity, rejected):
+    admission = OrderAdmission()
+    reasons = _check(admission, net_quantity, order_quantity, used_margin=1000.0, notional=10000.0)
+    assert bool(reasons) == rejected
+
+
+def _engine(**admission):
+    engine = TradingEngine(initial_balance=1000.0, leverage=10.0, admission=OrderAdmission(**admission))
+    engine.commission_rate = 0.0
+    engine.update_market_price("BTC", 100.0)
+    engine.update_market_price("ETH", 100.0)
+    return engine
+
+
+def test_engine_refuses_an_order_it_cannot_carry():
+    engine = _engine()
+    with pytest.raises(OrderRejected) as rejected:
+        engine.place_order(OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY, quantity=150.0))
+
+    assert isinstance(rejected.value, ValueError)
+    assert RejectionReason.INSUFFICIENT_MARGIN in [r.reason for r in rejected.value.rejections]
+    assert engine.get_position("BTC") is None
+    assert len(engine.get_trades()) == 0
+
+
+def test_pending_order_is_rejected_if_it_no_longer_fits_when_it_fills():
+    engine = _engine(max_symbol_exposure=0)
+    events = []
+    engine.add_listener(lambda event_type, symbol, payload: events.append(event_type))
+    limit = engine.place_order(OrderRequest(symbol="BTC", type=OrderType.LIMIT, side=OrderSide.BUY,
+                                            quantity=50.0, price=90.0))
+    engine.place_order(OrderRequest(symbol="ETH", type=OrderType.MARKET, side=OrderSide.BUY, quantity=80.0))
+
+    engine.update_market_price("BTC", 90.0)
+    assert limit.status == OrderStatus.REJECTED
+    assert "order_rejected" in events
+    assert engine.get_position("BTC") is None
+    assert engine.get_orders() == []
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from admission import OrderAdmission
+from models import OrderRequest, OrderSide, OrderType
+from trading_engine import TradingEngine
+
+SYMBOLS = ("BTC", "ETH", "SOL")
+
+
+def _recomputed(engine):
+    positions = engine.get_positions()
+    unrealized = sum(p.unrealized_pnl for p in positions)
+    notional = sum(abs(p.quantity * engine.market_prices[p.symbol]) for p in positions)
+    return engine.portfolio.balance + unrealized, notional / engine.portfolio.leverage
+
+
+def test_running_totals_match_a_full_recompute():
+    rng = random.Random(11)
+    engine = TradingEngine(initial_balance=1000000.0, leverage=10.0, debug=True,
+                           admission=OrderAdmission(max_symbol_exposure=0, max_loss_percent=0))
+    prices = {symbol: 100.0 for symbol in SYMBOLS}
+    for symbol, price in prices.items():
+        engine.update_market_price(symbol, price)
+
+    for _ in range(2000):
+        symbol = rng.choice(SYMBOLS)
+        if rng.random() < 0.3:
+            engine.place_order(OrderRequest(symbol=symbol, type=OrderType.MARKET,
+                                            side=rng.choice([OrderSide.BUY, OrderSide.SELL]),
+                                            quantity=rng.choice([0.5, 1.0, 2.0])))
+            continue
+        # Equity and margin are settled on ticks
+        prices[symbol] *= 1.0 + rng.gauss(0.0, 0.01)
+        engine.update_market_price(symbol, prices[symbol])
+        equity, used_margin = _recomputed(engine)
+        assert engine.portfolio.equity == pytest.approx(equity, rel=1e-9)
+        assert engine.portfolio.used_margin == pytest.approx(used_margin, rel=1e-9, abs=1e-9)
+
+    assert engine.get_positions()
+
+
+def test_a_tick_reprices_only_its_symbol():
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0)
+    for symbol in SYMBOLS:
+        engine.update_market_price(symbol, 100.0)
+        engine.place_order(OrderRequest(symbol=symbol, type=OrderType.MARKET, side=OrderSide.BUY, quantity=1.0))
+    events = []
+    engine.add_listener(lambda event_type, symbol, payload: events.append((event_type, symbol)))
+
+    engine.update_market_price("ETH", 110.0)
+    assert [e for e in events if e[0] == "position"] == [("position", "ETH")]
+    assert engine.get_position("ETH").unrealized_pnl == pytest.approx(10.0)
+    assert engine.get_position("BTC").unrealized_pnl == 0.0
+
+
+def test_debug_checks_catch_a_diverged_total():
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0, debug=True)
+    engine.update_market_price("BTC", 100.0)
+    engine.place_order(OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY, quantity=1.0))
+    engine._total_unrealized += 5.0
+    with pytest.raises(RuntimeError):
+        engine.update_market_price("ETH", 50.0)
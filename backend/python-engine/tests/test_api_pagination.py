@@ -0,0 +1,100 @@
+import json
+from datetime import datetime
+
+
+def _trade(client, symbol, side, quantity=1.0):
+    response = client.post("/orders", json={"symbol": symbol, "type": "market", "side": side, "quantity": quantity})
+    assert response.status_code == 200, response.text
+
+
+def _seed(client, rounds=6):
+    client.post("/market-price/BTC", params={"price": 100.0})
+    client.post("/market-price/ETH", params={"price": 50.0})
+    for i in range(rounds):
+        symbol = "BTC" if i % 2 else "ETH"
+        _trade(client, symbol, "buy")
+        _trade(client, symbol, "sell")
+
+
+def _pages(client, path, **params):
+    """Every item of a listing, following X-Next-Cursor, and the page count"""
+    items, cursor, pages = [], 0, 0
+    while cursor is not None:
+        response = client.get(path, params={**params, "cursor": cursor})
+        assert response.status_code == 200, response.text
+        items.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        pages += 1
+    return items, pages
+
+
+def test_trade_pages_follow_the_next_cursor(client):
+    _seed(client)
+    everything = client.get("/trades").json()
+    assert "X-Next-Cursor" not in client.get("/trades").headers
+    assert len(everything) == 18
+
+    items, pages = _pages(client, "/trades", limit=4)
+    assert items == everything
+    assert pages == 5
+
+
+def test_trade_filters_and_projection(client):
+    _seed(client)
+    everything = client.get("/trades").json()
+
+    eth, _ = _pages(client, "/trades", limit=5, symbols="ETH", fields="id,symbol,price")
+    assert [t["id"] for t in eth] == [t["id"] for t in everything if t["symbol"] == "ETH"]
+    assert {tuple(t) for t in eth} == {("id", "symbol", "price")}
+
+    since = everything[7]["timestamp"]
+    later = client.get("/trades", params={"start": since, "symbols": "BTC,ETH"}).json()
+    since = datetime.fromisoformat(since)
+    assert [t["id"] for t in later] == [
+        t["id"] for t in everything if datetime.fromisoformat(t["timestamp"]) >= since]
+
+    assert client.get("/trades", params={"fields": "id,nope"}).status_code == 400
+    assert client.get("/trades", params={"limit": 0}).status_code == 422
+
+
+def test_cursors_stay_valid_while_trades_are_appended(client):
+    _seed(client, rounds=2)
+    first = client.get("/trades", params={"limit": 4})
+    cursor = first.headers["X-Next-Cursor"]
+
+    _trade(client, "BTC", "buy")
+    _trade(client, "BTC", "sell")
+    rest = client.get("/trades", params={"cursor": cursor}).json()
+
+    everything = client.get("/trades").json()
+    assert first.json() + rest == everything
+    assert len(everything) == 9
+
+
+def test_export_streams_ndjson(client):
+    _seed(client)
+    response = client.get("/trades/export", params={"symbols": "BTC", "fields": "id,quantity"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    expected = [{"id": t["id"], "quantity": t["quantity"]} for t in client.get("/trades").json() if t["symbol"] == "BTC"]
+    assert lines == expected
+
+
+def test_order_pages_filter_and_project(client):
+    client.post("/market-price/BTC", params={"price": 100.0})
+    client.post("/market-price/ETH", params={"price": 50.0})
+    for i in range(5):
+        for symbol, price in (("BTC", 90.0 - i), ("ETH", 40.0 - i)):
+            response = client.post("/orders", json={"symbol": symbol, "type": "limit", "side": "buy",
+                                                    "quantity": 1.0, "price": price})
+            assert response.status_code == 200, response.text
+
+    everything = client.get("/orders").json()
+    assert len(everything) == 10
+    items, pages = _pages(client, "/orders", limit=3)
+    assert items == everything
+    assert pages == 4
+
+    btc, _ = _pages(client, "/orders", limit=2, symbols="BTC", fields="id,price")
+    assert btc == [{"id": o["id"], "price": o["price"]} for o in everything if o["symbol"] == "BTC"]
+    assert client.get("/accounts/nobody/orders").status_code == 404
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import Backtest, Strategy, TickSeries
+from models import OrderSide, OrderType
+
+T0 = datetime(2024, 1, 1)
+
+
+def _series(prices, symbol="BTC", step=timedelta(minutes=1), start=T0):
+    return TickSeries.from_arrays(symbol, prices, [start + step * i for i in range(len(prices))])
+
+
+class BuyThenSell(Strategy):
+    """Buys on the first tick and sells on tick ``exit_at``"""
+
+    def __init__(self, exit_at):
+        self.exit_at = exit_at
+        self.ticks = 0
+        self.fills = []
+
+    def on_tick(self, backtest, symbol, price):
+        if self.ticks in (0, self.exit_at):
+            side = OrderSide.BUY if self.ticks == 0 else OrderSide.SELL
+            backtest.place_order(symbol=symbol, type=OrderType.MARKET, side=side, quantity=10.0)
+        self.ticks += 1
+
+    def on_fill(self, backtest, trade):
+        self.fills.append((trade.side, trade.price, trade.timestamp))
+
+
+def test_orders_fill_at_the_tick_price_and_time():
+    strategy = BuyThenSell(exit_at=5)
+    result = Backtest(strategy, initial_balance=10000.0).run(_series([100.0 + i for i in range(10)]))
+
+    assert strategy.fills[0] == (OrderSide.BUY, 100.0, T0)
+    assert strategy.fills[-1][1:] == (105.0, T0 + timedelta(minutes=5))
+    assert result.ticks == 10
+    assert result.summary["total_trades"] == 3
+    pnl = sum(t.realized_pnl for t in result.trades())
+    assert pnl == pytest.approx(50.0)
+    assert result.equity[-1] == pytest.approx(10000.0 + pnl - sum(t.commission for t in result.trades()))
+
+
+@pytest.mark.parametrize("ticks, samples", [(10, [0, 3, 6, 9]), (11, [0, 3, 6, 9, 10]), (1, [0])])
+def test_equity_is_sampled_and_ends_with_the_last_tick(ticks, samples):
+    series = _series([100.0] * ticks)
+    result = Backtest(sample_every=3).run(series)
+    assert list(result.timestamps) == list(series.timestamps[samples])
+    assert len(result.equity_curve()) == len(samples)
+
+
+def test_runs_are_reproducible():
+    rng = np.random.default_rng(5)
+    series = _series(100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, 500))))
+    first, second = (Backtest(BuyThenSell(exit_at=250)).run(series) for _ in range(2))
+    assert np.array_equal(first.equity, second.equity)
+    assert first.trades() == second.trades()
+
+
+def test_series_merge_and_load_in_timestamp_order(tmp_path):
+    btc = _series([1.0, 2.0, 3.0], "BTC", step=timedelta(seconds=2))
+    eth = _series([10.0, 20.0], "ETH", step=timedelta(seconds=2), start=T0 + timedelta(seconds=1))
+    merged = TickSeries.merge([btc, eth])
+    assert [merged.symbols[c] for c in merged.codes] == ["BTC", "ETH", "BTC", "ETH", "BTC"]
+    assert merged.prices.tolist() == [1.0, 10.0, 2.0, 20.0, 3.0]
+
+    frame = pd.DataFrame({
+        "timestamp": pd.to_datetime(merged.timestamps),
+        "symbol": [merged.symbols[c] for c in merged.codes],
+        "price": merged.prices,
+    }).iloc[::-1]
+    path = tmp_path / "ticks.csv"
+    frame.to_csv(path, index=False)
+    loaded = TickSeries.from_file(str(path))
+    assert [loaded.symbols[c] for c in loaded.codes] == ["BTC", "ETH", "BTC", "ETH", "BTC"]
+    assert np.array_equal(loaded.timestamps, merged.timestamps)
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bars import BarAggregator, parse_timeframe
+from src.engine.market_data.historical_manager import HistoricalManager
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+def _at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+
+def test_a_tick_past_the_boundary_finishes_the_bar():
+    bars = BarAggregator(timeframes=["1s", "1m"])
+    for seconds, price, volume in [(0, 100.0, 1.0), (10, 105.0, 3.0), (20, 95.0, 0.0), (59.5, 101.0, 1.0)]:
+        bars.update_market_price("BTC", price, _at(seconds), volume)
+    assert [b["closed"] for b in bars.bars("BTC", "1m")] == [False]
+
+    bars.update_market_price("BTC", 102.0, _at(60), 2.0)
+    finished, open_bar = bars.bars("BTC", "1m")
+    assert finished == {
+        "timestamp": T0, "open": 100.0, "high": 105.0, "low": 95.0, "close": 101.0,
+        "volume": 5.0, "vwap": pytest.approx((100.0 + 315.0 + 101.0) / 5.0), "ticks": 4, "closed": True,
+    }
+    assert (open_bar["timestamp"], open_bar["open"], open_bar["closed"]) == (_at(60), 102.0, False)
+    # One finished second-bar per second that had ticks, and no bars for the gaps
+    assert [b["timestamp"] for b in bars.bars("BTC", "1s", partial=False)] == [_at(0), _at(10), _at(20), _at(59)]
+
+
+def test_late_ticks_fold_into_the_open_bar_and_volume_free_bars_average():
+    bars = BarAggregator(timeframes=["1m"])
+    bars.update_market_prices([("ETH", 10.0, _at(65)), ("ETH", 20.0, _at(61)), ("ETH", 30.0, _at(62))])
+    bars.update_market_price("ETH", 40.0, _at(30))
+    bar, = bars.bars("ETH", "1m")
+    assert (bar["timestamp"], bar["open"], bar["close"], bar["low"], bar["ticks"]) == (_at(60), 20.0, 40.0, 10.0, 4)
+    assert bar["vwap"] == pytest.approx(25.0)
+
+
+def test_the_ring_keeps_the_latest_bars():
+    bars = BarAggregator(timeframes=["1s"], capacity=3)
+    for i in range(6):
+        bars.update_market_price("BTC", float(i), _at(i))
+    assert [b["close"] for b in bars.bars("BTC", "1s")] == [2.0, 3.0, 4.0, 5.0]
+    assert [b["close"] for b in bars.bars("BTC", "1s", limit=2)] == [4.0, 5.0]
+    assert len(bars.columns("BTC", "1s", partial=False)) == 3
+    with pytest.raises(ValueError):
+        bars.bars("BTC", "1h")
+    with pytest.raises(ValueError):
+        parse_timeframe("0m")
+
+
+class _FullDisk:
+    def append_bars(self, symbol, timeframe, bars):
+        raise OSError("No space left on device")
+
+
+def test_finished_bars_are_flushed_once_and_retried_after_a_failure(tmp_path):
+    history = HistoricalManager(str(tmp_path))
+    bars = BarAggregator(timeframes=["1s"], history=history)
+    for i in range(4):
+        bars.update_market_price("BTC", float(i), _at(i))
+    assert bars.flush() == 3
+    assert bars.flush() == 0
+    assert history.get_bars("BTC", "1s")["close"].tolist() == [0.0, 1.0, 2.0]
+
+    bars.update_market_price("BTC", 4.0, _at(4))
+    bars.history = _FullDisk()
+    assert bars.flush() == 0
+    bars.history = history
+    assert bars.flush() == 1
+
+    # After a restart, bars the store already has are dropped
+    restarted = BarAggregator(timeframes=["1s"], history=history)
+    for i in range(2, 6):
+        restarted.update_market_price("BTC", float(i), _at(i))
+    assert restarted.flush() == 1
+    assert history.get_bars("BTC", "1s")["close"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import benchmark
+
+
+def _document(**values):
+    metrics = {}
+    for name, value in values.items():
+        better = "lower" if name.endswith("_us") else "higher"
+        metrics[name] = {"value": value, "unit": "us" if better == "lower" else "ops/s", "better": better}
+    return {"quick": True, "metrics": metrics}
+
+
+def _statuses(rows):
+    return {row["metric"]: row["status"] for row in rows}
+
+
+def test_changes_are_signed_by_which_direction_is_better():
+    baseline = _document(latency_us=100.0, rate=1000.0)
+    rows = benchmark.compare(baseline, _document(latency_us=80.0, rate=800.0))
+    changes = {row["metric"]: row["change"] for row in rows}
+
+    assert changes["latency_us"] == pytest.approx(0.2)
+    assert changes["rate"] == pytest.approx(-0.2)
+    assert _statuses(rows) == {"latency_us": "improvement", "rate": "regression"}
+
+
+def test_changes_within_the_threshold_are_ok():
+    baseline = _document(latency_us=100.0, rate=1000.0)
+    current = _document(latency_us=110.0, rate=900.0)
+    assert set(_statuses(benchmark.compare(baseline, current)).values()) == {"ok"}
+    assert set(_statuses(benchmark.compare(baseline, current, threshold=0.05)).values()) == {"regression"}
+
+
+def test_metrics_missing_from_the_baseline_or_at_zero_are_skipped():
+    baseline = _document(rate=0.0, latency_us=100.0)
+    current = _document(rate=500.0, latency_us=100.0, new_us=5.0)
+    assert [row["metric"] for row in benchmark.compare(baseline, current)] == ["latency_us"]
+
+
+def test_compare_exits_non_zero_on_a_regression(tmp_path, capsys):
+    paths = {}
+    for name, document in {"baseline": _document(latency_us=100.0, rate=1000.0),
+                           "same": _document(latency_us=105.0, rate=1000.0),
+                           "slower": _document(latency_us=150.0, rate=1000.0)}.items():
+        paths[name] = tmp_path / f"{name}.json"
+        paths[name].write_text(json.dumps(document))
+
+    assert benchmark.main(["compare", str(paths["baseline"]), str(paths["same"])]) == 0
+    assert benchmark.main(["compare", str(paths["baseline"]), str(paths["slower"])]) == 1
+    assert "1 regression(s) beyond 15%: latency_us" in capsys.readouterr().out
+    assert benchmark.main(["compare", "--threshold", "0.6", str(paths["baseline"]), str(paths["slower"])]) == 0
+
+
+def test_a_run_compares_against_itself_cleanly():
+    results = benchmark.run(["place_order"], quick=True)
+    assert results["quick"] is True
+    assert results["metrics"] and all(name.startswith("place_order.") for name in results["metrics"])
+    assert set(_statuses(benchmark.compare(results, results)).values()) == {"ok"}
+
+    with pytest.raises(ValueError):
+        benchmark.run(["nonexistent"])
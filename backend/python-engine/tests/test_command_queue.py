@@ -0,0 +1,119 @@
+import asyncio
+import functools
+
+import pytest
+
+import journal as journal_module
+from accounts import CommandClock, EngineManager
+from command_queue import EngineCommandQueue
+from journal import Journal, JournaledManager
+from models import OrderRequest, OrderSide, OrderType
+from trading_engine import TradingEngine
+
+
+def _manager(clock=None):
+    factory = functools.partial(TradingEngine, initial_balance=100000.0, leverage=10.0)
+    manager = EngineManager(factory, clock=clock)
+    manager.reset("a")
+    manager.update_market_price("BTC", 100.0)
+    return manager
+
+
+def _buy(quantity=1.0):
+    return OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY, quantity=quantity)
+
+
+def _run(queue, scenario):
+    async def main():
+        await queue.start()
+        try:
+            return await scenario()
+        finally:
+            await queue.stop()
+    return asyncio.run(main())
+
+
+def test_callers_read_their_own_writes():
+    queue = EngineCommandQueue(_manager())
+
+    async def scenario():
+        order = await queue.execute("a", "place_order", _buy())
+        return order, queue.snapshot("a")
+
+    order, snapshot = _run(queue, scenario)
+    assert order.status == "filled"
+    assert [p.symbol for p in snapshot.positions] == ["BTC"]
+    assert snapshot.trade_count == 1
+
+
+def test_a_failing_command_only_fails_its_caller():
+    queue = EngineCommandQueue(_manager())
+
+    async def scenario():
+        return await asyncio.gather(
+            queue.execute("a", "place_order", _buy()),
+            queue.execute("a", "cancel_order", "missing", "extra"),
+            queue.execute("a", "place_order", _buy(2.0)),
+            return_exceptions=True,
+        )
+
+    first, failed, last = _run(queue, scenario)
+    assert first.quantity == 1.0 and last.quantity == 2.0
+    assert isinstance(failed, TypeError)
+
+
+def test_the_writer_survives_a_failed_batch():
+    manager = _manager()
+    queue = EngineCommandQueue(manager)
+    collect = manager.collect
+    calls = []
+
+    def failing_once():
+        calls.append(None)
+        if len(calls) == 2:
+            raise RuntimeError("boom")
+        return collect()
+
+    manager.collect = failing_once
+
+    async def scenario():
+        with pytest.raises(RuntimeError, match="boom"):
+            await queue.execute("a", "place_order", _buy())
+        return await queue.execute("a", "place_order", _buy(3.0))
+
+    order = _run(queue, scenario)
+    assert order.quantity == 3.0
+    assert queue.depth == 0
+
+
+def test_a_journal_sync_failure_keeps_results_and_retries(tmp_path, monkeypatch):
+    clock = CommandClock()
+    journal = Journal(str(tmp_path))
+    queue = EngineCommandQueue(JournaledManager(_manager(clock), journal, clock), journal=journal)
+    fsync = journal_module.os.fsync
+    failures = [OSError("disk full")]
+
+    def flaky_fsync(fd):
+        if failures:
+            raise failures.pop()
+        fsync(fd)
+
+    monkeypatch.setattr(journal_module.os, "fsync", flaky_fsync)
+
+    async def scenario():
+        order = await queue.execute("a", "place_order", _buy())
+        durable_after_failure = queue.durable
+        await queue.execute("a", "place_order", _buy(2.0))
+        return order, durable_after_failure
+
+    order, durable_after_failure = _run(queue, scenario)
+    journal.close()
+    assert order.status == "filled"
+    assert not durable_after_failure
+    assert queue.durable
+
+    # Both orders made it to the journal once, without a torn record
+    _, records = Journal(str(tmp_path)).replay()
+    placed = [data[2][0].quantity for _, kind, _, data in records
+              if kind == "execute" and data[1] == "place_order"]
+    assert placed == [1.0, 2.0]
@@ -0,0 +1,132 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.engine.market_data.data_fetcher import DataFetcher, TTLCache
+
+
+class _Upstream:
+    """Mock quote server counting calls and concurrent requests"""
+
+    def __init__(self, delay=0.0, failures=None):
+        self.delay = delay
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, request):
+        symbol = request.url.path.rsplit("/", 1)[-1]
+        self.calls.append(symbol)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        failure = self.failures.get(symbol)
+        if failure:
+            self.failures[symbol] = failure[1:]
+            if isinstance(failure[0], int):
+                return httpx.Response(failure[0])
+            raise failure[0]
+        if request.url.path.startswith("/history/"):
+            return httpx.Response(200, json=[{"days": int(request.url.params["days"])}])
+        return httpx.Response(200, json={"price": 100.0 + len(self.calls)})
+
+
+def _fetcher(upstream, **options):
+    options.setdefault("backoff", 0.0)
+    return DataFetcher(base_url="http://upstream", transport=httpx.MockTransport(upstream), **options)
+
+
+def test_results_are_cached_until_they_expire():
+    upstream = _Upstream()
+    now = [0.0]
+
+    async def scenario():
+        async with _fetcher(upstream) as fetcher:
+            fetcher.caches["quote"] = TTLCache(ttl=1.0, clock=lambda: now[0])
+            first = await fetcher.fetch_price("BTC")
+            assert await fetcher.fetch_price("BTC") == first
+            assert await fetcher.fetch_historical_data("BTC", days=7) == [{"days": 7}]
+            assert await fetcher.fetch_historical_data("BTC", days=7) == [{"days": 7}]
+            now[0] = 1.5
+            assert await fetcher.fetch_price("BTC") != first
+
+    asyncio.run(scenario())
+    assert upstream.calls == ["BTC", "BTC", "BTC"]
+
+
+def test_concurrent_requests_for_a_key_share_one_call():
+    upstream = _Upstream(delay=0.01)
+
+    async def scenario():
+        async with _fetcher(upstream) as fetcher:
+            prices = await asyncio.gather(*(fetcher.fetch_price("BTC") for _ in range(20)))
+            assert len(set(prices)) == 1
+            assert fetcher._inflight == {}
+
+    asyncio.run(scenario())
+    assert upstream.calls == ["BTC"]
+
+
+def test_each_endpoint_has_its_own_concurrency_limit():
+    upstream = _Upstream(delay=0.01)
+    symbols = [f"S{i}" for i in range(10)]
+
+    async def scenario():
+        async with _fetcher(upstream, endpoint_limits={"quote": 3}) as fetcher:
+            return await fetcher.fetch_prices(symbols)
+
+    assert sorted(asyncio.run(scenario())) == sorted(symbols)
+    assert upstream.peak == 3
+
+
+def test_transient_failures_are_retried():
+    upstream = _Upstream(failures={"BTC": [503, httpx.ConnectError("refused")], "ETH": [404]})
+
+    async def scenario():
+        async with _fetcher(upstream, retries=2) as fetcher:
+            assert await fetcher.fetch_price("BTC") > 0
+            with pytest.raises(httpx.HTTPStatusError):
+                await fetcher.fetch_price("ETH")
+            return fetcher.upstream_calls
+
+    assert asyncio.run(scenario()) == 4
+    assert upstream.calls == ["BTC", "BTC", "BTC", "ETH"]
+
+
+def test_retries_give_up_after_the_last_attempt():
+    upstream = _Upstream(failures={"BTC": [503] * 3, "ETH": [500]})
+
+    async def scenario():
+        async with _fetcher(upstream, retries=2) as fetcher:
+            with pytest.raises(httpx.HTTPStatusError):
+                await fetcher.fetch_price("BTC")
+            # One symbol failing does not fail the batch
+            return await fetcher.fetch_prices(["BTC", "ETH"])
+
+    assert list(asyncio.run(scenario())) == ["BTC", "ETH"]
+    assert upstream.calls.count("BTC") == 4
+
+
+def test_a_request_backing_off_frees_its_slot():
+    upstream = _Upstream(failures={"SLOW": [503]})
+    finished = []
+
+    async def fetch(fetcher, symbol):
+        await fetcher.fetch_price(symbol)
+        finished.append(symbol)
+
+    async def scenario():
+        async with _fetcher(upstream, endpoint_limits={"quote": 1}, backoff=0.05) as fetcher:
+            slow = asyncio.ensure_future(fetch(fetcher, "SLOW"))
+            await asyncio.sleep(0.01)
+            await fetch(fetcher, "FAST")
+            await slow
+
+    asyncio.run(scenario())
+    assert finished == ["FAST", "SLOW"]
+    assert upstream.calls == ["SLOW", "FAST", "SLOW"]
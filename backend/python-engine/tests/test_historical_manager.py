@@ -0,0 +1,63 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from src.engine.market_data.historical_manager import HistoricalManager
+
+T0 = datetime(2024, 1, 1)
+
+
+def _times(n, start=0):
+    return [T0 + timedelta(seconds=start + i) for i in range(n)]
+
+
+def test_ranges_span_chunks_and_survive_a_reopen(tmp_path):
+    history = HistoricalManager(str(tmp_path), chunk_size=4)
+    history.append("BTC", _times(5), np.arange(5.0), np.ones(5))
+    early = history.get_range("BTC", end_date=T0 + timedelta(seconds=3))
+    history.append("BTC", _times(6, start=5), np.arange(5.0, 11.0))
+
+    assert early["price"].tolist() == [0.0, 1.0, 2.0]
+    middle = history.get_range("BTC", T0 + timedelta(seconds=2), T0 + timedelta(seconds=9))
+    assert middle["price"].tolist() == [2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+    assert middle["timestamp"][0] == np.datetime64(T0 + timedelta(seconds=2), "us")
+    assert os.path.getsize(tmp_path / "BTC" / "price.bin") == 12 * 8
+    history.flush()
+
+    reopened = HistoricalManager(str(tmp_path), chunk_size=4)
+    columns = reopened.get_range("BTC")
+    assert columns["price"].tolist() == list(np.arange(11.0))
+    assert columns["volume"].tolist() == [1.0] * 5 + [0.0] * 6
+    reopened.append("BTC", _times(1, start=11), [11.0])
+    assert len(reopened.get_range("BTC", start_date=T0 + timedelta(seconds=10))["price"]) == 2
+
+
+def test_batches_are_sorted_but_history_is_append_only(tmp_path):
+    history = HistoricalManager(str(tmp_path))
+    history.append("ETH", list(reversed(_times(3))), [3.0, 2.0, 1.0])
+    assert history.get_range("ETH")["price"].tolist() == [1.0, 2.0, 3.0]
+    with pytest.raises(ValueError):
+        history.append("ETH", _times(1), [0.5])
+    with pytest.raises(ValueError):
+        history.append("ETH", _times(2, start=10), [1.0])
+
+
+def test_symbols_bars_and_records(tmp_path):
+    history = HistoricalManager(str(tmp_path))
+    history.store_data("BTC/USD", [{"timestamp": t, "price": 100.0 + i} for i, t in enumerate(_times(3))])
+    history.store_data("BTC/USD", {"timestamp": _times(2, start=5), "price": [200.0, 210.0]})
+    history.append_bars("BTC/USD", "1m", {
+        "timestamp": [T0], "open": [1.0], "high": [2.0], "low": [0.5], "close": [1.5], "volume": [3.0], "vwap": [1.2],
+    })
+
+    assert history.symbols() == ["BTC/USD"]
+    assert history.get_data("BTC/USD") == [
+        {"timestamp": T0 + timedelta(seconds=5), "price": 200.0, "volume": 0.0},
+        {"timestamp": T0 + timedelta(seconds=6), "price": 210.0, "volume": 0.0},
+    ]
+    assert history.calculate_returns("BTC/USD").tolist() == pytest.approx([0.05])
+    assert history.get_bars("BTC/USD", "1m")["close"].tolist() == [1.5]
+    assert len(history.get_bars("BTC/USD", "5m")["close"]) == 0
+    assert len(history.get_range("DOGE")["price"]) == 0
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from src.engine.utils import indicators
+
+
+@pytest.fixture(scope="module")
+def prices():
+    rng = np.random.default_rng(7)
+    closes = 10000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, 2000)))
+    # A flat stretch exercises the zero-loss and zero-variance cases
+    closes[500:540] = closes[499]
+    spread = closes * rng.uniform(0.0, 0.02, len(closes))
+    return closes + spread, closes - spread, closes
+
+
+def _streamed(indicator, *series):
+    return np.array([indicator.update(*values) for values in zip(*series)], dtype=np.float64)
+
+
+@pytest.mark.parametrize("indicator, batch", [
+    (lambda: indicators.SMA(20), lambda x: indicators.sma(x, 20)),
+    (lambda: indicators.SMA(1), lambda x: indicators.sma(x, 1)),
+    (lambda: indicators.EMA(span=12), lambda x: indicators.ema(x, span=12)),
+    (lambda: indicators.EMA(alpha=1.0), lambda x: indicators.ema(x, alpha=1.0)),
+    (lambda: indicators.RollingVariance(30), lambda x: indicators.rolling_var(x, 30)),
+    (lambda: indicators.RollingVariance(30, ddof=0), lambda x: indicators.rolling_var(x, 30, ddof=0)),
+    (lambda: indicators.RollingMax(25), lambda x: indicators.rolling_max(x, 25)),
+    (lambda: indicators.RollingMin(25), lambda x: indicators.rolling_min(x, 25)),
+    (lambda: indicators.RSI(14), lambda x: indicators.rsi(x, 14)),
+])
+def test_streaming_matches_batch_on_closes(prices, indicator, batch):
+    closes = prices[2]
+    np.testing.assert_allclose(_streamed(indicator(), closes), batch(closes), rtol=1e-9, atol=1e-6)
+
+
+def test_streaming_atr_matches_batch(prices):
+    high, low, close = prices
+    expected = indicators.atr(high, low, close, period=14)
+    np.testing.assert_allclose(_streamed(indicators.ATR(14), high, low, close), expected, rtol=1e-9)
+
+
+def test_streaming_bollinger_matches_batch(prices):
+    closes = prices[2]
+    bands = indicators.BollingerBands(window=20, k=2.0)
+    streamed = np.array([bands.update(x) for x in closes])
+    middle, upper, lower = indicators.bollinger(closes, window=20, k=2.0)
+    np.testing.assert_allclose(streamed[:, 0], middle, rtol=1e-9)
+    # The streaming variance carries rounding of order eps * price^2, so
+    # near zero variance its square root is only good to ~sqrt(eps) * price
+    np.testing.assert_allclose(streamed[:, 1], upper, rtol=1e-6)
+    np.testing.assert_allclose(streamed[:, 2], lower, rtol=1e-6)
+
+
+def test_warm_up_is_nan_until_ready():
+    sma = indicators.SMA(3)
+    assert [np.isnan(sma.update(x)) for x in (1.0, 2.0, 3.0)] == [True, True, False]
+    assert sma.ready
+    assert np.isnan(indicators.rsi([1.0, 2.0], period=14)).all()
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from ledger import TradeLedger
+from models import OrderSide
+
+T0 = datetime(2024, 1, 1)
+SYMBOLS = ("BTC", "ETH", "SOL")
+
+
+def _rows(n, symbols=SYMBOLS):
+    return [(symbols[i % len(symbols)], OrderSide.BUY if i % 2 else OrderSide.SELL, 1.0 + i, 100.0 + i,
+             T0 + timedelta(seconds=i), 0.1 * i, float(i - 5)) for i in range(n)]
+
+
+def _ledger(n, capacity=4, symbols=SYMBOLS):
+    ledger = TradeLedger(capacity=capacity)
+    for row in _rows(n, symbols):
+        ledger.append(*row)
+    return ledger
+
+
+def _seq(trade_id):
+    return int(trade_id.split("_")[1])
+
+
+def test_rows_round_trip_through_growth():
+    ledger = _ledger(50)
+    assert len(ledger) == 50 and ledger.capacity >= 50
+    trades = ledger.to_trades()
+    assert [(t.symbol, t.side, t.quantity, t.price, t.timestamp, t.commission, t.realized_pnl)
+            for t in trades] == _rows(50)
+    assert [_seq(t.id) for t in trades] == list(range(1, 51))
+    with pytest.raises(ValueError):
+        ledger.column("price")[0] = 0.0
+
+
+def test_a_head_view_survives_later_appends():
+    ledger = _ledger(3)
+    head = ledger.head(2)
+    for row in _rows(20)[3:]:
+        ledger.append(*row)
+    assert [t.price for t in head] == [100.0, 101.0]
+
+
+def test_slices_keep_their_place_in_the_history():
+    ledger = _ledger(30)
+    tail = ledger.slice(12)
+    assert (tail.offset, len(tail)) == (12, 18)
+    assert tail.to_trades() == ledger.to_trades(12)
+
+    tail_of_tail = tail.slice(10)
+    assert tail_of_tail.offset == 22
+    assert [_seq(t.id) for t in tail_of_tail] == list(range(23, 31))
+
+    empty = tail.slice(100)
+    assert (empty.offset, len(empty)) == (30, 0)
+
+
+def test_extending_a_slice_translates_symbols_and_continues_ids():
+    ledger = _ledger(10)
+    mirror = ledger.slice(6)
+    # The new rows' own ledger codes ETH and SOL as 0 and 1
+    new_rows = TradeLedger()
+    for row in _rows(12)[10:]:
+        ledger.append(*row)
+        new_rows.append(*row)
+    assert new_rows.symbols == ["ETH", "SOL"]
+
+    mirror.extend(new_rows)
+    assert mirror.to_trades() == ledger.to_trades(6)
+
+
+def test_select_counts_cursors_from_the_full_history():
+    tail = _ledger(30).slice(10)
+    rows = tail.select(cursor=15)
+    assert _seq(tail.records(rows, ["id"])[0]["id"]) == 16
+
+    btc = tail.select(symbols={"BTC", "DOGE"}, start=T0 + timedelta(seconds=20), end=T0 + timedelta(seconds=28))
+    records = tail.records(btc, ["symbol", "id", "timestamp"])
+    assert [_seq(r["id"]) for r in records] == [22, 25, 28]
+    assert {tuple(r) for r in records} == {("id", "symbol", "timestamp")}
+    assert tail.records(np.arange(2)) == [t.model_dump(mode="python") | {"side": t.side.value}
+                                          for t in tail.to_trades(0, 2)]
+    assert len(tail.select(cursor=0)) == 20
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+
+from liquidation import LiquidationPlanner, margin_level
+from models import LiquidationPolicy, OrderRequest, OrderSide, OrderType, Position
+from trading_engine import TradingEngine
+
+
+def _position(symbol, quantity, price, pnl):
+    return Position(symbol=symbol, quantity=quantity, entry_price=price, current_price=price,
+                    side=OrderSide.BUY, unrealized_pnl=pnl, timestamp=datetime(2024, 1, 1))
+
+
+POSITIONS = [
+    _position("A", 10.0, 100.0, -50.0),   # 1000 notional
+    _position("B", 1.0, 3000.0, -10.0),   # 3000 notional
+    _position("C", 20.0, 100.0, -200.0),  # 2000 notional
+]
+
+
+def _plan(policy, equity, positions=POSITIONS):
+    notional = sum(p.quantity * p.current_price for p in positions)
+    return LiquidationPlanner(policy, target_level=50.0).plan(positions, equity, notional, 10.0, 0.0)
+
+
+def test_margin_level_is_100_without_margin():
+    assert margin_level(1000.0, 0.0, 10.0) == 100.0
+    assert margin_level(300.0, 6000.0, 10.0) == 50.0
+
+
+def test_nothing_is_closed_above_the_call_level():
+    assert _plan(LiquidationPolicy.WORST_PNL, equity=400.0) == []
+
+
+def test_worst_pnl_closes_the_biggest_losers_first():
+    actions = _plan(LiquidationPolicy.WORST_PNL, equity=180.0)
+    assert [a.symbol for a in actions] == ["C", "A"]
+    assert all(a.closed for a in actions)
+
+
+def test_largest_margin_closes_the_largest_positions_first():
+    actions = _plan(LiquidationPolicy.LARGEST_MARGIN, equity=180.0)
+    assert [a.symbol for a in actions] == ["B"]
+    assert actions[0].margin_released == pytest.approx(300.0)
+
+
+def test_ties_keep_the_positions_order():
+    tied = [_position(s, 10.0, 100.0, -10.0) for s in "XYZ"]
+    actions = _plan(LiquidationPolicy.WORST_PNL, equity=80.0, positions=tied)
+    assert [a.symbol for a in actions] == ["X", "Y"]
+
+
+def test_partial_reduces_only_the_last_position_as_far_as_needed():
+    actions = _plan(LiquidationPolicy.PARTIAL, equity=250.0)
+    assert [a.symbol for a in actions] == ["C"]
+    action = actions[0]
+    assert not action.closed
+    assert 0 < action.quantity < 20.0
+    notional = 6000.0 - action.quantity * 100.0
+    assert margin_level(250.0, notional, 10.0) > 50.0
+    # Barely above the target, not a full close
+    assert margin_level(250.0, notional + 1.0, 10.0) < 50.0
+
+
+def test_plan_stops_once_the_level_is_restored():
+    for policy in LiquidationPolicy:
+        actions = _plan(policy, equity=100.0)
+        notional = 6000.0 - sum(a.quantity * a.price for a in actions)
+        assert margin_level(100.0, notional, 10.0) > 50.0
+        assert margin_level(100.0, notional + actions[-1].quantity * actions[-1].price, 10.0) <= 50.0
+
+
+def test_engine_liquidates_the_worst_position_on_a_margin_call():
+    engine = TradingEngine(initial_balance=1000.0, leverage=10.0, liquidation_policy="worst_pnl")
+    engine.commission_rate = 0.0
+    engine.update_market_prices([("BTC", 100.0, datetime(2024, 1, 1)), ("ETH", 100.0, datetime(2024, 1, 1))])
+    for symbol in ("BTC", "ETH"):
+        engine.place_order(OrderRequest(symbol=symbol, type=OrderType.MARKET, side=OrderSide.BUY, quantity=45.0))
+
+    engine.update_market_price("ETH", 95.0)
+    engine.update_market_price("BTC", 88.0)
+
+    report = engine.liquidations[-1]
+    assert [a.symbol for a in report.actions] == ["BTC"]
+    assert report.restored
+    assert engine.get_position("BTC") is None
+    assert engine.get_position("ETH") is not None
+    assert engine.portfolio.margin_level > 50.0
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import MetricsMiddleware, Registry
+
+
+def test_timers_sample_but_count_every_call():
+    registry = Registry(sample_every=3)
+    timer = registry.timer("engine_stage", "engine stages", stage="fill")
+    for _ in range(7):
+        timer.record(1500)
+    assert registry.timer("engine_stage", stage="fill") is timer
+    registry.counter("orders_total", "Orders placed", side="buy").inc(2)
+    registry.gauge("queue_depth", "Commands waiting", lambda: 4)
+
+    lines = registry.render().splitlines()
+    assert 'engine_stage_calls_total{stage="fill"} 7' in lines
+    # Calls 1, 4 and 7 are timed, all in the 2us bucket
+    assert 'engine_stage_seconds_bucket{stage="fill",le="1e-06"} 0' in lines
+    assert 'engine_stage_seconds_bucket{stage="fill",le="2e-06"} 3' in lines
+    assert 'engine_stage_seconds_bucket{stage="fill",le="+Inf"} 3' in lines
+    assert 'engine_stage_seconds_sum{stage="fill"} 0.000004500' in lines
+    assert "# TYPE engine_stage_seconds histogram" in lines
+    assert 'orders_total{side="buy"} 2' in lines
+    assert lines[-3:] == ["# HELP queue_depth Commands waiting", "# TYPE queue_depth gauge", "queue_depth 4"]
+
+
+def _routed_app(registry):
+    app = FastAPI()
+    router = APIRouter()
+
+    @router.get("/orders/{order_id}")
+    async def get_order(order_id: str):
+        return order_id
+
+    app.include_router(router)
+    app.include_router(router, prefix="/accounts/{account_id}")
+
+    admin = FastAPI()
+
+    @admin.get("/users/{name}")
+    async def get_user(name: str):
+        return name
+
+    app.mount("/admin", admin)
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    return app
+
+
+def test_requests_are_counted_per_route_template():
+    registry = Registry()
+    client = TestClient(_routed_app(registry))
+    client.get("/orders/1")
+    client.get("/orders/2")
+    # Parameter values equal to other segments must not be mistaken for them
+    client.get("/accounts/orders/orders/orders")
+    client.get("/admin/users/admin")
+    client.post("/orders/3")
+    client.get("/missing")
+
+    counted = {}
+    for counter in registry._counters["http_responses_total"].values():
+        route = dict(counter.labels)["route"]
+        counted[route] = counted.get(route, 0) + counter.value
+    assert counted == {
+        "/orders/{order_id}": 3,
+        "/accounts/{account_id}/orders/{order_id}": 1,
+        "/admin/users/{name}": 1,
+        "unmatched": 1,
+    }
+    statuses = {(dict(c.labels)["method"], dict(c.labels)["status"]) for c in registry._counters["http_responses_total"].values()}
+    assert ("POST", "405") in statuses
+
+
+def test_the_api_serves_its_metrics(client):
+    client.get("/accounts/main/orders")
+    body = client.get("/metrics").text
+    assert 'route="/accounts/{account_id}/orders"' in body
+    assert "# TYPE engine_command_queue_depth gauge" in body
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from models import Order, OrderRequest, OrderSide, OrderStatus, OrderType
+from order_book import OrderBook
+from trading_engine import TradingEngine
+
+
+def _limit(order_id, side, price, symbol="BTC"):
+    return Order(id=order_id, symbol=symbol, type=OrderType.LIMIT, side=side, quantity=1.0,
+                 price=price, timestamp=datetime(2024, 1, 1))
+
+
+def test_crossed_orders_pop_best_price_then_arrival():
+    book = OrderBook()
+    book.add(_limit("low", OrderSide.BUY, 95.0))
+    book.add(_limit("high", OrderSide.BUY, 99.0))
+    book.add(_limit("high-later", OrderSide.BUY, 99.0))
+    book.add(_limit("ask", OrderSide.SELL, 105.0))
+
+    assert [o.id for o in book.pop_crossed("BTC", 96.0)] == ["high", "high-later"]
+    assert book.best_bid("BTC") == 95.0
+    assert book.best_ask("BTC") == 105.0
+    assert [o.id for o in book.pop_crossed("BTC", 105.0)] == ["ask"]
+    assert book.symbols() == {"BTC"}
+
+
+def test_cancelled_orders_never_fill():
+    book = OrderBook()
+    book.add(_limit("a", OrderSide.BUY, 99.0))
+    book.add(_limit("b", OrderSide.BUY, 98.0))
+
+    assert book.cancel("a").status == OrderStatus.CANCELLED
+    assert book.cancel("a") is None
+    assert book.best_bid("BTC") == 98.0
+    assert [o.id for o in book.pop_crossed("BTC", 90.0)] == ["b"]
+    assert book.symbols() == set()
+
+
+def test_duplicate_ids_are_refused():
+    book = OrderBook()
+    book.add(_limit("a", OrderSide.BUY, 99.0))
+    with pytest.raises(ValueError):
+        book.add(_limit("a", OrderSide.SELL, 101.0))
+
+
+def test_heaps_stay_bounded_under_cancel_churn():
+    book = OrderBook()
+    book.add(_limit("resting", OrderSide.SELL, 200.0))
+    for i in range(10000):
+        book.add(_limit(f"o{i}", OrderSide.BUY, 100.0 + i % 5))
+        book.cancel(f"o{i}")
+
+    assert len(book._books["BTC"]) <= 4
+    assert book.best_ask("BTC") == 200.0
+    assert book.pop_crossed("BTC", 90.0) == []
+
+
+def test_orders_placed_at_the_same_instant_get_distinct_ids():
+    instant = datetime(2024, 1, 1)
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0, clock=lambda: instant)
+    request = OrderRequest(symbol="BTC", type=OrderType.LIMIT, side=OrderSide.BUY, quantity=1.0, price=90.0)
+
+    ids = [engine.place_order(request).id for _ in range(3)]
+    assert len(set(ids)) == 3
+    assert len(engine.get_orders()) == 3
@@ -0,0 +1,133 @@
+from datetime import datetime
+
+import pytest
+
+from src.engine.trading_engine.order_matcher import OrderMatcher, trade_ticks
+
+
+def _order(side, quantity, price=None, order_id=None, symbol="BTC"):
+    return {"id": order_id, "symbol": symbol, "type": side, "quantity": quantity, "price": price}
+
+
+@pytest.fixture
+def matcher():
+    return OrderMatcher(clock=lambda: datetime(2024, 1, 1))
+
+
+def test_better_prices_trade_first(matcher):
+    matcher.add_order(_order("sell", 1.0, 102.0, "worse"))
+    matcher.add_order(_order("sell", 1.0, 101.0, "better"))
+
+    trades = matcher.add_order(_order("buy", 2.0, 102.0, "taker"))
+    assert [(t["sell_order_id"], t["price"]) for t in trades] == [("better", 101.0), ("worse", 102.0)]
+
+
+def test_older_orders_trade_first_at_a_price(matcher):
+    for order_id in ("first", "second", "third"):
+        matcher.add_order(_order("buy", 1.0, 100.0, order_id))
+
+    trades = matcher.add_order(_order("sell", 2.5, 100.0))
+    assert [(t["buy_order_id"], t["quantity"]) for t in trades] == [("first", 1.0), ("second", 1.0), ("third", 0.5)]
+    assert matcher.orders["third"]["remaining"] == 0.5
+    assert matcher.orders["third"]["status"] == "partially_filled"
+
+
+def test_trades_happen_at_the_resting_price(matcher):
+    matcher.add_order(_order("sell", 1.0, 100.0))
+    trades = matcher.add_order(_order("buy", 1.0, 105.0))
+    assert trades[0]["price"] == 100.0
+    assert trades[0]["aggressor"] == "buy"
+
+
+def test_limit_remainder_rests_and_market_remainder_is_cancelled(matcher):
+    matcher.add_order(_order("sell", 1.0, 100.0))
+    limit = _order("buy", 3.0, 100.0, "limit")
+    matcher.add_order(limit)
+    assert limit["status"] == "partially_filled"
+    assert matcher.best_bid("BTC") == 100.0
+
+    market = _order("sell", 5.0)
+    trades = matcher.add_order(market)
+    assert sum(t["quantity"] for t in trades) == 2.0
+    assert market["status"] == "partially_filled"
+    assert "limit" not in matcher.orders
+    assert matcher.best_bid("BTC") is None
+
+
+def test_orders_that_do_not_cross_rest(matcher):
+    matcher.add_order(_order("buy", 1.0, 99.0))
+    assert matcher.add_order(_order("sell", 1.0, 100.0)) == []
+    assert (matcher.best_bid("BTC"), matcher.best_ask("BTC")) == (99.0, 100.0)
+    assert matcher.depth("BTC") == {"bids": [(99.0, 1.0)], "asks": [(100.0, 1.0)]}
+
+
+def test_cancelled_orders_are_skipped(matcher):
+    matcher.add_order(_order("sell", 1.0, 100.0, "cancelled"))
+    matcher.add_order(_order("sell", 1.0, 100.0, "live"))
+    assert matcher.cancel_order("cancelled")["status"] == "cancelled"
+    assert matcher.cancel_order("cancelled") is None
+
+    trades = matcher.add_order(_order("buy", 1.0, 100.0))
+    assert [t["sell_order_id"] for t in trades] == ["live"]
+
+
+def test_reducing_quantity_keeps_priority(matcher):
+    matcher.add_order(_order("sell", 2.0, 100.0, "a"))
+    matcher.add_order(_order("sell", 1.0, 100.0, "b"))
+    matcher.replace_order("a", quantity=1.0)
+
+    trades = matcher.add_order(_order("buy", 1.0, 100.0))
+    assert [t["sell_order_id"] for t in trades] == ["a"]
+
+
+def test_other_changes_lose_priority(matcher):
+    matcher.add_order(_order("sell", 1.0, 100.0, "a"))
+    matcher.add_order(_order("sell", 1.0, 100.0, "b"))
+    matcher.replace_order("a", quantity=2.0)
+
+    trades = matcher.add_order(_order("buy", 1.0, 100.0))
+    assert [t["sell_order_id"] for t in trades] == ["b"]
+
+
+def test_books_are_per_symbol(matcher):
+    matcher.add_order(_order("sell", 1.0, 100.0, symbol="ETH"))
+    assert matcher.add_order(_order("buy", 1.0, 100.0, symbol="BTC")) == []
+
+
+def test_invalid_orders_are_refused(matcher):
+    with pytest.raises(ValueError):
+        matcher.add_order(_order("hold", 1.0, 100.0))
+    with pytest.raises(ValueError):
+        matcher.add_order(_order("buy", 0.0, 100.0))
+    matcher.add_order(_order("buy", 1.0, 90.0, "a"))
+    with pytest.raises(ValueError):
+        matcher.add_order(_order("buy", 1.0, 90.0, "a"))
+
+
+def test_listeners_and_ticks(matcher):
+    seen = []
+    matcher.add_listener(lambda event_type, symbol, trade: seen.append((event_type, symbol, trade["id"])))
+    matcher.add_order(_order("sell", 1.0, 100.0))
+    trades = matcher.add_order(_order("buy", 1.0))
+
+    assert seen == [("trade", "BTC", trades[0]["id"])]
+    assert trade_ticks(trades) == [("BTC", 100.0, datetime(2024, 1, 1))]
+
+
+def test_cancel_churn_keeps_the_book_bounded(matcher):
+    matcher.add_order(_order("sell", 1.0, 200.0, "resting"))
+    matcher.add_order(_order("buy", 1.0, 90.0, "deep"))
+    for i in range(10000):
+        # Behind the best bid, so the lazy skip never reaches them
+        matcher.add_order(_order("buy", 1.0, 80.0 - i % 50, f"o{i}"))
+        if i % 3:
+            matcher.replace_order(f"o{i}", price=70.0 - i % 50)
+        matcher.cancel_order(f"o{i}")
+
+    bids = matcher.books["BTC"].bids
+    assert len(bids) <= 4
+    assert len(bids.levels) <= 4
+    assert len(bids._heap) <= 4
+    assert matcher.depth("BTC") == {"bids": [(90.0, 1.0)], "asks": [(200.0, 1.0)]}
+    trades = matcher.add_order(_order("sell", 2.0, 50.0))
+    assert [t["buy_order_id"] for t in trades] == ["deep"]
@@ -0,0 +1,143 @@
+import asyncio
+import functools
+import pickle
+
+import pytest
+
+import main
+from accounts import EngineManager
+from command_queue import EngineCommandQueue
+from models import OrderRequest, OrderSide, OrderType
+from pagination import export_trades, page_trades
+from persistence import TradeStore, open_trade_store
+from trading_engine import TradingEngine
+
+KEEP = 5
+
+
+def _seqs(items):
+    return [int(item["id"].split("_")[1]) for item in items]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TradeStore(f"sqlite:///{tmp_path / 'trades.db'}")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def trimmed(store):
+    """An account with 90 trades in BTC and ETH, of which all but the last few were trimmed"""
+    factory = functools.partial(TradingEngine, initial_balance=1000000.0, leverage=10.0)
+    manager = EngineManager(factory)
+    manager.reset("a")
+    manager.update_market_price("BTC", 100.0)
+    manager.update_market_price("ETH", 50.0)
+    queue = EngineCommandQueue(manager, store=store, trade_memory_limit=KEEP)
+
+    async def scenario():
+        await queue.start()
+        await queue.execute("a", "place_order", OrderRequest(
+            symbol="BTC", type=OrderType.LIMIT, side=OrderSide.BUY, quantity=1.0, price=10.0))
+        for i in range(30):
+            symbol = "BTC" if i % 2 else "ETH"
+            for side in (OrderSide.BUY, OrderSide.SELL):
+                await queue.execute("a", "place_order", OrderRequest(
+                    symbol=symbol, type=OrderType.MARKET, side=side, quantity=1.0))
+            # Let the store catch up so the next batch may trim
+            await asyncio.to_thread(store.flush)
+        await queue.submit(lambda manager: manager.update_market_price("BTC", 101.0))
+        await queue.stop()
+        return queue.snapshot("a")
+
+    snapshot = asyncio.run(scenario())
+    store.flush()
+    return manager, snapshot
+
+
+def test_trades_are_stored_and_counted_as_persisted(store, trimmed):
+    _, snapshot = trimmed
+    total = snapshot.ledger.offset + len(snapshot.ledger)
+    assert total == 90
+    assert store.persisted("a", snapshot.opened_at) == total
+    assert [o["active"] for o in store.orders("a")] == [1]
+
+
+def test_engine_and_snapshots_drop_persisted_trades(trimmed):
+    manager, snapshot = trimmed
+    engine = manager.engine("a")
+    assert 0 < snapshot.ledger.offset
+    assert KEEP <= len(snapshot.ledger) < 3 * KEEP
+    assert engine.ledger.offset == snapshot.ledger.offset
+    assert len(engine.ledger) == len(snapshot.ledger)
+    assert engine.get_portfolio_summary()["total_trades"] == 90
+
+    restored = pickle.loads(manager.export_state()["engines"]["a"])
+    assert restored.ledger.offset == engine.ledger.offset
+    with pytest.raises(ValueError):
+        engine.calculate_risk_metrics(verify=True)
+
+
+def test_pages_continue_from_the_archive_into_memory(store, trimmed):
+    _, snapshot = trimmed
+    archive = functools.partial(store.page_trades, "a", snapshot.opened_at)
+    items, cursor, pages = [], 0, 0
+    while cursor is not None:
+        page = page_trades(snapshot.ledger, cursor, 7, archive=archive)
+        items.extend(page.items)
+        cursor = page.next_cursor
+        pages += 1
+    assert _seqs(items) == list(range(1, 91))
+    assert pages == 13
+
+    btc = page_trades(snapshot.ledger, 0, None, symbols={"BTC"}, archive=archive, fields=["symbol"])
+    assert [item["symbol"] for item in btc.items] == ["BTC"] * 45
+    assert len(list(export_trades(snapshot.ledger, archive=archive))) == 90
+
+
+def test_verification_recomputes_over_the_stored_history(store, trimmed, monkeypatch):
+    _, snapshot = trimmed
+    monkeypatch.setattr(main, "trade_store", store)
+    metrics = main._verified_metrics(snapshot)
+    assert metrics.total_return == pytest.approx(snapshot.risk.metrics().total_return)
+    assert main._full_performance(snapshot)["trading_stats"]["total_trades"] == 90
+
+    monkeypatch.setattr(main, "trade_store", None)
+    with pytest.raises(RuntimeError):
+        main._verified_metrics(snapshot)
+
+
+def test_a_reopened_store_knows_what_is_persisted(tmp_path, store, trimmed):
+    _, snapshot = trimmed
+    store.close()
+    reopened = open_trade_store(f"sqlite:///{tmp_path / 'trades.db'}")
+    try:
+        assert reopened.persisted("a", snapshot.opened_at) == 90
+        assert len(reopened.load_ledger("a", snapshot.opened_at, 90)) == 90
+    finally:
+        reopened.close()
+
+
+def test_a_restored_trimmed_engine_publishes_its_tail(trimmed):
+    manager, snapshot = trimmed
+    restored = EngineManager(manager.engine_factory)
+    restored.import_state(manager.export_state())
+    queue = EngineCommandQueue(restored)
+
+    async def scenario():
+        await queue.start()
+        await queue.execute("a", "place_order", OrderRequest(
+            symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY, quantity=1.0))
+        await queue.stop()
+        return queue.snapshot("a")
+
+    republished = asyncio.run(scenario())
+    assert republished.ledger.offset == snapshot.ledger.offset
+    assert _seqs(republished.ledger.records(republished.ledger.select())) == list(
+        range(snapshot.ledger.offset + 1, 92))
+
+
+def test_unsupported_urls_run_without_a_store():
+    assert open_trade_store("") is None
+    assert open_trade_store("postgresql://user@localhost/trading") is None
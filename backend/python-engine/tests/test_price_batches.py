@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import OrderRequest, OrderSide, OrderStatus, OrderType
+from trading_engine import TradingEngine
+
+T0 = datetime(2024, 1, 1)
+
+
+def _engine():
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0)
+    engine.update_market_price("BTC", 100.0)
+    engine.update_market_price("ETH", 50.0)
+    engine.place_order(OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY, quantity=2.0,
+                                    stop_loss=92.0))
+    engine.place_order(OrderRequest(symbol="ETH", type=OrderType.LIMIT, side=OrderSide.BUY, quantity=3.0, price=45.0))
+    return engine
+
+
+def _ticks():
+    prices = [("BTC", 101.0), ("ETH", 47.0), ("BTC", 96.0), ("ETH", 44.0), ("ETH", 48.0), ("BTC", 91.0), ("BTC", 93.0)]
+    return [(symbol, price, T0 + timedelta(seconds=i)) for i, (symbol, price) in enumerate(prices)]
+
+
+def _state(engine):
+    return (
+        engine.portfolio.balance,
+        engine.portfolio.equity,
+        engine.portfolio.used_margin,
+        dict(engine.market_prices),
+        [(p.symbol, p.quantity, p.entry_price) for p in engine.get_positions()],
+        [(t.symbol, t.side, t.quantity, t.price) for t in engine.get_trades()],
+    )
+
+
+def test_a_batch_matches_the_same_ticks_one_by_one():
+    one_by_one = _engine()
+    for symbol, price, _ in _ticks():
+        one_by_one.update_market_price(symbol, price)
+
+    batched = _engine()
+    # Shuffled on the wire; applied in timestamp order
+    assert batched.update_market_prices(list(reversed(_ticks()))) == 7
+    assert _state(batched) == _state(one_by_one)
+
+    # The ETH limit filled at 44 and the BTC stop loss fired at 91
+    assert [(t.symbol, t.price) for t in batched.get_trades()][-2:] == [("ETH", 44.0), ("BTC", 91.0)]
+    assert batched.get_position("BTC") is None
+    assert batched.market_prices == {"BTC": 93.0, "ETH": 48.0}
+
+
+def test_equity_is_settled_once_per_batch():
+    engine = _engine()
+    events = []
+    engine.add_listener(lambda event_type, symbol, payload: events.append((event_type, symbol)))
+    engine.update_market_prices([("ETH", 49.0 + i * 0.1, T0 + timedelta(seconds=i)) for i in range(5)])
+
+    assert events.count(("price", "ETH")) == 1
+    assert events.count(("portfolio", None)) == 1
+    assert engine.get_orders()[0].status == OrderStatus.PENDING
+
+
+def test_the_api_applies_a_batch(client):
+    ticks = [{"symbol": "BTC", "price": 100.0 + i, "timestamp": (T0 + timedelta(seconds=i)).isoformat(), "volume": 1.0}
+             for i in range(3)]
+    response = client.post("/market-prices", json={"ticks": list(reversed(ticks))})
+    assert response.json()["applied"] == 3
+
+    client.post("/orders", json={"symbol": "BTC", "type": "market", "side": "buy", "quantity": 1.0})
+    assert client.get("/positions").json()[0]["entry_price"] == pytest.approx(102.0)
+    assert client.post("/market-prices", json={"ticks": [{"symbol": "BTC"}]}).status_code == 422
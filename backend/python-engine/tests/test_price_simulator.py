@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from src.engine.market_data.price_simulator import PriceSimulator
+
+
+def test_zero_volatility_follows_the_drift():
+    simulator = PriceSimulator(initial_price=100.0, volatility=0.0, drift=0.01, symbols=["BTC", "ETH"], seed=1)
+    paths = simulator.simulate_paths(5, paths=3)
+    expected = 100.0 * np.exp(0.01 * np.arange(1, 6))
+    assert np.allclose(paths, expected[None, :, None])
+
+
+def test_perfectly_correlated_symbols_move_together():
+    vol = 0.02
+    covariance = np.full((2, 2), vol ** 2)
+    simulator = PriceSimulator(initial_price=[100.0, 50.0], symbols=["BTC", "ETH"], covariance=covariance, seed=2)
+    paths = simulator.simulate_paths(50, paths=4)
+    assert np.allclose(paths[..., 0] / 100.0, paths[..., 1] / 50.0)
+    assert not np.allclose(paths[..., 0], 100.0)
+
+
+def test_a_covariance_with_zero_variance_is_accepted():
+    covariance = np.diag([0.02 ** 2, 0.0])
+    simulator = PriceSimulator(symbols=["BTC", "FLAT"], covariance=covariance, seed=3)
+    prices = simulator.simulate_paths(10)[0]
+    assert np.allclose(prices[:, 1], 100.0)
+
+
+@pytest.mark.parametrize("covariance", [
+    [[1.0, 0.5], [0.0, 1.0]],   # not symmetric
+    [[1.0, 2.0], [2.0, 1.0]],   # negative eigenvalue
+    [[1.0]],                    # wrong shape
+])
+def test_invalid_covariances_are_refused(covariance):
+    with pytest.raises(ValueError):
+        PriceSimulator(symbols=["BTC", "ETH"], covariance=covariance)
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import OrderRequest, OrderSide, OrderType
+from trading_engine import TradingEngine
+
+# Opening trades realize no P&L, so the trade-to-trade returns the
+# volatility is taken from divide by zero
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+
+def _round_trip(engine, exit_price):
+    engine.place_order(OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY, quantity=1.0))
+    engine.update_market_price("BTC", exit_price)
+    engine.place_order(OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.SELL, quantity=1.0))
+    engine.update_market_price("BTC", 100.0)
+
+
+def test_incremental_metrics_match_the_full_recompute():
+    ticks = iter(range(1000))
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0,
+                           clock=lambda: datetime(2024, 1, 1) + timedelta(hours=next(ticks)))
+    engine.update_market_price("BTC", 100.0)
+    for price in [110.0, 90.0, 130.0, 80.0, 120.0, 95.0] * 5:
+        _round_trip(engine, price)
+
+    metrics = engine.calculate_risk_metrics(verify=True)
+    assert metrics.max_drawdown > 0
+
+
+def test_trades_sharing_a_timestamp_keep_their_order():
+    instant = datetime(2024, 1, 1)
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0, clock=lambda: instant)
+    engine.update_market_price("BTC", 100.0)
+    for price in [110.0, 90.0, 130.0, 80.0, 120.0, 95.0] * 20:
+        _round_trip(engine, price)
+
+    # Raises if the recompute reorders equal timestamps and finds another drawdown
+    metrics = engine.calculate_risk_metrics(verify=True)
+    assert metrics.max_drawdown == 20.0
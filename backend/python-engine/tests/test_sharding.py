@@ -0,0 +1,91 @@
+import functools
+from datetime import datetime
+
+import pytest
+
+from accounts import CommandClock, EngineManager, ShardedEngineManager
+from models import OrderRequest, OrderSide, OrderType
+from trading_engine import TradingEngine
+
+ACCOUNTS = [f"acct-{i}" for i in range(6)]
+FACTORY = functools.partial(TradingEngine, initial_balance=100000.0, leverage=10.0)
+
+
+def _order(symbol, side, quantity=1.0, **extra):
+    return OrderRequest(symbol=symbol, type=OrderType.MARKET, side=side, quantity=quantity, **extra)
+
+
+@pytest.fixture
+def sharded():
+    clock = CommandClock()
+    clock.now = datetime(2024, 1, 1)
+    events = []
+    manager = ShardedEngineManager(FACTORY, 2, listener=lambda *event: events.append(event), clock=clock)
+    yield manager, events
+    manager.close()
+
+
+def _run(manager):
+    """The same workload for either manager; returns what each call returned"""
+    results = []
+    for account_id in ACCOUNTS:
+        manager.reset(account_id)
+    manager.update_market_price("BTC", 100.0)
+    manager.update_market_price("ETH", 50.0)
+    for i, account_id in enumerate(ACCOUNTS):
+        symbol = "BTC" if i % 2 else "ETH"
+        results.append(manager.execute(account_id, "place_order", _order(symbol, OrderSide.BUY, stop_loss=40.0)).status)
+    manager.update_market_prices([("ETH", 45.0, 2), ("BTC", 104.0, 1), ("ETH", 39.0, 3)])
+    calls = [(account_id, "place_order", (_order("BTC", OrderSide.SELL, 0.5),)) for account_id in ACCOUNTS]
+    calls.append(("acct-0", "place_order", (_order("DOGE", OrderSide.BUY),)))
+    results.extend((ok, getattr(result, "status", type(result).__name__)) for ok, result in manager.execute_many(calls))
+    for account_id in ACCOUNTS:
+        results.append(manager.execute(account_id, "get_portfolio_summary"))
+        results.append([(t.id, t.price, t.realized_pnl) for t in manager.execute(account_id, "get_trades")])
+    return results
+
+
+def test_sharded_accounts_behave_like_local_ones(sharded):
+    manager, events = sharded
+    clock = CommandClock()
+    clock.now = datetime(2024, 1, 1)
+    local = EngineManager(FACTORY, clock=clock)
+
+    assert _run(manager) == _run(local)
+    assert sorted(manager.accounts()) == ACCOUNTS
+    assert {manager.shard_of(a) for a in ACCOUNTS} == {0, 1}
+    # Three ETH buys and the three stop losses that closed them in the shards
+    assert len([e for e in events if e[1:3] == ("fill", "ETH")]) == 6
+    assert ("price", "ETH") in {(e[1], e[2]) for e in events}
+
+
+def test_shards_without_a_symbol_get_its_price_before_their_next_order(sharded):
+    manager, _ = sharded
+    manager.reset("acct-0")
+    manager.update_market_price("BTC", 100.0)
+    # No shard holds BTC, so this tick is only remembered
+    manager.update_market_price("BTC", 120.0)
+    order = manager.execute("acct-0", "place_order", _order("BTC", OrderSide.BUY))
+    assert order.filled_price == 120.0
+
+
+def test_trades_are_trimmed_and_state_survives_export(sharded):
+    manager, _ = sharded
+    manager.reset("acct-1")
+    manager.update_market_price("BTC", 100.0)
+    for side in (OrderSide.BUY, OrderSide.SELL) * 3:
+        manager.execute("acct-1", "place_order", _order("BTC", side))
+    state, = manager.collect()
+    assert len(state.new_trades) == 9
+
+    manager.trim_trades("acct-1", state.opened_at, 6)
+    # A trim for an earlier opening of the account is ignored
+    manager.trim_trades("acct-1", datetime(2000, 1, 1), 9)
+    assert len(manager.execute("acct-1", "get_trades")) == 3
+    assert manager.execute("acct-1", "get_portfolio_summary")["total_trades"] == 9
+
+    exported = manager.export_state()
+    local = EngineManager(FACTORY)
+    local.import_state(exported)
+    assert local.engine("acct-1").ledger.offset == 6
+    assert local.engine("acct-1").get_portfolio_summary() == manager.execute("acct-1", "get_portfolio_summary")
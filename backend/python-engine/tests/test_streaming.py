@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from streaming import EventHub
+
+
+def _drain(client):
+    return [json.loads(m) for m in asyncio.run(client.drain())]
+
+
+def test_state_events_are_conflated_to_the_latest_value():
+    hub = EventHub()
+    client = hub.connect("a")
+    for i in range(100):
+        hub.publish(None, "price", "BTC", {"symbol": "BTC", "price": 100.0 + i})
+    hub.publish("a", "portfolio", None, {"equity": 1.0, "balance": 2.0})
+    hub.publish("a", "portfolio", None, {"equity": 3.0})
+
+    assert _drain(client) == [
+        {"type": "price", "data": {"symbol": "BTC", "price": 199.0}},
+        {"type": "portfolio", "data": {"equity": 3.0, "balance": 2.0}},
+    ]
+
+
+def test_a_slow_client_loses_its_oldest_events_and_is_told():
+    hub = EventHub(max_pending=3)
+    client = hub.connect("a")
+    for i in range(5):
+        hub.publish("a", "fill", "BTC", {"id": i})
+    hub.publish(None, "price", "BTC", {"price": 1.0})
+
+    messages = _drain(client)
+    assert [m["data"] for m in messages[:3]] == [{"id": 2}, {"id": 3}, {"id": 4}]
+    assert messages[3] == {"type": "overflow", "data": {"dropped": 2}}
+    assert messages[4]["type"] == "price"
+    assert client.dropped == 0
+
+
+def test_clients_only_see_their_account_and_symbols():
+    hub = EventHub()
+    client = hub.connect("a", symbols=["ETH"])
+    hub.publish("b", "fill", "ETH", {"id": 1})
+    hub.publish("a", "fill", "BTC", {"id": 2})
+    hub.publish("a", "fill", "ETH", {"id": 3})
+    hub.publish(None, "margin_call", None, {"level": 40})
+    assert [m["data"] for m in _drain(client)] == [{"id": 3}, {"level": 40}]
+
+    hub.disconnect(client)
+    hub.publish("a", "fill", "ETH", {"id": 4})
+    assert len(hub) == 0 and not client._events
+
+
+def test_the_websocket_streams_ticks_in_and_events_out(client):
+    with client.websocket_connect("/ws?symbols=BTC") as ws:
+        ws.send_json({"action": "subscribe", "symbols": ["BTC", "ETH"]})
+        assert ws.receive_json() == {"type": "subscribed", "data": {"symbols": ["BTC", "ETH"]}}
+
+        ws.send_json({"action": "tick", "symbol": "BTC", "price": 101.5})
+        seen = {}
+        while "price" not in seen:
+            message = ws.receive_json()
+            seen[message["type"]] = message["data"]
+        assert seen["price"] == {"symbol": "BTC", "price": 101.5}
+
+        ws.send_json({"action": "bogus"})
+        message = ws.receive_json()
+        while message["type"] != "error":
+            message = ws.receive_json()
+        assert "Unknown action" in message["data"]["detail"]
@@ -0,0 +1,70 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import sweep
+from backtest import TickSeries
+from sweep import ParameterSweep, expand_grid, run_id
+
+GRID = {"entry_every": [5, 20], "stop_distance": [0.005, 0.01]}
+
+
+class _Interrupted(Exception):
+    pass
+
+
+@pytest.fixture(scope="module")
+def ticks():
+    rng = np.random.default_rng(9)
+    start = datetime(2024, 1, 1)
+    series = [
+        TickSeries.from_arrays(symbol, 100.0 * np.exp(np.cumsum(rng.normal(0, 0.004, 300))),
+                               [start + timedelta(seconds=2 * i + offset) for i in range(300)])
+        for offset, symbol in enumerate(("BTC", "ETH"))
+    ]
+    return TickSeries.merge(series)
+
+
+def test_grids_expand_to_stable_run_ids():
+    runs = expand_grid(GRID)
+    assert len(runs) == 4
+    assert runs[0] == {"entry_every": 5, "stop_distance": 0.005}
+    assert run_id(runs[0], "BTC") == run_id(dict(reversed(list(runs[0].items()))), "BTC")
+    assert len({run_id(params, symbol) for params in runs for symbol in ("BTC", "ETH", None)}) == 12
+
+
+def test_an_interrupted_sweep_resumes_where_it_stopped(tmp_path, ticks):
+    path = str(tmp_path / "results.csv")
+    seen = []
+
+    def stop_after_three(row):
+        seen.append(row["run_id"])
+        if len(seen) == 3:
+            raise _Interrupted
+
+    with pytest.raises(_Interrupted):
+        ParameterSweep(ticks, GRID, path, per_symbol=True, workers=2, sample_every=50).run(stop_after_three)
+
+    resumed = ParameterSweep(ticks, GRID, path, per_symbol=True, workers=2, sample_every=50)
+    assert len(resumed.pending()) == 5
+    rerun = []
+    table = resumed.run(lambda row: rerun.append(row["run_id"]))
+
+    assert len(table) == 8
+    assert set(table["run_id"]) == set(seen) | set(rerun)
+    assert not set(seen) & set(rerun)
+    assert resumed.pending() == []
+    assert (table["ticks"] == 300).all()
+    assert (table["trades"] > 0).all()
+
+    # A worker's row matches the same run done in this process
+    row = table.iloc[0]
+    directory = tmp_path / "ticks"
+    directory.mkdir()
+    resumed._share_ticks(str(directory))
+    sweep._init_worker(str(directory))
+    local = sweep._run_one(json.loads(row["params"]), row["symbol"], sweep.BracketStrategy, 50)
+    assert local["final_equity"] == pytest.approx(row["final_equity"])
+    assert local["trades"] == row["trades"]
@@ -0,0 +1,129 @@
+import pytest
+
+from models import OrderRequest, OrderSide, OrderType
+from trading_engine import TradingEngine
+from triggers import TriggerIndex, TriggerType
+
+
+def test_long_stop_loss_and_take_profit_fire_on_crossing():
+    index = TriggerIndex()
+    index.register("a", "BTC", OrderSide.BUY, 100.0, stop_loss=90.0)
+    index.register("b", "BTC", OrderSide.BUY, 100.0, take_profit=110.0)
+
+    assert index.check("BTC", 95.0) == []
+    assert index.check("BTC", 90.0) == [("a", TriggerType.STOP_LOSS)]
+    assert index.check("BTC", 111.0) == [("b", TriggerType.TAKE_PROFIT)]
+    assert len(index) == 0
+
+
+def test_short_levels_fire_in_the_opposite_direction():
+    index = TriggerIndex()
+    index.register("a", "ETH", OrderSide.SELL, 100.0, stop_loss=110.0, take_profit=90.0)
+
+    assert index.check("ETH", 105.0) == []
+    assert index.check("ETH", 89.0) == [("a", TriggerType.TAKE_PROFIT)]
+    assert index.check("ETH", 120.0) == []
+
+
+def test_a_key_fires_once_when_several_levels_cross():
+    index = TriggerIndex()
+    index.register("a", "BTC", OrderSide.BUY, 100.0, stop_loss=95.0, trailing_stop=2.0)
+
+    assert index.check("BTC", 90.0) == [("a", TriggerType.STOP_LOSS)]
+    assert "a" not in index
+
+
+def test_triggers_are_per_symbol():
+    index = TriggerIndex()
+    index.register("a", "BTC", OrderSide.BUY, 100.0, stop_loss=90.0)
+
+    assert index.check("ETH", 50.0) == []
+    assert index.check("BTC", 50.0) == [("a", TriggerType.STOP_LOSS)]
+
+
+def test_re_registering_replaces_the_previous_levels():
+    index = TriggerIndex()
+    index.register("a", "BTC", OrderSide.BUY, 100.0, stop_loss=90.0)
+    index.register("a", "BTC", OrderSide.BUY, 100.0, stop_loss=80.0)
+
+    assert index.check("BTC", 85.0) == []
+    assert index.check("BTC", 80.0) == [("a", TriggerType.STOP_LOSS)]
+
+
+def test_unregistered_keys_never_fire():
+    index = TriggerIndex()
+    index.register("a", "BTC", OrderSide.BUY, 100.0, stop_loss=90.0, trailing_stop=5.0)
+    index.unregister("a")
+
+    assert index.check("BTC", 50.0) == []
+    assert index.trailing_stop_price("a") is None
+
+
+@pytest.mark.parametrize("side, prices, level, fired_at", [
+    (OrderSide.BUY, [100.0, 110.0, 120.0, 117.0], 115.0, 115.0),
+    (OrderSide.SELL, [100.0, 90.0, 80.0, 83.0], 85.0, 85.0),
+])
+def test_trailing_stop_follows_the_best_price(side, prices, level, fired_at):
+    index = TriggerIndex()
+    index.register("a", "BTC", side, prices[0], trailing_stop=5.0)
+
+    for price in prices[1:]:
+        assert index.check("BTC", price) == []
+    assert index.trailing_stop_price("a") == level
+    assert index.check("BTC", fired_at) == [("a", TriggerType.TRAILING_STOP)]
+
+
+def test_merged_trailing_stops_fire_in_distance_order():
+    index = TriggerIndex()
+    index.register("near", "BTC", OrderSide.BUY, 100.0, trailing_stop=2.0)
+    index.register("far", "BTC", OrderSide.BUY, 105.0, trailing_stop=10.0)
+
+    # Both peaks are overtaken, so the stops now trail the same peak
+    assert index.check("BTC", 120.0) == []
+    assert index.trailing_stop_price("near") == 118.0
+    assert index.trailing_stop_price("far") == 110.0
+    assert index.check("BTC", 115.0) == [("near", TriggerType.TRAILING_STOP)]
+    assert index.check("BTC", 110.0) == [("far", TriggerType.TRAILING_STOP)]
+
+
+def test_trailing_stop_distance_must_be_positive():
+    with pytest.raises(ValueError):
+        TriggerIndex().register("a", "BTC", OrderSide.BUY, 100.0, trailing_stop=0.0)
+
+
+def test_heaps_stay_bounded_under_re_registration_churn():
+    index = TriggerIndex()
+    for i in range(5000):
+        index.register(i % 10, "BTC", OrderSide.BUY, 100.0 + i % 7,
+                       stop_loss=50.0, take_profit=150.0 + i % 3, trailing_stop=5.0)
+
+    triggers = index._symbols["BTC"]
+    for heap in (triggers.falling, triggers.rising, triggers.trailing_long):
+        assert len(heap) <= 200
+    fired = index.check("BTC", 40.0)
+    assert sorted(key for key, _ in fired) == list(range(10))
+
+
+def test_engine_closes_a_position_at_its_stop_loss():
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0)
+    engine.update_market_price("BTC", 100.0)
+    engine.place_order(OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY,
+                                    quantity=10.0, stop_loss=95.0))
+
+    engine.update_market_price("BTC", 96.0)
+    assert engine.get_position("BTC") is not None
+    engine.update_market_price("BTC", 94.0)
+    assert engine.get_position("BTC") is None
+    assert engine.get_trades()[-1].realized_pnl == pytest.approx(-60.0)
+
+
+def test_engine_trailing_stop_ratchets_with_the_price():
+    engine = TradingEngine(initial_balance=100000.0, leverage=10.0)
+    engine.update_market_price("BTC", 100.0)
+    engine.place_order(OrderRequest(symbol="BTC", type=OrderType.MARKET, side=OrderSide.BUY,
+                                    quantity=1.0, trailing_stop=5.0))
+
+    engine.update_market_price("BTC", 130.0)
+    assert engine.get_trailing_stop_price("BTC") == 125.0
+    engine.update_market_price("BTC", 124.0)
+    assert engine.get_position("BTC") is None
@@ -1,15 +1,42 @@
-import pandas as pd
-import numpy as np
+import logging
+import math
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from operator import itemgetter
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from models import (
     Order, OrderType, OrderSide, OrderStatus, Position, Trade,
-    Portfolio, RiskMetrics, OrderRequest
+    Portfolio, RiskMetrics, OrderRequest, LiquidationReport, OrderRejection
 )
-from config import COMMISSION_RATE, MARGIN_CALL_LEVEL
+from config import COMMISSION_RATE, MARGIN_CALL_LEVEL, DEBUG_CHECKS, LIQUIDATION_POLICY, PORTFOLIO_RECENT_TRADES
+from admission import OrderAdmission, OrderRejected
+from liquidation import LiquidationPlanner, margin_level
+from ledger import TradeLedger
+from order_book import OrderBook
+from risk_metrics import RiskAccumulator, compute_risk_metrics
+from triggers import TriggerIndex
+from metrics import REGISTRY, stage, timed
+
+logger = logging.getLogger(__name__)
+
+# Hot-path stages, sampled per METRICS_SAMPLE_EVERY
+_TRIGGER_SCAN = stage("trigger_scan")
+_LIMIT_MATCH = stage("limit_match")
+_EQUITY_UPDATE = stage("equity_update")
+_MARGIN_CALLS = REGISTRY.counter("engine_margin_calls_total", "Margin calls handled")
+_LIQUIDATED = REGISTRY.counter("engine_liquidation_actions_total", "Positions closed or reduced by margin calls")
 
 class TradingEngine:
-    def __init__(self, initial_balance: float = 10000.0, leverage: float = 1.0):
+    def __init__(self, initial_balance: float = 10000.0, leverage: float = 1.0,
+                 debug: bool = DEBUG_CHECKS, liquidation_policy: str = LIQUIDATION_POLICY,
+                 clock: Callable[[], datetime] = datetime.now,
+                 admission: Optional[OrderAdmission] = None):
+        # Source of every order, position and trade timestamp; a backtest
+        # swaps in a simulated clock
+        self.clock = clock
+        # When the account was opened; names this engine's trade history
+        self.opened_at = clock()
         self.portfolio = Portfolio(
             balance=initial_balance,
             equity=initial_balance,
@@ -19,23 +46,113 @@ class TradingEngine:
         )
         self.market_prices: Dict[str, float] = {}
         self.commission_rate = COMMISSION_RATE
+        self.order_book = OrderBook()
+        # Orders placed so far; numbers order ids, which must stay unique even
+        # when several orders share a clock reading
+        self._order_seq = 0
+        self.triggers = TriggerIndex()
+        self._orders_dirty = False
+
+        # Open positions by symbol and their running contribution to equity
+        # and margin, so a tick only re-prices the symbol that moved
+        self._positions: Dict[str, Position] = {}
+        self._positions_dirty = False
+        self._net_quantity: Dict[str, float] = {}
+        self._cost_basis: Dict[str, float] = {}
+        self._unrealized: Dict[str, float] = {}
+        self._notional: Dict[str, float] = {}
+        self._total_unrealized = 0.0
+        self._total_notional = 0.0
+        self.debug = debug
+
+        # Trade history, stored as columns, and the risk statistics folded
+        # in as trades are recorded
+        self.ledger = TradeLedger()
+        self.risk = RiskAccumulator()
+        # Trades recorded when portfolio.trades was last refreshed
+        self._trades_seen = 0
+
+        self.liquidation_planner = LiquidationPlanner(liquidation_policy)
+        self.admission = admission or OrderAdmission()
+        self.liquidations: deque = deque(maxlen=100)
+        self._liquidating = False
+
+        # Event listeners, called as listener(event_type, symbol, payload)
+        self._listeners: List[Callable[[str, Optional[str], Any], None]] = []
+        self._last_portfolio_event: Dict[str, float] = {}
+
+    def add_listener(self, listener: Callable[[str, Optional[str], Any], None]):
+        """Register a callback for fills, position, price, margin and portfolio events"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, Optional[str], Any], None]):
+        self._listeners.remove(listener)
+
+    def _emit(self, event_type: str, symbol: Optional[str], payload: Any):
+        for listener in self._listeners:
+            listener(event_type, symbol, payload)
 
     def update_market_price(self, symbol: str, price: float):
         """Update market price and check for order triggers"""
         self.market_prices[symbol] = price
 
         # Check stop-loss and take-profit triggers
+        started = _TRIGGER_SCAN.start()
         self._check_position_triggers(symbol, price)
+        _TRIGGER_SCAN.stop(started)
 
         # Check pending limit orders
+        started = _LIMIT_MATCH.start()
         self._check_limit_orders(symbol, price)
+        _LIMIT_MATCH.stop(started)
 
-        # Update portfolio equity
+        # Re-price the symbol's position and update portfolio equity
+        started = _EQUITY_UPDATE.start()
+        self._refresh_position(symbol)
+        if self._listeners:
+            self._emit("price", symbol, {"symbol": symbol, "price": price})
         self._update_portfolio_equity()
+        _EQUITY_UPDATE.stop(started)
+
+    def update_market_prices(self, ticks: Iterable[Tuple[str, float, datetime]]) -> int:
+        """Apply a batch of (symbol, price, timestamp) ticks in timestamp order
+
+        Triggers and limit orders are checked on every tick, but positions are
+        re-priced and equity, margin and the margin call check are settled
+        once for the whole batch.
+        """
+        ticks = sorted(ticks, key=itemgetter(2))
+        touched = set()
+
+        # The stage timers decide once per batch whether to time its ticks
+        sampled = _TRIGGER_SCAN.sample(len(ticks)) & _LIMIT_MATCH.sample(len(ticks))
+        for symbol, price, _ in ticks:
+            self.market_prices[symbol] = price
+            if sampled:
+                started = perf_counter_ns()
+                self._check_position_triggers(symbol, price)
+                scanned = perf_counter_ns()
+                self._check_limit_orders(symbol, price)
+                _TRIGGER_SCAN.observe(scanned - started)
+                _LIMIT_MATCH.observe(perf_counter_ns() - scanned)
+            else:
+                self._check_position_triggers(symbol, price)
+                self._check_limit_orders(symbol, price)
+            touched.add(symbol)
+
+        started = _EQUITY_UPDATE.start()
+        for symbol in touched:
+            self._refresh_position(symbol)
+            if self._listeners:
+                self._emit("price", symbol, {"symbol": symbol, "price": self.market_prices[symbol]})
+        self._update_portfolio_equity()
+        _EQUITY_UPDATE.stop(started)
+        return len(ticks)
 
     def place_order(self, order_request: OrderRequest) -> Order:
         """Place a new order"""
-        order_id = f"order_{len(self.portfolio.orders) + 1}_{datetime.now().timestamp()}"
+        self._order_seq += 1
+        order_id = f"order_{self._order_seq}_{self.clock().timestamp()}"
 
         order = Order(
             id=order_id,
@@ -45,17 +162,94 @@ class TradingEngine:
             quantity=order_request.quantity,
             price=order_request.price,
             stop_price=order_request.stop_price,
-            timestamp=datetime.now()
+            timestamp=self.clock(),
+            stop_loss=order_request.stop_loss,
+            take_profit=order_request.take_profit,
+            trailing_stop=order_request.trailing_stop
         )
 
+        if order.trailing_stop is not None and order.trailing_stop <= 0:
+            raise ValueError("Trailing stop distance must be positive")
+
+        # Refuse orders adding exposure the account can't carry; pending
+        # orders are checked at their own price now and again when they fill
+        if order.type == OrderType.MARKET:
+            price = self.market_prices.get(order.symbol)
+        else:
+            price = order.price or order.stop_price or self.market_prices.get(order.symbol)
+        if price:
+            rejections = self._admission_rejections(order, price)
+            if rejections:
+                raise OrderRejected(rejections)
+
         # Execute market orders immediately
         if order.type == OrderType.MARKET:
             self._execute_market_order(order)
         else:
-            self.portfolio.orders.append(order)
+            self.order_book.add(order)
+            self._orders_dirty = True
+
+        return order
 
+    def cancel_order(self, order_id: str) -> Optional[Order]:
+        """Cancel a pending order"""
+        order = self.order_book.cancel(order_id)
+        if order is not None:
+            self._orders_dirty = True
         return order
 
+    def get_orders(self) -> List[Order]:
+        """Get pending orders in the order they were placed"""
+        if self._orders_dirty:
+            self.portfolio.orders = self.order_book.orders()
+            self._orders_dirty = False
+        return self.portfolio.orders
+
+    def get_trades(self, start: int = 0, stop: Optional[int] = None) -> List[Trade]:
+        """Materialize recorded trades from the ledger"""
+        return self.ledger.to_trades(start, stop)
+
+    def trim_trades(self, before: int):
+        """Drop the trades before position ``before`` of the history from memory
+
+        Only for trades already stored elsewhere: the ledger then starts at
+        its ``offset`` and trade ids keep counting from the full history.
+        """
+        drop = min(before - self.ledger.offset, len(self.ledger))
+        if drop > 0:
+            self.ledger = self.ledger.slice(drop)
+
+    def get_recent_trades(self) -> List[Trade]:
+        """Get the latest ``PORTFOLIO_RECENT_TRADES`` trades, kept on ``portfolio.trades``"""
+        recorded = self.ledger.offset + len(self.ledger)
+        if recorded != self._trades_seen:
+            self.portfolio.trades = self.ledger.to_trades(max(len(self.ledger) - PORTFOLIO_RECENT_TRADES, 0))
+            self._trades_seen = recorded
+        return self.portfolio.trades
+
+    def active_symbols(self) -> set:
+        """Symbols this engine needs price updates for: open positions and pending orders"""
+        return self.order_book.symbols().union(self._positions)
+
+    def update_portfolio(self, balance: Optional[float] = None, leverage: Optional[float] = None):
+        """Update portfolio settings and re-derive equity and margin"""
+        if balance is not None:
+            self.portfolio.balance = balance
+        if leverage is not None:
+            self.portfolio.leverage = leverage
+        self._update_portfolio_equity()
+
+    def get_position(self, symbol: str) -> Optional[Position]:
+        """Get the open position for a symbol"""
+        return self._positions.get(symbol)
+
+    def get_positions(self) -> List[Position]:
+        """Get open positions in the order they were opened"""
+        if self._positions_dirty:
+            self.portfolio.positions = list(self._positions.values())
+            self._positions_dirty = False
+        return self.portfolio.positions
+
     def _execute_market_order(self, order: Order):
         """Execute a market order immediately"""
         current_price = self.market_prices.get(order.symbol)
@@ -73,57 +267,86 @@ class TradingEngine:
         self._record_trade(order)
 
     def _check_limit_orders(self, symbol: str, current_price: float):
-        """Check and execute limit orders"""
-        for order in self.portfolio.orders[:]:  # Copy to avoid modification during iteration
-            if order.symbol != symbol or order.type != OrderType.LIMIT:
+        """Check and execute limit orders crossed by the new price"""
+        for order in self.order_book.pop_crossed(symbol, current_price):
+            self._orders_dirty = True
+            rejections = self._admission_rejections(order, current_price)
+            if rejections:
+                order.status = OrderStatus.REJECTED
+                if self._listeners:
+                    self._emit("order_rejected", symbol, {
+                        "order_id": order.id,
+                        "rejections": [r.model_dump(mode="json") for r in rejections]
+                    })
                 continue
-
-            should_execute = False
-            if order.side == OrderSide.BUY and current_price <= order.price:
-                should_execute = True
-            elif order.side == OrderSide.SELL and current_price >= order.price:
-                should_execute = True
-
-            if should_execute:
-                order.filled_price = current_price
-                order.filled_quantity = order.quantity
-                order.status = OrderStatus.FILLED
-
-                self._update_position(order)
-                self._record_trade(order)
-                self.portfolio.orders.remove(order)
+            order.filled_price = current_price
+            order.filled_quantity = order.quantity
+            order.status = OrderStatus.FILLED
+
+            self._update_position(order)
+            self._record_trade(order)
+
+    def _admission_rejections(self, order: Order, price: float) -> List[OrderRejection]:
+        """Run the admission checks for an order at a price against the running totals"""
+        quantity = order.quantity if order.side == OrderSide.BUY else -order.quantity
+        risk = self.risk
+        loss = risk.peak_pnl - risk.cumulative_pnl - self._total_unrealized
+        return self.admission.check(
+            self._net_quantity.get(order.symbol, 0.0),
+            quantity,
+            price,
+            self.portfolio.balance + self._total_unrealized,
+            self._total_notional / self.portfolio.leverage,
+            self._total_notional,
+            self.portfolio.leverage,
+            loss,
+            self.commission_rate
+        )
 
     def _check_position_triggers(self, symbol: str, current_price: float):
-        """Check stop-loss and take-profit triggers"""
-        for position in self.portfolio.positions[:]:
-            if position.symbol != symbol:
-                continue
-
-            close_position = False
-            exit_price = current_price
-
-            if position.stop_loss:
-                if position.side == OrderSide.BUY and current_price <= position.stop_loss:
-                    close_position = True
-                elif position.side == OrderSide.SELL and current_price >= position.stop_loss:
-                    close_position = True
-
-            if position.take_profit:
-                if position.side == OrderSide.BUY and current_price >= position.take_profit:
-                    close_position = True
-                elif position.side == OrderSide.SELL and current_price <= position.take_profit:
-                    close_position = True
+        """Close positions whose stop-loss, take-profit or trailing stop was crossed"""
+        for key, _ in self.triggers.check(symbol, current_price):
+            position = self._find_position(key)
+            if position is not None:
+                self._close_position(position, current_price)
+
+    def _find_position(self, symbol: str) -> Optional[Position]:
+        """Find the open position for a symbol"""
+        return self._positions.get(symbol)
+
+    def _register_triggers(self, position: Position):
+        """Index a position's exit levels"""
+        self.triggers.register(
+            position.symbol,
+            position.symbol,
+            position.side,
+            position.current_price,
+            stop_loss=position.stop_loss,
+            take_profit=position.take_profit,
+            trailing_stop=position.trailing_stop
+        )
 
-            if close_position:
-                self._close_position(position, exit_price)
+    def _open_position(self, order: Order, quantity: float):
+        """Open a new position from a filled order"""
+        position = Position(
+            symbol=order.symbol,
+            quantity=quantity,
+            entry_price=order.filled_price,
+            current_price=order.filled_price,
+            side=order.side,
+            unrealized_pnl=0.0,
+            timestamp=self.clock(),
+            stop_loss=order.stop_loss,
+            take_profit=order.take_profit,
+            trailing_stop=order.trailing_stop
+        )
+        self._positions[order.symbol] = position
+        self._positions_dirty = True
+        self._register_triggers(position)
 
     def _update_position(self, order: Order):
         """Update or create position from filled order"""
-        existing_position = None
-        for pos in self.portfolio.positions:
-            if pos.symbol == order.symbol:
-                existing_position = pos
-                break
+        existing_position = self._find_position(order.symbol)
 
         if existing_position:
             # Update existing position
@@ -135,6 +358,14 @@ class TradingEngine:
 
                 existing_position.quantity = total_quantity
                 existing_position.entry_price = new_entry_price
+
+                # Exit levels on the new order replace the position's ones
+                if order.stop_loss is not None or order.take_profit is not None or order.trailing_stop is not None:
+                    existing_position.stop_loss = order.stop_loss
+                    existing_position.take_profit = order.take_profit
+                    existing_position.trailing_stop = order.trailing_stop
+                    existing_position.current_price = order.filled_price
+                    self._register_triggers(existing_position)
             else:
                 # Opposite direction - reduce or close position
                 if existing_position.quantity > order.quantity:
@@ -145,122 +376,205 @@ class TradingEngine:
                     self._close_position(existing_position, order.filled_price)
 
                     # Create new position
-                    new_position = Position(
-                        symbol=order.symbol,
-                        quantity=remaining_quantity,
-                        entry_price=order.filled_price,
-                        current_price=order.filled_price,
-                        side=order.side,
-                        unrealized_pnl=0.0,
-                        timestamp=datetime.now()
-                    )
-                    self.portfolio.positions.append(new_position)
+                    self._open_position(order, remaining_quantity)
                 else:
                     # Exact match - close position
                     self._close_position(existing_position, order.filled_price)
         else:
             # Create new position
-            position = Position(
-                symbol=order.symbol,
-                quantity=order.quantity,
-                entry_price=order.filled_price,
-                current_price=order.filled_price,
-                side=order.side,
-                unrealized_pnl=0.0,
-                timestamp=datetime.now()
-            )
-            self.portfolio.positions.append(position)
+            self._open_position(order, order.quantity)
+
+        self._refresh_position(order.symbol)
 
     def _close_position(self, position: Position, exit_price: float):
         """Close a position and calculate realized P&L"""
+        self._realize(position, position.quantity, exit_price)
+        del self._positions[position.symbol]
+        self._positions_dirty = True
+        self.triggers.unregister(position.symbol)
+        self._refresh_position(position.symbol)
+
+    def _reduce_position(self, position: Position, quantity: float, exit_price: float):
+        """Close part of a position and realize P&L on the closed quantity"""
+        self._realize(position, quantity, exit_price)
+        position.quantity -= quantity
+        self._refresh_position(position.symbol)
+
+    def _realize(self, position: Position, quantity: float, exit_price: float):
+        """Record the trade for closing quantity of a position and book its P&L"""
         realized_pnl = 0.0
         if position.side == OrderSide.BUY:
-            realized_pnl = (exit_price - position.entry_price) * position.quantity
+            realized_pnl = (exit_price - position.entry_price) * quantity
         else:
-            realized_pnl = (position.entry_price - exit_price) * position.quantity
+            realized_pnl = (position.entry_price - exit_price) * quantity
 
         # Create trade record
-        trade = Trade(
-            id=f"trade_{len(self.portfolio.trades) + 1}_{datetime.now().timestamp()}",
-            symbol=position.symbol,
-            side=position.side,
-            quantity=position.quantity,
-            price=exit_price,
-            timestamp=datetime.now(),
-            commission=abs(exit_price * position.quantity * self.commission_rate),
-            realized_pnl=realized_pnl
+        commission = abs(exit_price * quantity * self.commission_rate)
+        index = self.ledger.append(
+            position.symbol, position.side, quantity, exit_price,
+            self.clock(), commission, realized_pnl
         )
-
-        self.portfolio.trades.append(trade)
-        self.portfolio.balance += realized_pnl - trade.commission
-        self.portfolio.positions.remove(position)
+        self.risk.add_pnl(realized_pnl, commission)
+        self.portfolio.balance += realized_pnl - commission
+        if self._listeners:
+            self._emit("fill", position.symbol, self.ledger.trade(index))
 
     def _record_trade(self, order: Order):
         """Record a trade from an order"""
-        trade = Trade(
-            id=f"trade_{len(self.portfolio.trades) + 1}_{datetime.now().timestamp()}",
-            symbol=order.symbol,
-            side=order.side,
-            quantity=order.quantity,
-            price=order.filled_price,
-            timestamp=datetime.now(),
-            commission=abs(order.filled_price * order.quantity * self.commission_rate),
-            realized_pnl=0.0  # Will be calculated when position is closed
+        commission = abs(order.filled_price * order.quantity * self.commission_rate)
+        index = self.ledger.append(
+            order.symbol, order.side, order.quantity, order.filled_price,
+            self.clock(), commission,
+            0.0  # Will be calculated when position is closed
         )
-
-        self.portfolio.trades.append(trade)
-        self.portfolio.balance -= trade.commission
+        self.risk.add_pnl(0.0, commission)
+        self.portfolio.balance -= commission
+        if self._listeners:
+            self._emit("fill", order.symbol, self.ledger.trade(index))
+
+    def _refresh_position(self, symbol: str):
+        """Re-derive a symbol's contribution to the running equity and margin totals"""
+        had_position = symbol in self._notional
+        self._total_unrealized -= self._unrealized.pop(symbol, 0.0)
+        self._total_notional -= self._notional.pop(symbol, 0.0)
+        self._net_quantity.pop(symbol, None)
+        self._cost_basis.pop(symbol, None)
+
+        position = self._positions.get(symbol)
+        if position is None:
+            if not self._positions:
+                # Nothing open - reset the totals so rounding error can't build up
+                self._total_unrealized = 0.0
+                self._total_notional = 0.0
+            if had_position and self._listeners:
+                self._emit("position", symbol, {"symbol": symbol, "closed": True})
+            return
+
+        current_price = self.market_prices.get(symbol, position.current_price)
+        net_quantity = position.quantity if position.side == OrderSide.BUY else -position.quantity
+        unrealized_pnl = (current_price - position.entry_price) * net_quantity
+        notional = abs(position.quantity * current_price)
+
+        position.current_price = current_price
+        position.unrealized_pnl = unrealized_pnl
+
+        self._net_quantity[symbol] = net_quantity
+        self._cost_basis[symbol] = net_quantity * position.entry_price
+        self._unrealized[symbol] = unrealized_pnl
+        self._notional[symbol] = notional
+        self._total_unrealized += unrealized_pnl
+        self._total_notional += notional
+        if self._listeners:
+            self._emit("position", symbol, position)
 
     def _update_portfolio_equity(self):
-        """Update portfolio equity based on current positions"""
-        total_unrealized_pnl = sum(pos.unrealized_pnl for pos in self.portfolio.positions)
-
-        # Update unrealized P&L for each position
-        for position in self.portfolio.positions:
-            current_price = self.market_prices.get(position.symbol, position.current_price)
-            position.current_price = current_price
-
-            if position.side == OrderSide.BUY:
-                position.unrealized_pnl = (current_price - position.entry_price) * position.quantity
-            else:
-                position.unrealized_pnl = (position.entry_price - current_price) * position.quantity
+        """Update portfolio equity and margin from the running position totals"""
+        self.portfolio.equity = self.portfolio.balance + self._total_unrealized
+        self.portfolio.used_margin = self._total_notional / self.portfolio.leverage
 
-        total_unrealized_pnl = sum(pos.unrealized_pnl for pos in self.portfolio.positions)
-        self.portfolio.equity = self.portfolio.balance + total_unrealized_pnl
-
-        # Calculate used margin
-        total_position_value = sum(
-            abs(pos.quantity * pos.current_price) / self.portfolio.leverage
-            for pos in self.portfolio.positions
+        self.portfolio.margin_level = margin_level(
+            self.portfolio.equity, self._total_notional, self.portfolio.leverage
         )
-        self.portfolio.used_margin = total_position_value
 
-        # Calculate margin level
-        if self.portfolio.used_margin > 0:
-            self.portfolio.margin_level = (self.portfolio.equity / self.portfolio.used_margin) * 100
-        else:
-            self.portfolio.margin_level = 100.0
+        if self.debug:
+            self._verify_aggregates()
+
+        if self._listeners:
+            self._emit_portfolio_delta()
 
         # Check for margin call
         if self.portfolio.margin_level <= MARGIN_CALL_LEVEL:
             self._handle_margin_call()
 
-    def _handle_margin_call(self):
-        """Handle margin call by closing positions"""
-        print(f"Margin call triggered! Margin level: {self.portfolio.margin_level:.2f}%")
+    def _emit_portfolio_delta(self):
+        """Emit the portfolio figures that changed since the last event"""
+        current = {
+            "balance": self.portfolio.balance,
+            "equity": self.portfolio.equity,
+            "used_margin": self.portfolio.used_margin,
+            "margin_level": self.portfolio.margin_level,
+            "leverage": self.portfolio.leverage,
+        }
+        delta = {k: v for k, v in current.items() if self._last_portfolio_event.get(k) != v}
+        if delta:
+            self._last_portfolio_event = current
+            self._emit("portfolio", None, delta)
+
+    def _verify_aggregates(self):
+        """Cross-check the running totals against a full recompute over all positions"""
+        total_unrealized_pnl = 0.0
+        total_position_value = 0.0
+        for position in self._positions.values():
+            current_price = self.market_prices.get(position.symbol, position.current_price)
+            if position.side == OrderSide.BUY:
+                total_unrealized_pnl += (current_price - position.entry_price) * position.quantity
+            else:
+                total_unrealized_pnl += (position.entry_price - current_price) * position.quantity
+            total_position_value += abs(position.quantity * current_price)
 
-        # Close positions starting with the most unprofitable
-        sorted_positions = sorted(
-            self.portfolio.positions,
-            key=lambda x: x.unrealized_pnl
+        expected = {
+            "equity": self.portfolio.balance + total_unrealized_pnl,
+            "used_margin": total_position_value / self.portfolio.leverage,
+        }
+        for field, value in expected.items():
+            actual = getattr(self.portfolio, field)
+            if abs(actual - value) > 1e-6 * max(1.0, abs(value)):
+                raise RuntimeError(
+                    f"Incremental {field} {actual} diverged from full recompute {value}"
+                )
+
+    @timed(stage("margin_call"))
+    def _handle_margin_call(self):
+        """Handle margin call by liquidating the planned positions as one batch"""
+        if self._liquidating:
+            return
+
+        level_before = self.portfolio.margin_level
+        logger.warning("Margin call triggered! Margin level: %.2f%%", level_before)
+
+        actions = self.liquidation_planner.plan(
+            self._positions.values(),
+            self.portfolio.equity,
+            self._total_notional,
+            self.portfolio.leverage,
+            self.commission_rate
         )
 
-        for position in sorted_positions:
-            if self.portfolio.margin_level > MARGIN_CALL_LEVEL:
-                break
-            current_price = self.market_prices.get(position.symbol, position.current_price)
-            self._close_position(position, current_price)
+        self._liquidating = True
+        try:
+            for action in actions:
+                position = self._positions[action.symbol]
+                if action.closed:
+                    self._close_position(position, action.price)
+                else:
+                    self._reduce_position(position, action.quantity, action.price)
             self._update_portfolio_equity()
+        finally:
+            self._liquidating = False
+
+        planner = self.liquidation_planner
+        report = LiquidationReport(
+            timestamp=self.clock(),
+            policy=planner.policy,
+            margin_level_before=level_before,
+            margin_level_after=self.portfolio.margin_level,
+            target_level=planner.target_level,
+            restored=self.portfolio.margin_level > planner.target_level,
+            actions=actions
+        )
+        self.liquidations.append(report)
+        if self._listeners:
+            self._emit("margin_call", None, report)
+        _MARGIN_CALLS.inc()
+        _LIQUIDATED.inc(len(actions))
+        logger.warning(
+            "Liquidated %d position(s) (%s), margin level now %.2f%%",
+            len(actions), planner.policy.value, report.margin_level_after
+        )
+
+    def get_trailing_stop_price(self, symbol: str) -> Optional[float]:
+        """Current trailing stop level for a symbol's position"""
+        return self.triggers.trailing_stop_price(symbol)
 
     def get_portfolio_summary(self) -> Dict:
         """Get portfolio summary"""
@@ -270,72 +584,38 @@ class TradingEngine:
             "used_margin": self.portfolio.used_margin,
             "margin_level": self.portfolio.margin_level,
             "leverage": self.portfolio.leverage,
-            "total_positions": len(self.portfolio.positions),
-            "total_orders": len(self.portfolio.orders),
-            "total_trades": len(self.portfolio.trades)
+            "free_margin": self.portfolio.balance + self._total_unrealized - self._total_notional / self.portfolio.leverage,
+            "total_positions": len(self._positions),
+            "total_orders": len(self.order_book),
+            "total_trades": self.ledger.offset + len(self.ledger)
         }
 
-    def calculate_risk_metrics(self) -> RiskMetrics:
-        """Calculate risk metrics using pandas"""
-        if not self.portfolio.trades:
-            return RiskMetrics(
-                max_drawdown=0.0,
-                sharpe_ratio=0.0,
-                total_return=0.0,
-                volatility=0.0,
-                win_rate=0.0,
-                profit_factor=0.0
+    def calculate_risk_metrics(self, verify: bool = False) -> RiskMetrics:
+        """Current risk metrics from the running accumulator
+
+        With ``verify`` (or debug checks enabled) the metrics are also
+        recomputed from the full trade history with pandas and compared.
+        Once older trades are trimmed from memory the history is incomplete:
+        debug checks are skipped and ``verify`` raises.
+        """
+        metrics = self.risk.metrics()
+        if self.ledger.offset == 0:
+            if verify or self.debug:
+                verify_risk_metrics(metrics, compute_risk_metrics(self.ledger))
+        elif verify:
+            raise ValueError("Older trades are no longer in memory; verify against the stored history")
+        return metrics
+
+
+def verify_risk_metrics(incremental: RiskMetrics, full: RiskMetrics):
+    """Raise if incrementally maintained metrics diverge from a full recompute"""
+    for field, value in full.model_dump().items():
+        actual = getattr(incremental, field)
+        if math.isnan(value) and math.isnan(actual):
+            continue
+        if actual == value:
+            continue
+        if not abs(actual - value) <= 1e-6 * max(1.0, abs(value)):
+            raise RuntimeError(
+                f"Incremental {field} {actual} diverged from full recompute {value}"
             )
-
-        # Convert trades to DataFrame
-        trades_df = pd.DataFrame([
-            {
-                'timestamp': trade.timestamp,
-                'pnl': trade.realized_pnl,
-                'commission': trade.commission
-            } for trade in self.portfolio.trades
-        ])
-
-        trades_df = trades_df.sort_values('timestamp')
-        trades_df['cumulative_pnl'] = trades_df['pnl'].cumsum()
-        trades_df['cumulative_return'] = trades_df['cumulative_pnl'] / abs(trades_df['cumulative_pnl'].iloc[0]) if len(trades_df) > 0 else 0
-
-        # Max drawdown
-        rolling_max = trades_df['cumulative_pnl'].expanding().max()
-        drawdowns = trades_df['cumulative_pnl'] - rolling_max
-        max_drawdown = abs(drawdowns.min()) if len(drawdowns) > 0 else 0.0
-
-        # Total return
-        total_return = trades_df['cumulative_pnl'].iloc[-1] if len(trades_df) > 0 else 0.0
-
-        # Volatility (daily returns)
-        if len(trades_df) > 1:
-            trades_df['daily_return'] = trades_df['pnl'].pct_change().fillna(0)
-            volatility = trades_df['daily_return'].std() * np.sqrt(252)  # Annualized
-        else:
-            volatility = 0.0
-
-        # Sharpe ratio (assuming 2% risk-free rate)
-        risk_free_rate = 0.02
-        if volatility > 0:
-            sharpe_ratio = (trades_df['daily_return'].mean() - risk_free_rate/252) / volatility
-        else:
-            sharpe_ratio = 0.0
-
-        # Win rate
-        winning_trades = len(trades_df[trades_df['pnl'] > 0])
-        win_rate = winning_trades / len(trades_df) if len(trades_df) > 0 else 0.0
-
-        # Profit factor
-        gross_profit = trades_df[trades_df['pnl'] > 0]['pnl'].sum()
-        gross_loss = abs(trades_df[trades_df['pnl'] < 0]['pnl'].sum())
-        profit_factor = gross_profit / gross_loss if gross_loss > 0 else float('inf')
-
-        return RiskMetrics(
-            max_drawdown=max_drawdown,
-            sharpe_ratio=sharpe_ratio,
-            total_return=total_return,
-            volatility=volatility,
-            win_rate=win_rate,
-            profit_factor=profit_factor
-        )
\ No newline at end of file
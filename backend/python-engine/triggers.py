@@ -0,0 +1,306 @@
+import heapq
+from enum import Enum
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from models import OrderSide
+
+# Heaps are compacted once they have doubled since the last compaction,
+# and never below this size
+_COMPACT_MIN = 64
+
+
+class TriggerType(str, Enum):
+    STOP_LOSS = "stop_loss"
+    TAKE_PROFIT = "take_profit"
+    TRAILING_STOP = "trailing_stop"
+
+
+class _LevelIndex:
+    """Fixed price levels that fire once the price moves through them
+
+    Levels are stored as ``sign * level`` in a min-heap so the same structure
+    serves levels that fire on a rising price (sign=1, fire when
+    price >= level) and on a falling price (sign=-1, fire when price <= level).
+    """
+
+    def __init__(self, sign: int):
+        self.sign = sign
+        self._heap: List[Tuple[float, int, Hashable, TriggerType]] = []
+        self._limit = _COMPACT_MIN
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, level: float, gen: int, key: Hashable, trigger_type: TriggerType):
+        heapq.heappush(self._heap, (self.sign * level, gen, key, trigger_type))
+
+    def compact(self, live: Dict[Hashable, int]):
+        """Drop the levels of replaced or unregistered keys once the heap has doubled"""
+        if len(self._heap) > self._limit:
+            self._heap = [entry for entry in self._heap if live.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+            self._limit = max(2 * len(self._heap), _COMPACT_MIN)
+
+    def pop_crossed(self, price: float, live: Dict[Hashable, int]) -> List[Tuple[Hashable, TriggerType]]:
+        fired = []
+        bound = self.sign * price
+        while self._heap and self._heap[0][0] <= bound:
+            _, gen, key, trigger_type = heapq.heappop(self._heap)
+            if live.get(key) == gen:
+                fired.append((key, trigger_type))
+        return fired
+
+
+class _TrailingBucket:
+    __slots__ = ("peak", "version", "stops")
+
+    def __init__(self, peak: float):
+        self.peak = peak
+        self.version = 0
+        self.stops: List[Tuple[float, int, Hashable]] = []
+
+
+class _TrailingIndex:
+    """Trailing stops that follow the price in one direction
+
+    Prices are mapped to ``x = sign * price`` so every stop trails a running
+    maximum of x and fires once x falls ``distance`` below it. Stops whose peak
+    has been overtaken by the market all share the new peak, so they are merged
+    into one bucket (smaller heaps into the larger one). A rising market then
+    only touches one bucket per tick, and each stop is moved O(log n) times
+    over its lifetime.
+
+    Superseded peak and level entries and the stops of unregistered keys
+    are discarded lazily; once the peak and level heaps have doubled since
+    the last compaction, everything dead is dropped in one pass.
+    """
+
+    def __init__(self, sign: int):
+        self.sign = sign
+        self._buckets: Dict[int, _TrailingBucket] = {}
+        self._next_bucket_id = 0
+        self._by_peak: List[Tuple[float, int]] = []
+        self._by_level: List[Tuple[float, int, int]] = []
+        self._where: Dict[Hashable, Tuple[int, float]] = {}
+        self._limit = _COMPACT_MIN
+
+    def __len__(self) -> int:
+        """Peak and level heap entries, superseded ones included"""
+        return len(self._by_peak) + len(self._by_level)
+
+    def compact(self, live: Dict[Hashable, int]):
+        """Rebuild the buckets and heaps from the live stops once the heaps have doubled"""
+        if len(self) <= self._limit:
+            return
+        for bucket_id, bucket in list(self._buckets.items()):
+            bucket.stops = [stop for stop in bucket.stops if live.get(stop[2]) == stop[1]]
+            if bucket.stops:
+                heapq.heapify(bucket.stops)
+            else:
+                del self._buckets[bucket_id]
+        self._by_peak = [(bucket.peak, bucket_id) for bucket_id, bucket in self._buckets.items()]
+        heapq.heapify(self._by_peak)
+        self._by_level = []
+        for bucket_id, bucket in self._buckets.items():
+            bucket.version += 1
+            self._by_level.append((bucket.stops[0][0] - bucket.peak, bucket_id, bucket.version))
+        heapq.heapify(self._by_level)
+        self._limit = max(2 * len(self), _COMPACT_MIN)
+
+    def _publish(self, bucket_id: int, bucket: _TrailingBucket):
+        bucket.version += 1
+        level = bucket.peak - bucket.stops[0][0]
+        heapq.heappush(self._by_level, (-level, bucket_id, bucket.version))
+
+    def push(self, distance: float, gen: int, key: Hashable, price: float):
+        bucket_id = self._next_bucket_id
+        self._next_bucket_id += 1
+        bucket = self._buckets[bucket_id] = _TrailingBucket(self.sign * price)
+        bucket.stops.append((distance, gen, key))
+        self._where[key] = (bucket_id, distance)
+        heapq.heappush(self._by_peak, (bucket.peak, bucket_id))
+        self._publish(bucket_id, bucket)
+
+    def level(self, key: Hashable) -> Optional[float]:
+        """Current stop price of a trailing stop"""
+        where = self._where.get(key)
+        if where is None:
+            return None
+        bucket_id, distance = where
+        return self.sign * (self._buckets[bucket_id].peak - distance)
+
+    def discard(self, key: Hashable):
+        self._where.pop(key, None)
+
+    def _raise_peaks(self, x: float, live: Dict[Hashable, int]):
+        overtaken = []
+        while self._by_peak and self._by_peak[0][0] < x:
+            peak, bucket_id = heapq.heappop(self._by_peak)
+            bucket = self._buckets.get(bucket_id)
+            if bucket is not None and bucket.peak == peak and bucket_id not in overtaken:
+                overtaken.append(bucket_id)
+        if not overtaken:
+            return
+
+        # Merge every overtaken bucket into the largest one
+        target_id = max(overtaken, key=lambda b: len(self._buckets[b].stops))
+        target = self._buckets[target_id]
+        for bucket_id in overtaken:
+            if bucket_id == target_id:
+                continue
+            for stop in self._buckets.pop(bucket_id).stops:
+                distance, gen, key = stop
+                if live.get(key) != gen:
+                    continue
+                heapq.heappush(target.stops, stop)
+                self._where[key] = (target_id, distance)
+
+        target.peak = x
+        self._drop_dead(target, live)
+        if target.stops:
+            heapq.heappush(self._by_peak, (x, target_id))
+            self._publish(target_id, target)
+        else:
+            del self._buckets[target_id]
+
+    def _drop_dead(self, bucket: _TrailingBucket, live: Dict[Hashable, int]):
+        while bucket.stops and live.get(bucket.stops[0][2]) != bucket.stops[0][1]:
+            heapq.heappop(bucket.stops)
+
+    def pop_crossed(self, price: float, live: Dict[Hashable, int]) -> List[Tuple[Hashable, TriggerType]]:
+        x = self.sign * price
+        self._raise_peaks(x, live)
+
+        fired = []
+        while self._by_level and -self._by_level[0][0] >= x:
+            _, bucket_id, version = heapq.heappop(self._by_level)
+            bucket = self._buckets.get(bucket_id)
+            if bucket is None or bucket.version != version:
+                continue
+
+            while bucket.stops and bucket.peak - bucket.stops[0][0] >= x:
+                _, gen, key = heapq.heappop(bucket.stops)
+                if live.get(key) == gen:
+                    fired.append((key, TriggerType.TRAILING_STOP))
+                    self._where.pop(key, None)
+
+            self._drop_dead(bucket, live)
+            if bucket.stops:
+                self._publish(bucket_id, bucket)
+            else:
+                del self._buckets[bucket_id]
+        self.compact(live)
+        return fired
+
+
+class _SymbolTriggers:
+    def __init__(self):
+        self.falling = _LevelIndex(-1)
+        self.rising = _LevelIndex(1)
+        self.trailing_long = _TrailingIndex(1)
+        self.trailing_short = _TrailingIndex(-1)
+
+
+class TriggerIndex:
+    """Stop-loss, take-profit and trailing stop levels indexed per symbol and side
+
+    Each registered key (typically a position) contributes its levels to
+    sorted per-symbol structures, so a price update only visits the levels it
+    crosses. Re-registering a key replaces its previous levels; stale heap
+    entries are discarded lazily using a per-key generation number, and
+    compacted away once they could make up half of an index.
+    """
+
+    def __init__(self):
+        self._symbols: Dict[str, _SymbolTriggers] = {}
+        self._live: Dict[Hashable, int] = {}
+        self._meta: Dict[Hashable, Tuple[str, OrderSide]] = {}
+        # Last generation handed out; counters are plain ints so the index pickles
+        self._gen = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._live
+
+    def register(
+        self,
+        key: Hashable,
+        symbol: str,
+        side: OrderSide,
+        price: float,
+        stop_loss: Optional[float] = None,
+        take_profit: Optional[float] = None,
+        trailing_stop: Optional[float] = None,
+    ):
+        """Index the exit levels of a position, replacing any previous ones"""
+        self.unregister(key)
+        if stop_loss is None and take_profit is None and trailing_stop is None:
+            return
+        if trailing_stop is not None and trailing_stop <= 0:
+            raise ValueError("Trailing stop distance must be positive")
+
+        triggers = self._symbols.get(symbol)
+        if triggers is None:
+            triggers = self._symbols[symbol] = _SymbolTriggers()
+
+        self._gen += 1
+        gen = self._gen
+        self._live[key] = gen
+        self._meta[key] = (symbol, side)
+
+        if side == OrderSide.BUY:
+            if stop_loss is not None:
+                triggers.falling.push(stop_loss, gen, key, TriggerType.STOP_LOSS)
+            if take_profit is not None:
+                triggers.rising.push(take_profit, gen, key, TriggerType.TAKE_PROFIT)
+            if trailing_stop is not None:
+                triggers.trailing_long.push(trailing_stop, gen, key, price)
+        else:
+            if stop_loss is not None:
+                triggers.rising.push(stop_loss, gen, key, TriggerType.STOP_LOSS)
+            if take_profit is not None:
+                triggers.falling.push(take_profit, gen, key, TriggerType.TAKE_PROFIT)
+            if trailing_stop is not None:
+                triggers.trailing_short.push(trailing_stop, gen, key, price)
+
+        for index in (triggers.falling, triggers.rising, triggers.trailing_long, triggers.trailing_short):
+            index.compact(self._live)
+
+    def unregister(self, key: Hashable):
+        """Drop every level registered for a key"""
+        if self._live.pop(key, None) is None:
+            return
+        symbol, side = self._meta.pop(key)
+        triggers = self._symbols[symbol]
+        if side == OrderSide.BUY:
+            triggers.trailing_long.discard(key)
+        else:
+            triggers.trailing_short.discard(key)
+
+    def trailing_stop_price(self, key: Hashable) -> Optional[float]:
+        """Current level of the trailing stop registered for a key"""
+        meta = self._meta.get(key)
+        if meta is None:
+            return None
+        symbol, side = meta
+        triggers = self._symbols[symbol]
+        trailing = triggers.trailing_long if side == OrderSide.BUY else triggers.trailing_short
+        return trailing.level(key)
+
+    def check(self, symbol: str, price: float) -> List[Tuple[Hashable, TriggerType]]:
+        """Return the keys whose levels are crossed by price, unregistering them"""
+        triggers = self._symbols.get(symbol)
+        if triggers is None:
+            return []
+
+        fired = []
+        for index in (triggers.falling, triggers.rising,
+                      triggers.trailing_long, triggers.trailing_short):
+            for key, trigger_type in index.pop_crossed(price, self._live):
+                # A key fires at most once, even if several of its levels cross
+                if key in self._live:
+                    self.unregister(key)
+                    fired.append((key, trigger_type))
+        return fired
@@ -1,14 +1,176 @@
-import requests
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+import httpx
+
+_MISSING = object()
+
+# Responses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires <= self.clock():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
 
 class DataFetcher:
-    def __init__(self, api_key=None):
+    """Asynchronous market data client over a pooled HTTP client
+
+    Quotes come from ``GET {base_url}/quote/{symbol}`` (``{"price": ...}``)
+    and history from ``GET {base_url}/history/{symbol}?days=N`` (a list of
+    records). Each endpoint has its own concurrency limit, results are
+    kept in TTL/LRU caches, and concurrent requests for the same key share
+    one upstream call. Failed connections and retryable statuses are
+    retried with exponential backoff and jitter.
+
+    Use it as an async context manager, or call ``close()`` when done.
+    ``transport`` is handed to httpx, e.g. a MockTransport in tests.
+    """
+
+    def __init__(self, api_key=None, base_url="https://api.example.com", max_connections=20,
+                 endpoint_limits=None, default_limit=8, quote_ttl=1.0, history_ttl=300.0,
+                 cache_size=1024, retries=3, backoff=0.1, timeout=10.0, transport=None):
         self.api_key = api_key
-        self.base_url = "https://api.example.com"  # Placeholder
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self.default_limit = default_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.transport = transport
+        self.caches = {
+            'quote': TTLCache(cache_size, quote_ttl),
+            'history': TTLCache(cache_size, history_ttl),
+        }
+        self.upstream_calls = 0
+        self._client = None
+        self._semaphores = {}
+        self._inflight = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            headers = {'Authorization': f"Bearer {self.api_key}"} if self.api_key else None
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _semaphore(self, endpoint):
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            limit = self.endpoint_limits.get(endpoint, self.default_limit)
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def _get(self, endpoint, path, params=None):
+        """GET a JSON document, retrying transient failures
+
+        The endpoint's concurrency slot is held per attempt, so a request
+        backing off does not keep others waiting.
+        """
+        for attempt in range(self.retries + 1):
+            async with self._semaphore(endpoint):
+                self.upstream_calls += 1
+                try:
+                    response = await self.client.get(path, params=params)
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        response.raise_for_status()
+                        return response.json()
+            delay = self.backoff * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, delay))
+
+    async def _cached(self, endpoint, key, fetch):
+        """Cached value for key, sharing one in-flight fetch between callers"""
+        cache = self.caches[endpoint]
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        task = self._inflight.get((endpoint, key))
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[(endpoint, key)] = task
+            task.add_done_callback(lambda t: self._store(endpoint, key, t))
+        # A cancelled caller must not cancel the fetch the others wait on
+        return await asyncio.shield(task)
+
+    def _store(self, endpoint, key, task):
+        self._inflight.pop((endpoint, key), None)
+        if not task.cancelled() and task.exception() is None:
+            self.caches[endpoint].set(key, task.result())
+
+    async def fetch_price(self, symbol):
+        async def fetch():
+            return float((await self._get('quote', f"/quote/{quote(symbol, safe='')}"))['price'])
+        return await self._cached('quote', symbol, fetch)
+
+    async def fetch_prices(self, symbols):
+        """Prices for many symbols concurrently, as {symbol: price}
 
-    def fetch_price(self, symbol):
-        # Placeholder for API call
-        return 100.0  # Mock price
+        Symbols whose fetch failed are left out; the last error is raised
+        only if every symbol failed.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        results = await asyncio.gather(*(self.fetch_price(s) for s in symbols), return_exceptions=True)
+        prices = {s: r for s, r in zip(symbols, results) if not isinstance(r, BaseException)}
+        if symbols and not prices:
+            raise results[-1]
+        return prices
 
-    def fetch_historical_data(self, symbol, days=30):
-        # Placeholder
-        return []
\ No newline at end of file
+    async def fetch_historical_data(self, symbol, days=30):
+        async def fetch():
+            return await self._get('history', f"/history/{quote(symbol, safe='')}", params={'days': days})
+        return await self._cached('history', (symbol, days), fetch)
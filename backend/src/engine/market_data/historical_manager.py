@@ -1,20 +1,243 @@
+import json
+import os
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+# Columns kept per symbol; timestamps are microseconds since the epoch
+COLUMNS = {'timestamp': np.int64, 'price': np.float64, 'volume': np.float64}
+
+# Columns of aggregated bars, stamped with the bar's start time
+BAR_COLUMNS = {
+    'timestamp': np.int64, 'open': np.float64, 'high': np.float64, 'low': np.float64,
+    'close': np.float64, 'volume': np.float64, 'vwap': np.float64,
+}
+
+
+def _to_us(value):
+    """Microseconds since the epoch of a datetime, datetime64 or integer
+
+    Timezone-aware datetimes are converted to naive local time, the way
+    engine timestamps are recorded.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return int(np.datetime64(value, 'us').astype(np.int64))
+    if isinstance(value, np.datetime64):
+        return int(value.astype('datetime64[us]').astype(np.int64))
+    return int(value)
+
+
+def _timestamps_us(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[us]').astype(np.int64)
+    if values.dtype.kind in 'iu':
+        return values.astype(np.int64)
+    return np.fromiter((_to_us(v) for v in values), dtype=np.int64, count=len(values))
+
+
+def _empty(columns):
+    empty = {name: np.empty(0, dtype=dtype) for name, dtype in columns.items()}
+    empty['timestamp'] = empty['timestamp'].view('datetime64[us]')
+    return empty
+
+
+class _SymbolStore:
+    """One series' column files, grown a chunk of rows at a time
+
+    ``meta.json`` records how many rows are valid; the files themselves are
+    preallocated to a multiple of ``chunk_size`` rows.
+    """
+
+    def __init__(self, directory, chunk_size, columns=COLUMNS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.dtypes = columns
+        self.length = 0
+        meta = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta):
+            with open(meta) as f:
+                self.length = json.load(f)['length']
+        path = self._path('timestamp')
+        rows = os.path.getsize(path) // 8 if os.path.exists(path) else 0
+        self.columns = {}
+        self._map(max(rows, self.length))
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _map(self, capacity):
+        for name, dtype in self.dtypes.items():
+            path = self._path(name)
+            size = capacity * np.dtype(dtype).itemsize
+            with open(path, 'ab') as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            if capacity:
+                self.columns[name] = np.memmap(path, dtype=dtype, mode='r+', shape=(capacity,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+        self.capacity = capacity
+
+    def _write_meta(self):
+        path = os.path.join(self.directory, 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'length': self.length}, f)
+        os.replace(path + '.tmp', path)
+
+    def append(self, values):
+        """Append rows given as one array per column, in timestamp order"""
+        timestamps = values['timestamp']
+        n = len(timestamps)
+        if n == 0:
+            return 0
+        if self.length and timestamps[0] < self.columns['timestamp'][self.length - 1]:
+            raise ValueError("Ticks must be appended in timestamp order")
+        end = self.length + n
+        if end > self.capacity:
+            # Earlier views keep their mapping; the file only ever grows
+            self._map(-(-end // self.chunk_size) * self.chunk_size)
+        for name in self.dtypes:
+            self.columns[name][self.length:end] = values[name]
+        self.length = end
+        self._write_meta()
+        return n
+
+    def truncate(self):
+        self.length = 0
+        self._write_meta()
+
+    def bounds(self, start, end):
+        """Row range [lo, hi) of timestamps >= start and < end, by binary search"""
+        timestamps = self.columns['timestamp'][:self.length]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, _to_us(start), 'left'))
+        hi = self.length if end is None else int(np.searchsorted(timestamps, _to_us(end), 'left'))
+        return lo, max(lo, hi)
+
+    def views(self, start, end):
+        lo, hi = self.bounds(start, end)
+        views = {name: column[lo:hi] for name, column in self.columns.items()}
+        views['timestamp'] = views['timestamp'].view('datetime64[us]')
+        return views
+
+    def flush(self):
+        for column in self.columns.values():
+            if isinstance(column, np.memmap):
+                column.flush()
+
+
 class HistoricalManager:
-    def __init__(self):
-        self.data = {}
+    """Tick history stored as memory-mapped columns, one file set per symbol
+
+    Each symbol gets a directory under ``path`` holding timestamp, price and
+    volume files. Appends must arrive in timestamp order per symbol (each
+    batch is sorted first) and extend the files ``chunk_size`` rows at a
+    time. Range queries binary-search the timestamps and return views onto
+    the mapped files, so history larger than memory is paged in on demand.
+    Bounds are naive datetimes like the engine's timestamps; the end is
+    exclusive.
+
+    Finished OHLCV bars are kept the same way, in one file set per symbol
+    and timeframe, through ``append_bars`` and ``get_bars``.
+    """
+
+    def __init__(self, path='historical_data', chunk_size=65536):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._stores = {}
+
+    def _store(self, symbol, create=False, timeframe=None):
+        key = symbol if timeframe is None else (symbol, timeframe)
+        store = self._stores.get(key)
+        if store is None:
+            # Quoting escapes '@', so bar directories never clash with symbols
+            name = quote(symbol, safe='')
+            if timeframe is not None:
+                name = f"{name}@{timeframe}"
+            directory = os.path.join(self.path, name)
+            if not create and not os.path.isdir(directory):
+                return None
+            columns = COLUMNS if timeframe is None else BAR_COLUMNS
+            store = self._stores[key] = _SymbolStore(directory, self.chunk_size, columns)
+        return store
+
+    def symbols(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(unquote(name) for name in os.listdir(self.path)
+                      if '@' not in name and os.path.isdir(os.path.join(self.path, name)))
+
+    def append(self, symbol, timestamps, prices, volumes=None):
+        """Append ticks for a symbol; returns the number of rows stored"""
+        timestamps = _timestamps_us(timestamps)
+        prices = np.asarray(prices, dtype=np.float64)
+        volumes = np.zeros(len(prices)) if volumes is None else np.asarray(volumes, dtype=np.float64)
+        if not len(timestamps) == len(prices) == len(volumes):
+            raise ValueError("timestamps, prices and volumes must have the same length")
+        if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+            order = np.argsort(timestamps, kind='stable')
+            timestamps, prices, volumes = timestamps[order], prices[order], volumes[order]
+        values = {'timestamp': timestamps, 'price': prices, 'volume': volumes}
+        return self._store(symbol, create=True).append(values)
 
     def store_data(self, symbol, data):
-        self.data[symbol] = data
+        """Replace a symbol's history with records carrying timestamp, price and volume"""
+        store = self._store(symbol, create=True)
+        store.truncate()
+        if isinstance(data, dict):
+            return self.append(symbol, data['timestamp'], data['price'], data.get('volume'))
+        return self.append(
+            symbol,
+            [d['timestamp'] for d in data],
+            [d['price'] for d in data],
+            [d.get('volume', 0.0) for d in data]
+        )
+
+    def get_range(self, symbol, start_date=None, end_date=None):
+        """Zero-copy views of a symbol's columns between two times
+
+        ``timestamp`` is returned as datetime64[us].
+        """
+        store = self._store(symbol)
+        if store is None:
+            return _empty(COLUMNS)
+        return store.views(start_date, end_date)
 
-    def get_data(self, symbol, start_date, end_date):
-        # Placeholder for retrieving historical data
-        return self.data.get(symbol, [])
+    def get_data(self, symbol, start_date=None, end_date=None):
+        """Ticks between two times as records with timestamp, price and volume"""
+        columns = self.get_range(symbol, start_date, end_date)
+        return [
+            {'timestamp': timestamp, 'price': price, 'volume': volume}
+            for timestamp, price, volume in zip(
+                columns['timestamp'].tolist(), columns['price'].tolist(), columns['volume'].tolist()
+            )
+        ]
 
-    def calculate_returns(self, symbol):
-        prices = [d['price'] for d in self.data.get(symbol, [])]
+    def calculate_returns(self, symbol, start_date=None, end_date=None):
+        """Simple returns between consecutive ticks, as an array"""
+        prices = self.get_range(symbol, start_date, end_date)['price']
         if len(prices) < 2:
-            return []
-        returns = []
-        for i in range(1, len(prices)):
-            ret = (prices[i] - prices[i-1]) / prices[i-1]
-            returns.append(ret)
-        return returns
\ No newline at end of file
+            return np.empty(0)
+        return np.diff(prices) / prices[:-1]
+
+    def append_bars(self, symbol, timeframe, bars):
+        """Append finished bars, given as one array per BAR_COLUMNS column"""
+        values = {name: np.asarray(bars[name], dtype=dtype) for name, dtype in BAR_COLUMNS.items() if name != 'timestamp'}
+        values['timestamp'] = _timestamps_us(bars['timestamp'])
+        return self._store(symbol, create=True, timeframe=timeframe).append(values)
+
+    def get_bars(self, symbol, timeframe, start_date=None, end_date=None):
+        """Zero-copy views of a symbol's stored bars whose start is in the range"""
+        store = self._store(symbol, timeframe=timeframe)
+        if store is None:
+            return _empty(BAR_COLUMNS)
+        return store.views(start_date, end_date)
+
+    def flush(self):
+        """Write mapped pages back to disk"""
+        for store in self._stores.values():
+            store.flush()
@@ -1,14 +1,142 @@
-import random
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
 
 class PriceSimulator:
-    def __init__(self, initial_price=100.0, volatility=0.02):
-        self.price = initial_price
-        self.volatility = volatility
+    """Geometric Brownian motion prices for one or more symbols
+
+    ``volatility`` and ``drift`` are per step (scalars or one value per
+    symbol); a ``covariance`` matrix of per-step log returns replaces
+    ``volatility`` and correlates the shocks. Jumps arrive as a Poisson
+    process with ``jump_intensity`` jumps per step and normally distributed
+    log sizes. All randomness comes from one seeded NumPy generator.
+    """
+
+    def __init__(self, initial_price=100.0, volatility=0.02, drift=0.0, symbols=None,
+                 covariance=None, jump_intensity=0.0, jump_mean=0.0, jump_std=0.0, seed=None):
+        self.symbols = list(symbols) if symbols is not None else ["SIM"]
+        n = len(self.symbols)
+
+        self.initial_prices = np.broadcast_to(np.asarray(initial_price, dtype=np.float64), (n,)).copy()
+        self.drift = np.broadcast_to(np.asarray(drift, dtype=np.float64), (n,)).copy()
+        if covariance is not None:
+            covariance = np.asarray(covariance, dtype=np.float64)
+            if covariance.shape != (n, n):
+                raise ValueError(f"covariance must be {n}x{n}")
+        else:
+            volatility = np.broadcast_to(np.asarray(volatility, dtype=np.float64), (n,))
+            covariance = np.diag(volatility ** 2)
+        if not np.allclose(covariance, covariance.T):
+            raise ValueError("covariance must be symmetric")
+        # Eigen-decomposition tolerates zero volatilities and perfectly
+        # correlated symbols, where a Cholesky factorisation would fail
+        values, vectors = np.linalg.eigh(covariance)
+        if values.min(initial=0.0) < -1e-12 * max(values.max(initial=0.0), 1.0):
+            raise ValueError("covariance must be positive semi-definite")
+        self._factor = vectors * np.sqrt(np.clip(values, 0.0, None))
+        self.covariance = covariance
+        self.volatility = np.sqrt(np.diag(covariance))
+
+        self.jump_intensity = jump_intensity
+        self.jump_mean = jump_mean
+        self.jump_std = jump_std
+
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.prices = self.initial_prices.copy()
+
+    @property
+    def price(self):
+        return float(self.prices[0])
+
+    def _log_returns(self, shape):
+        """Log returns of shape (..., symbols) for one step each"""
+        n = len(self.symbols)
+        shocks = self.rng.standard_normal(shape + (n,)) @ self._factor.T
+        returns = shocks + (self.drift - 0.5 * self.volatility ** 2)
+        if self.jump_intensity > 0:
+            counts = self.rng.poisson(self.jump_intensity, shape + (n,))
+            jumps = counts * self.jump_mean + np.sqrt(counts) * self.jump_std * self.rng.standard_normal(shape + (n,))
+            returns += jumps
+        return returns
+
+    def simulate_paths(self, steps, paths=1, start_prices=None):
+        """Simulate ``paths`` independent paths of ``steps`` steps in one call
+
+        Returns prices of shape (paths, steps, symbols), the price after each
+        step, starting from ``start_prices`` (the initial prices by default).
+        """
+        start = self.initial_prices if start_prices is None else np.asarray(start_prices, dtype=np.float64)
+        log_paths = np.cumsum(self._log_returns((paths, steps)), axis=1)
+        return start * np.exp(log_paths)
 
     def simulate_price(self):
-        change = random.gauss(0, self.volatility)
-        self.price *= (1 + change)
+        """Advance the current prices by one step; returns the first symbol's price"""
+        self.prices = self.prices * np.exp(self._log_returns(()))
         return self.price
 
-    def reset(self, price=100.0):
-        self.price = price
\ No newline at end of file
+    def reset(self, price=None, seed=None):
+        """Restart from the initial prices (or ``price``), optionally reseeding"""
+        if price is not None:
+            self.initial_prices = np.broadcast_to(np.asarray(price, dtype=np.float64), self.prices.shape).copy()
+        self.prices = self.initial_prices.copy()
+        if seed is not None:
+            self.seed = seed
+        self.rng = np.random.default_rng(self.seed)
+
+    def _batches(self, batch_size, interval, start):
+        """Endless tick batches of (symbol, price, timestamp), continuing the current prices"""
+        n = len(self.symbols)
+        steps = max(1, -(-batch_size // n))
+        step = 0
+        while True:
+            block = self.simulate_paths(steps, start_prices=self.prices)[0]
+            self.prices = block[-1].copy()
+            timestamps = [start + interval * (step + i) for i in range(steps)]
+            step += steps
+            rows = block.tolist()
+            yield [
+                (symbol, price, timestamp)
+                for timestamp, row in zip(timestamps, rows)
+                for symbol, price in zip(self.symbols, row)
+            ]
+
+    def stream(self, batch_size=100, rate=None, interval=timedelta(seconds=1), start=None, max_batches=None):
+        """Yield tick batches for feeding an engine
+
+        Each batch holds at least ``batch_size`` ticks covering whole steps of
+        every symbol, stamped ``interval`` apart in simulated time from
+        ``start``. With ``rate`` (ticks per second) the generator sleeps to
+        hold that wall-clock rate, for soak tests; without it, it runs flat
+        out.
+        """
+        started = time.monotonic()
+        sent = 0
+        batches = self._batches(batch_size, interval, start or datetime.now())
+        for count, batch in enumerate(batches):
+            if max_batches is not None and count >= max_batches:
+                return
+            if rate:
+                delay = started + sent / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            sent += len(batch)
+            yield batch
+
+    async def astream(self, batch_size=100, rate=None, interval=timedelta(seconds=1), start=None, max_batches=None):
+        """Async version of ``stream`` that paces with asyncio.sleep"""
+        started = time.monotonic()
+        sent = 0
+        batches = self._batches(batch_size, interval, start or datetime.now())
+        for count, batch in enumerate(batches):
+            if max_batches is not None and count >= max_batches:
+                return
+            if rate:
+                delay = started + sent / rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            sent += len(batch)
+            yield batch
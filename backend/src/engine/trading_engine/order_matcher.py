@@ -1,21 +1,278 @@
+import heapq
+from collections import deque
+from datetime import datetime
+from itertools import count
+
+
+class _PriceLevel:
+    """Resting orders at one price, oldest first"""
+
+    __slots__ = ("price", "orders", "volume")
+
+    def __init__(self, price):
+        self.price = price
+        self.orders = deque()
+        self.volume = 0.0
+
+
+class _BookSide:
+    """One side of a symbol's book: price levels plus a heap of their prices
+
+    Prices are stored negated for bids so both sides pop the best price
+    first. Cancelled orders and emptied levels are dropped lazily, when they
+    reach the front; once cancelled orders make up more than half of the
+    queued entries the levels and heap are rebuilt from the live ones, so
+    cancel/replace churn can't grow them without bound.
+    """
+
+    def __init__(self, is_bid):
+        self.is_bid = is_bid
+        self.levels = {}
+        self._heap = []
+        self._entries = 0
+        self._dead = 0
+
+    def __len__(self):
+        """Queued orders, cancelled ones included"""
+        return self._entries
+
+    def _key(self, price):
+        return -price if self.is_bid else price
+
+    def best(self):
+        """Best price level with a live order at its head, or None"""
+        heap = self._heap
+        while heap:
+            price = -heap[0] if self.is_bid else heap[0]
+            level = self.levels[price]
+            orders = level.orders
+            while orders and orders[0]['status'] == 'cancelled':
+                orders.popleft()
+                self._entries -= 1
+                self._dead -= 1
+            if orders:
+                return level
+            heapq.heappop(heap)
+            del self.levels[price]
+        return None
+
+    def add(self, order):
+        price = order['price']
+        level = self.levels.get(price)
+        if level is None:
+            level = self.levels[price] = _PriceLevel(price)
+            heapq.heappush(self._heap, self._key(price))
+        level.orders.append(order)
+        level.volume += order['remaining']
+        self._entries += 1
+
+    def pop_filled(self, level):
+        """Drop the filled order at the head of level"""
+        level.orders.popleft()
+        self._entries -= 1
+
+    def cancel(self, order):
+        """Take a cancelled order's volume off its level, compacting if dead entries dominate"""
+        self.levels[order['price']].volume -= order['remaining']
+        self._dead += 1
+        if self._dead * 2 > self._entries:
+            for price, level in list(self.levels.items()):
+                level.orders = deque(o for o in level.orders if o['status'] != 'cancelled')
+                if not level.orders:
+                    del self.levels[price]
+            self._heap = [self._key(price) for price in self.levels]
+            heapq.heapify(self._heap)
+            self._entries = sum(len(level.orders) for level in self.levels.values())
+            self._dead = 0
+
+    def crosses(self, level, price):
+        """Whether an incoming order limited at price can trade with level"""
+        if price is None:
+            return True
+        return level.price >= price if self.is_bid else level.price <= price
+
+    def depth(self, levels):
+        best = sorted(p for p, level in self.levels.items() if level.volume > 1e-12)
+        if self.is_bid:
+            best.reverse()
+        return [(p, self.levels[p].volume) for p in best[:levels]]
+
+
+class _SymbolBook:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = _BookSide(is_bid=True)
+        self.asks = _BookSide(is_bid=False)
+
+
 class OrderMatcher:
-    def __init__(self):
-        self.orders = []
+    """Continuous price-time-priority matching engine
+
+    Orders are dicts with ``symbol``, ``type`` (``'buy'`` or ``'sell'``),
+    ``quantity`` and ``price`` (None for a market order), plus an optional
+    ``id`` and ``user_id``. An incoming order trades against the best
+    opposite price levels, oldest order first within a level, filling
+    partially where needed; any limit remainder rests on the book and
+    market remainders are cancelled. Adding, cancelling and replacing cost
+    amortised O(log n) in the number of price levels.
+
+    Every fill produces a trade event dict, returned from the call and
+    passed to listeners as ``listener('trade', symbol, trade)``, the
+    TradingEngine listener signature. ``trade_ticks`` turns trades into the
+    (symbol, price, timestamp) ticks ``TradingEngine.update_market_prices``
+    consumes.
+    """
+
+    def __init__(self, clock=datetime.now):
+        self.clock = clock
+        self.books = {}
+        self.orders = {}
+        self._ids = count(1)
+        self._trade_ids = count(1)
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _book(self, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = _SymbolBook(symbol)
+        return book
 
     def add_order(self, order):
-        self.orders.append(order)
-        self.match_orders()
+        """Match an order against the book and rest any limit remainder
+
+        Returns the trades it produced.
+        """
+        if order['type'] not in ('buy', 'sell'):
+            raise ValueError(f"Order type must be 'buy' or 'sell', got {order['type']!r}")
+        if order['quantity'] <= 0:
+            raise ValueError("Order quantity must be positive")
+        if order.get('id') is None:
+            order['id'] = f"order_{next(self._ids)}"
+        elif order['id'] in self.orders:
+            raise ValueError(f"Order {order['id']} is already resting")
+        order.setdefault('price', None)
+        order['remaining'] = order['quantity']
+        order['status'] = 'pending'
+
+        book = self._book(order['symbol'])
+        trades = self._match(book, order)
+
+        if order['remaining'] > 0:
+            if order['price'] is None:
+                order['status'] = 'cancelled' if not trades else 'partially_filled'
+            else:
+                (book.bids if order['type'] == 'buy' else book.asks).add(order)
+                self.orders[order['id']] = order
+        return trades
 
     def match_orders(self):
-        # Simple order matching logic
-        buy_orders = [o for o in self.orders if o['type'] == 'buy']
-        sell_orders = [o for o in self.orders if o['type'] == 'sell']
-
-        for buy in buy_orders:
-            for sell in sell_orders:
-                if buy['symbol'] == sell['symbol'] and buy['price'] >= sell['price']:
-                    # Match found
-                    quantity = min(buy['quantity'], sell['quantity'])
-                    print(f"Matched {quantity} shares of {buy['symbol']} at {sell['price']}")
-                    # Remove matched orders or update quantities
-                    break
\ No newline at end of file
+        """Kept for compatibility: orders are matched as soon as they are added"""
+        return []
+
+    def _match(self, book, order):
+        opposite = book.asks if order['type'] == 'buy' else book.bids
+        trades = []
+        while order['remaining'] > 0:
+            level = opposite.best()
+            if level is None or not opposite.crosses(level, order['price']):
+                break
+            resting = level.orders[0]
+            quantity = min(order['remaining'], resting['remaining'])
+            resting['remaining'] -= quantity
+            order['remaining'] -= quantity
+            level.volume -= quantity
+            if resting['remaining'] <= 0:
+                resting['status'] = 'filled'
+                opposite.pop_filled(level)
+                del self.orders[resting['id']]
+            else:
+                resting['status'] = 'partially_filled'
+
+            buy, sell = (order, resting) if order['type'] == 'buy' else (resting, order)
+            trade = {
+                'id': f"trade_{next(self._trade_ids)}",
+                'symbol': book.symbol,
+                'price': level.price,
+                'quantity': quantity,
+                'timestamp': self.clock(),
+                'buy_order_id': buy['id'],
+                'sell_order_id': sell['id'],
+                'buy_user_id': buy.get('user_id'),
+                'sell_user_id': sell.get('user_id'),
+                'aggressor': order['type'],
+            }
+            trades.append(trade)
+            for listener in self._listeners:
+                listener('trade', book.symbol, trade)
+
+        if trades:
+            order['status'] = 'filled' if order['remaining'] <= 0 else 'partially_filled'
+        return trades
+
+    def cancel_order(self, order_id):
+        """Remove a resting order; returns it, or None if it is not resting"""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        book = self.books[order['symbol']]
+        side = book.bids if order['type'] == 'buy' else book.asks
+        # The entry stays in its level's queue and is skipped when reached,
+        # unless this cancel triggers a compaction
+        order['status'] = 'cancelled'
+        side.cancel(order)
+        return order
+
+    def replace_order(self, order_id, price=None, quantity=None):
+        """Change a resting order's price and/or remaining quantity
+
+        Reducing the quantity at the same price keeps the order's place in
+        the queue; any other change cancels it and re-adds it at the back,
+        where it may trade immediately. Returns the trades produced.
+        """
+        order = self.orders.get(order_id)
+        if order is None:
+            raise ValueError(f"Order {order_id} is not resting")
+        new_price = order['price'] if price is None else price
+        new_quantity = order['remaining'] if quantity is None else quantity
+        if new_quantity <= 0:
+            raise ValueError("Order quantity must be positive")
+
+        if new_price == order['price'] and new_quantity <= order['remaining']:
+            book = self.books[order['symbol']]
+            side = book.bids if order['type'] == 'buy' else book.asks
+            side.levels[order['price']].volume -= order['remaining'] - new_quantity
+            order['remaining'] = new_quantity
+            return []
+
+        self.cancel_order(order_id)
+        replacement = {k: v for k, v in order.items() if k not in ('remaining', 'status')}
+        replacement.update(price=new_price, quantity=new_quantity)
+        return self.add_order(replacement)
+
+    def best_bid(self, symbol):
+        book = self.books.get(symbol)
+        level = book.bids.best() if book else None
+        return level.price if level else None
+
+    def best_ask(self, symbol):
+        book = self.books.get(symbol)
+        level = book.asks.best() if book else None
+        return level.price if level else None
+
+    def depth(self, symbol, levels=10):
+        """Aggregated (price, volume) levels per side, best first"""
+        book = self.books.get(symbol)
+        if book is None:
+            return {'bids': [], 'asks': []}
+        return {'bids': book.bids.depth(levels), 'asks': book.asks.depth(levels)}
+
+
+def trade_ticks(trades):
+    """(symbol, price, timestamp) ticks for TradingEngine.update_market_prices"""
+    return [(t['symbol'], t['price'], t['timestamp']) for t in trades]
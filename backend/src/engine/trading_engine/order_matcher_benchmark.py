@@ -0,0 +1,75 @@
+"""Throughput of OrderMatcher against the original list-scanning matcher
+
+Usage: python order_matcher_benchmark.py [orders] [legacy_orders]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from order_matcher import OrderMatcher
+
+
+class LegacyOrderMatcher:
+    """The matcher this module replaced, kept verbatim as the baseline"""
+
+    def __init__(self):
+        self.orders = []
+
+    def add_order(self, order):
+        self.orders.append(order)
+        self.match_orders()
+
+    def match_orders(self):
+        # Simple order matching logic
+        buy_orders = [o for o in self.orders if o['type'] == 'buy']
+        sell_orders = [o for o in self.orders if o['type'] == 'sell']
+
+        for buy in buy_orders:
+            for sell in sell_orders:
+                if buy['symbol'] == sell['symbol'] and buy['price'] >= sell['price']:
+                    # Match found
+                    quantity = min(buy['quantity'], sell['quantity'])
+                    print(f"Matched {quantity} shares of {buy['symbol']} at {sell['price']}")
+                    # Remove matched orders or update quantities
+                    break
+
+
+def generate_orders(n, symbols=('AAPL', 'MSFT', 'GOOG', 'AMZN'), seed=7):
+    """Limit orders around a mid price, so roughly half of them cross"""
+    rng = random.Random(seed)
+    return [
+        {
+            'symbol': rng.choice(symbols),
+            'type': rng.choice(('buy', 'sell')),
+            'quantity': rng.randint(1, 100),
+            'price': round(100 + rng.gauss(0, 1), 2),
+        }
+        for _ in range(n)
+    ]
+
+
+def bench(matcher, orders):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for order in orders:
+            matcher.add_order(dict(order))
+    elapsed = time.perf_counter() - started
+    return len(orders) / elapsed, elapsed
+
+
+def main(n=200_000, legacy_n=2_000):
+    rate, elapsed = bench(OrderMatcher(), generate_orders(n))
+    print(f"OrderMatcher        {n:>9,} orders  {elapsed:8.3f}s  {rate:>12,.0f} orders/s")
+    legacy_rate, legacy_elapsed = bench(LegacyOrderMatcher(), generate_orders(legacy_n))
+    print(f"LegacyOrderMatcher  {legacy_n:>9,} orders  {legacy_elapsed:8.3f}s  {legacy_rate:>12,.0f} orders/s")
+    print(f"Speed-up: {rate / legacy_rate:,.0f}x (legacy cost grows with book size)")
+    return {'order_matcher': rate, 'legacy': legacy_rate}
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -1,3 +1,23 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+VAR_METHODS = ('historical', 'parametric', 'monte_carlo')
+
+
+def _tail(losses, confidence):
+    """VaR and expected shortfall of a loss sample, by partitioning not sorting"""
+    losses = np.asarray(losses, dtype=np.float64).ravel()
+    n = len(losses)
+    if n == 0:
+        return 0.0, 0.0
+    k = min(n - 1, max(0, math.ceil(confidence * n) - 1))
+    partitioned = np.partition(losses, k)
+    var = partitioned[k]
+    return float(var), float(partitioned[k:].mean())
+
+
 class RiskManager:
     def __init__(self, max_loss_percent=0.1):
         self.max_loss_percent = max_loss_percent
@@ -7,7 +27,165 @@ class RiskManager:
         return loss_percent <= self.max_loss_percent
 
     def calculate_var(self, returns, confidence=0.95):
-        # Value at Risk calculation
-        sorted_returns = sorted(returns)
-        index = int((1 - confidence) * len(sorted_returns))
-        return sorted_returns[index]
\ No newline at end of file
+        # Value at Risk calculation: the (1 - confidence) quantile of returns
+        returns = np.asarray(returns, dtype=np.float64)
+        index = int((1 - confidence) * len(returns))
+        return float(np.partition(returns, index)[index])
+
+    def historical_var(self, returns, exposures, confidence=0.95, horizon=1):
+        """Portfolio VaR and expected shortfall from the empirical P&L distribution
+
+        ``returns`` is a (observations, assets) array of per-period returns and
+        ``exposures`` the signed value held in each asset. Losses are
+        positive amounts; multi-period horizons are scaled by sqrt(horizon).
+        """
+        pnl = np.asarray(returns, dtype=np.float64).reshape(len(returns), -1) @ np.asarray(exposures, dtype=np.float64)
+        var, es = _tail(-pnl, confidence)
+        scale = math.sqrt(horizon)
+        return var * scale, es * scale
+
+    def parametric_var(self, mean, covariance, exposures, confidence=0.95, horizon=1):
+        """Variance-covariance VaR and expected shortfall under normal returns"""
+        exposures = np.asarray(exposures, dtype=np.float64)
+        mu = float(np.asarray(mean, dtype=np.float64) @ exposures) * horizon
+        sigma = math.sqrt(max(float(exposures @ np.asarray(covariance, dtype=np.float64) @ exposures), 0.0) * horizon)
+        z = NormalDist().inv_cdf(confidence)
+        var = -mu + z * sigma
+        es = -mu + sigma * NormalDist().pdf(z) / (1 - confidence)
+        return var, es
+
+    def monte_carlo_var(self, mean, covariance, exposures, confidence=0.95, horizon=1,
+                        simulations=10000, seed=None):
+        """VaR and expected shortfall from simulated multivariate normal returns"""
+        mean = np.asarray(mean, dtype=np.float64) * horizon
+        covariance = np.asarray(covariance, dtype=np.float64) * horizon
+        rng = np.random.default_rng(seed)
+        # Eigen-decomposition tolerates the singular covariances short
+        # windows produce, where a Cholesky factorisation would fail
+        values, vectors = np.linalg.eigh(covariance)
+        factor = vectors * np.sqrt(np.clip(values, 0.0, None))
+        shocks = rng.standard_normal((simulations, len(mean))) @ factor.T + mean
+        return _tail(-(shocks @ np.asarray(exposures, dtype=np.float64)), confidence)
+
+    def portfolio_var(self, returns, exposures, confidence=0.95, method='historical',
+                      horizon=1, simulations=10000, seed=None):
+        """VaR and expected shortfall of a portfolio with any of VAR_METHODS"""
+        returns = np.asarray(returns, dtype=np.float64).reshape(len(returns), -1)
+        if method == 'historical':
+            return self.historical_var(returns, exposures, confidence, horizon)
+        if method not in VAR_METHODS:
+            raise ValueError(f"Unknown VaR method: {method}")
+        mean = returns.mean(axis=0)
+        covariance = np.atleast_2d(np.cov(returns, rowvar=False)) if len(returns) > 1 else np.zeros((returns.shape[1],) * 2)
+        if method == 'parametric':
+            return self.parametric_var(mean, covariance, exposures, confidence, horizon)
+        return self.monte_carlo_var(mean, covariance, exposures, confidence, horizon, simulations, seed)
+
+
+class RollingRisk:
+    """Rolling window of multi-asset returns with incrementally kept moments
+
+    Returns are held in a fixed-size ring buffer. The running sum and sum of
+    outer products are updated as each observation arrives and leaves the
+    window, so the window mean and covariance cost O(assets^2) instead of a
+    pass over the window. Assets can be added as they appear; their earlier
+    returns count as zero.
+    """
+
+    def __init__(self, window, assets=()):
+        self.window = window
+        self.assets = list(assets)
+        self.index = {asset: i for i, asset in enumerate(self.assets)}
+        n = len(self.assets)
+        self._buffer = np.zeros((window, n))
+        self._sum = np.zeros(n)
+        self._outer = np.zeros((n, n))
+        self._next = 0
+        self.count = 0
+        self.risk_manager = RiskManager()
+
+    def add_asset(self, asset):
+        if asset in self.index:
+            return self.index[asset]
+        self.index[asset] = len(self.assets)
+        self.assets.append(asset)
+        self._buffer = np.pad(self._buffer, ((0, 0), (0, 1)))
+        self._sum = np.pad(self._sum, (0, 1))
+        self._outer = np.pad(self._outer, ((0, 1), (0, 1)))
+        return self.index[asset]
+
+    def update(self, returns):
+        """Add one observation: an array over all assets, or a dict by asset"""
+        if isinstance(returns, dict):
+            row = np.zeros(len(self.assets))
+            for asset, value in returns.items():
+                i = self.add_asset(asset)
+                if i >= len(row):
+                    row = np.pad(row, (0, i + 1 - len(row)))
+                row[i] = value
+        else:
+            row = np.asarray(returns, dtype=np.float64)
+
+        if self.count == self.window:
+            old = self._buffer[self._next]
+            self._sum -= old
+            self._outer -= np.outer(old, old)
+        else:
+            self.count += 1
+        self._buffer[self._next] = row
+        self._sum += row
+        self._outer += np.outer(row, row)
+        self._next = (self._next + 1) % self.window
+
+    def copy(self):
+        """Independent copy, for computing on while this window keeps updating"""
+        clone = RollingRisk.__new__(RollingRisk)
+        clone.__dict__.update(self.__dict__)
+        clone.assets = list(self.assets)
+        clone.index = dict(self.index)
+        clone._buffer = self._buffer.copy()
+        clone._sum = self._sum.copy()
+        clone._outer = self._outer.copy()
+        return clone
+
+    def returns(self):
+        """The window's observations, oldest first"""
+        if self.count < self.window:
+            return self._buffer[:self.count].copy()
+        return np.roll(self._buffer, -self._next, axis=0)
+
+    def mean(self):
+        return self._sum / self.count if self.count else self._sum.copy()
+
+    def covariance(self):
+        n = self.count
+        if n < 2:
+            return np.zeros_like(self._outer)
+        mean = self._sum / n
+        return (self._outer - n * np.outer(mean, mean)) / (n - 1)
+
+    def exposure_vector(self, exposures):
+        """Order a {asset: value} mapping like the window's columns"""
+        vector = np.zeros(len(self.assets))
+        for asset, value in exposures.items():
+            if asset in self.index:
+                vector[self.index[asset]] = value
+        return vector
+
+    def var(self, exposures, confidence=0.95, method='historical', horizon=1,
+            simulations=10000, seed=None):
+        """VaR and expected shortfall of exposures (array or dict) over the window"""
+        if isinstance(exposures, dict):
+            exposures = self.exposure_vector(exposures)
+        if self.count == 0:
+            return 0.0, 0.0
+        rm = self.risk_manager
+        if method == 'historical':
+            window = self._buffer[:self.count]
+            return rm.historical_var(window, exposures, confidence, horizon)
+        if method == 'parametric':
+            return rm.parametric_var(self.mean(), self.covariance(), exposures, confidence, horizon)
+        if method == 'monte_carlo':
+            return rm.monte_carlo_var(self.mean(), self.covariance(), exposures, confidence,
+                                      horizon, simulations, seed)
+        raise ValueError(f"Unknown VaR method: {method}")
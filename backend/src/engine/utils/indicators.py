@@ -0,0 +1,393 @@
+"""Rolling indicators, each as a streaming class and a batch function
+
+The streaming classes take one value per ``update`` in O(1) (amortised
+O(1) for the min/max deques) and return the current indicator value, NaN
+until enough values have been seen. The batch functions compute the same
+values over whole NumPy arrays, with NaN in the same warm-up positions, so
+a backtest can precompute what a live engine builds tick by tick. The two
+agree to floating-point rounding.
+"""
+import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+NAN = float('nan')
+
+
+def _warm_up(result, count):
+    result[:count] = np.nan
+    return result
+
+
+def _rolling_windows(values, window):
+    values = np.asarray(values, dtype=np.float64)
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    return values, sliding_window_view(values, window) if len(values) >= window else None
+
+
+def _smooth(values, alpha, initial):
+    """y[i] = (1 - alpha) * y[i-1] + alpha * values[i], with y[-1] = initial
+
+    The recurrence is solved a block at a time: each block is filtered from
+    zero in one vectorised pass, then the carry from the previous block is
+    added back with the matching decay. Blocks are short enough that the
+    decay factors stay well inside double precision.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[:] = values
+        return out
+    block = max(1, min(n, int(math.log(1e4) / -math.log(decay)))) if decay < 1.0 else n
+    powers = decay ** np.arange(block + 1)
+    carry = initial
+    for start in range(0, n, block):
+        chunk = values[start:start + block]
+        m = len(chunk)
+        # sum_j decay^(i-j) * x_j, as decay^i * cumsum(x_j / decay^j)
+        local = alpha * powers[:m] * np.cumsum(chunk / powers[:m])
+        out[start:start + m] = local + powers[1:m + 1] * carry
+        carry = out[start + m - 1]
+    return out
+
+
+class SMA:
+    """Simple moving average over the last ``window`` values"""
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return len(self.values) == self.window
+
+    def update(self, x):
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+        self.value = self.total / self.window if self.ready else NAN
+        return self.value
+
+
+def sma(values, window):
+    values, windows = _rolling_windows(values, window)
+    result = np.full(len(values), np.nan)
+    if windows is not None:
+        result[window - 1:] = windows.mean(axis=1)
+    return result
+
+
+class EMA:
+    """Exponential moving average, seeded with the first value
+
+    Pass ``span`` (alpha = 2 / (span + 1)) or ``alpha``. This is the
+    recursive form, like pandas' ``ewm(adjust=False)``.
+    """
+
+    def __init__(self, span=None, alpha=None):
+        self.alpha = _alpha(span, alpha)
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return not math.isnan(self.value)
+
+    def update(self, x):
+        if math.isnan(self.value):
+            self.value = float(x)
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+def _alpha(span, alpha):
+    if (span is None) == (alpha is None):
+        raise ValueError("Pass exactly one of span and alpha")
+    if alpha is None:
+        if span < 1:
+            raise ValueError("span must be at least 1")
+        alpha = 2.0 / (span + 1.0)
+    if not 0 < alpha <= 1:
+        raise ValueError("alpha must be in (0, 1]")
+    return alpha
+
+
+def ema(values, span=None, alpha=None):
+    alpha = _alpha(span, alpha)
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return np.empty(0)
+    return _smooth(values, alpha, values[0])
+
+
+class RollingVariance:
+    """Variance of the last ``window`` values by Welford's update and downdate
+
+    ``ddof`` is 1 for the sample variance (pandas' default) and 0 for the
+    population variance.
+    """
+
+    def __init__(self, window, ddof=1):
+        if window <= ddof:
+            raise ValueError("window must be larger than ddof")
+        self.window = window
+        self.ddof = ddof
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return len(self.values) == self.window
+
+    def update(self, x):
+        self.values.append(x)
+        n = len(self.values)
+        if n > self.window:
+            # Replace the oldest value: a downdate and an update in one step
+            old = self.values.popleft()
+            n -= 1
+            delta = x - old
+            old_mean = self.mean
+            self.mean += delta / n
+            self.m2 += delta * (x - self.mean + old - old_mean)
+        else:
+            delta = x - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (x - self.mean)
+        self.m2 = max(self.m2, 0.0)
+        self.value = self.m2 / (n - self.ddof) if self.ready else NAN
+        return self.value
+
+    @property
+    def std(self):
+        return math.sqrt(self.value)
+
+
+def rolling_var(values, window, ddof=1):
+    if window <= ddof:
+        raise ValueError("window must be larger than ddof")
+    values, windows = _rolling_windows(values, window)
+    result = np.full(len(values), np.nan)
+    if windows is not None:
+        result[window - 1:] = windows.var(axis=1, ddof=ddof)
+    return result
+
+
+def rolling_std(values, window, ddof=1):
+    return np.sqrt(rolling_var(values, window, ddof))
+
+
+class RollingMax:
+    """Maximum of the last ``window`` values from a monotonic deque"""
+
+    _better = staticmethod(lambda a, b: a >= b)
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.count = 0
+        self.candidates = deque()
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self.count >= self.window
+
+    def update(self, x):
+        candidates = self.candidates
+        while candidates and self._better(x, candidates[-1][1]):
+            candidates.pop()
+        candidates.append((self.count, x))
+        if candidates[0][0] <= self.count - self.window:
+            candidates.popleft()
+        self.count += 1
+        self.value = candidates[0][1] if self.ready else NAN
+        return self.value
+
+
+class RollingMin(RollingMax):
+    """Minimum of the last ``window`` values from a monotonic deque"""
+
+    _better = staticmethod(lambda a, b: a <= b)
+
+
+def rolling_max(values, window):
+    values, windows = _rolling_windows(values, window)
+    result = np.full(len(values), np.nan)
+    if windows is not None:
+        result[window - 1:] = windows.max(axis=1)
+    return result
+
+
+def rolling_min(values, window):
+    values, windows = _rolling_windows(values, window)
+    result = np.full(len(values), np.nan)
+    if windows is not None:
+        result[window - 1:] = windows.min(axis=1)
+    return result
+
+
+def _rsi_value(gain, loss):
+    if loss == 0:
+        return 100.0 if gain > 0 else 50.0
+    return 100.0 - 100.0 / (1.0 + gain / loss)
+
+
+class RSI:
+    """Wilder's relative strength index over ``period`` price changes
+
+    Average gain and loss start as the simple mean of the first ``period``
+    changes and are then smoothed with alpha = 1 / period, so the first
+    value appears with the ``period + 1``-th price.
+    """
+
+    def __init__(self, period=14):
+        if period < 1:
+            raise ValueError("period must be at least 1")
+        self.period = period
+        self.previous = None
+        self.changes = 0
+        self.gain = 0.0
+        self.loss = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self.changes >= self.period
+
+    def update(self, price):
+        previous, self.previous = self.previous, price
+        if previous is None:
+            return self.value
+        change = price - previous
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        self.changes += 1
+        if self.changes <= self.period:
+            self.gain += gain / self.period
+            self.loss += loss / self.period
+        else:
+            alpha = 1.0 / self.period
+            self.gain += alpha * (gain - self.gain)
+            self.loss += alpha * (loss - self.loss)
+        self.value = _rsi_value(self.gain, self.loss) if self.ready else NAN
+        return self.value
+
+
+def rsi(prices, period=14):
+    prices = np.asarray(prices, dtype=np.float64)
+    result = np.full(len(prices), np.nan)
+    if len(prices) <= period:
+        return result
+    changes = np.diff(prices)
+    gains, losses = np.maximum(changes, 0.0), np.maximum(-changes, 0.0)
+    alpha = 1.0 / period
+    avg_gain = np.concatenate(([gains[:period].mean()], _smooth(gains[period:], alpha, gains[:period].mean())))
+    avg_loss = np.concatenate(([losses[:period].mean()], _smooth(losses[period:], alpha, losses[:period].mean())))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    values[avg_loss == 0] = np.where(avg_gain[avg_loss == 0] > 0, 100.0, 50.0)
+    result[period:] = values
+    return result
+
+
+class ATR:
+    """Wilder's average true range over ``period`` bars
+
+    ``update(high, low, close)`` takes one bar; with only a price, the bar
+    is that single price. The first value is the mean true range of the
+    first ``period`` bars.
+    """
+
+    def __init__(self, period=14):
+        if period < 1:
+            raise ValueError("period must be at least 1")
+        self.period = period
+        self.previous_close = None
+        self.count = 0
+        self.value = NAN
+        self._total = 0.0
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    def update(self, high, low=None, close=None):
+        low = high if low is None else low
+        close = high if close is None else close
+        true_range = high - low
+        if self.previous_close is not None:
+            true_range = max(true_range, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.previous_close = close
+        self.count += 1
+        if self.count < self.period:
+            self._total += true_range
+        elif self.count == self.period:
+            self.value = (self._total + true_range) / self.period
+        else:
+            self.value += (true_range - self.value) / self.period
+        return self.value
+
+
+def true_range(high, low, close):
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    ranges = high - low
+    if len(ranges) > 1:
+        previous = close[:-1]
+        ranges[1:] = np.maximum.reduce([ranges[1:], np.abs(high[1:] - previous), np.abs(low[1:] - previous)])
+    return ranges
+
+
+def atr(high, low, close, period=14):
+    ranges = true_range(high, low, close)
+    result = np.full(len(ranges), np.nan)
+    if len(ranges) < period:
+        return result
+    seed = ranges[:period].mean()
+    result[period - 1] = seed
+    result[period:] = _smooth(ranges[period:], 1.0 / period, seed)
+    return result
+
+
+class BollingerBands:
+    """Moving average with bands ``k`` population standard deviations away"""
+
+    def __init__(self, window=20, k=2.0):
+        self.k = k
+        self.mean = SMA(window)
+        self.variance = RollingVariance(window, ddof=0) if window > 1 else None
+        self.value = (NAN, NAN, NAN)
+
+    @property
+    def ready(self):
+        return self.mean.ready
+
+    def update(self, x):
+        middle = self.mean.update(x)
+        width = 0.0
+        if self.variance is not None:
+            width = self.k * math.sqrt(self.variance.update(x))
+        self.value = (middle, middle + width, middle - width)
+        return self.value
+
+
+def bollinger(values, window=20, k=2.0):
+    """(middle, upper, lower) band arrays"""
+    middle = sma(values, window)
+    width = k * rolling_std(values, window, ddof=0) if window > 1 else np.zeros(len(middle))
+    return middle, middle + width, middle - width